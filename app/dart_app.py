@@ -2,11 +2,24 @@
 import sys
 sys.path.append('..')
 
-import streamlit as st
+import hashlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
+import streamlit as st
 
 from dar_tool.suppression_check import DataAnonymizer
+from dar_tool.jobs import RedactionJob
+from util import LogUtil
+from dar_tool.table_io import file_format, read_table
+
+LogUtil.configure_logging()
+
+# Rows of the redacted file shown per page
+PREVIEW_ROWS = 100
+# Seconds between two looks at a running job
+POLL_SECONDS = 1
 
 st.set_page_config(
     layout="wide",
@@ -26,21 +39,78 @@ with middle:
 
 st.header("This tool is designed to support users with redacting sensitive records in aggregate files. By default this tool will redact records where the count is 10 or less and all additional records needed for complimentary suppression.")
 
-st.subheader("Upload your .csv or .xlsx file with aggregates to get started:")
+st.subheader("Upload your .csv, .xlsx, .parquet or .feather file with aggregates to get started:")
 
 #Creating columns so file upload widget does not span entire page. 
 filecol,unusedcol = st.columns([.3,.7])
 with filecol:
-    uploadedFile = st.file_uploader("Upload file", type=['csv','xlsx'],accept_multiple_files=False,key="fileUploader")
+    uploadedFile = st.file_uploader("Upload file", type=['csv','xlsx','parquet','feather','arrow'],accept_multiple_files=False,key="fileUploader")
+
+@st.cache_data(max_entries=4, show_spinner="Reading the file...")
+def read_upload(file_hash, file_name, _file_data):
+    # Cached by the hash of the file, so the file is parsed once and not on every widget interaction
+    return read_table(io.BytesIO(_file_data), format_name=file_format(file_name))
+
+
+def cached_anonymizer(file_hash, df, **settings):
+    # The anonymizer keeps the codes of the data and the aggregate levels of its last run, it is kept for the
+    # session as long as the file and the column selection do not change. Changing the threshold, zeroes or
+    # the replacement string then only reruns the suppression.
+    key = (file_hash, tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in settings.items()))
+    if st.session_state.get('anonymizer_key') != key:
+        st.session_state['anonymizer'] = DataAnonymizer(df, **settings)
+        st.session_state['anonymizer_key'] = key
+    return st.session_state['anonymizer']
+
+
+@st.cache_resource
+def job_pool():
+    # One worker pool for every session, the redactions run on it and not in the script thread
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='dart_job')
+
+
+def show_job(job):
+    # Progress of a running job with a cancel button, the paged result and the downloads of a finished one
+    if job.status in ('queued', 'running'):
+        step = job.last_step
+        if step is not None and step['combination'] is not None:
+            text = f"Redacting... {step['stage']}: combination {step['combination']} of {step['combinations']}"
+        else:
+            text = f"Redacting... {job.current_stage or 'waiting for a worker'}"
+        st.progress(job.progress, text=text)
+        if st.button("Cancel redaction"):
+            job.cancel()
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+    elif job.status == 'cancelled':
+        st.warning("The redaction was cancelled.")
+    elif job.status == 'failed':
+        st.error(f"The redaction failed: {job.future.exception()}")
+    else:
+        df_merged = job.result()
+        st.header("Redacted File")
+        n_pages = max((len(df_merged) - 1) // PREVIEW_ROWS + 1, 1)
+        page = st.number_input(f"Page of the preview (out of {n_pages})", min_value=1, max_value=n_pages, value=1)
+        st.dataframe(df_merged.iloc[(page - 1) * PREVIEW_ROWS:page * PREVIEW_ROWS])
+        st.subheader("Download the whole redacted file:")
+        extension = st.radio("File type", options=['.csv', '.parquet'], horizontal=True)
+        try:
+            path = job.output_file(extension)
+        except ImportError as error:
+            # Parquet needs pyarrow
+            st.error(str(error))
+            return
+        with open(path, 'rb') as output_file:
+            st.download_button("Download the redacted file", data=output_file, file_name='redacted' + extension,
+                               mime='text/csv' if extension == '.csv' else 'application/octet-stream')
 
 if uploadedFile:
-    if uploadedFile.name.endswith('.csv'):
-        df = pd.read_csv(uploadedFile)
-
-    elif uploadedFile.name.endswith('.xlsx'):
-        df = pd.read_excel(uploadedFile)
+    if uploadedFile.name.endswith(('.csv', '.xlsx', '.parquet', '.feather', '.arrow')):
+        file_data = uploadedFile.getvalue()
+        file_hash = hashlib.sha256(file_data).hexdigest()
+        df = read_upload(file_hash, uploadedFile.name, file_data)
     else:
-        raise Exception("Your uploaded file must be a .csv or .xlsx")
+        raise Exception("Your uploaded file must be a .csv, .xlsx, .parquet or .feather")
     
     
     #Create sidebar for user to specify inupts to redaction function
@@ -137,24 +207,24 @@ if uploadedFile:
 
 #Add button to apply redaction
     
-    if st.sidebar.button("Redact my dataset"):
-
-        anonymizer = DataAnonymizer(df, parent_organization=parent_org, child_organization=child_org,
-                                    sensitive_columns=sensitive_columns, 
-                                    minimum_threshold=minimum_threshold, redact_column=redact_column,
-                                    redact_zero=redact_zero, redact_value=redact_value)
-        df_merged = anonymizer.process_multiple_frequency_col(frequency_columns)
-
-        st.header("Redacted File")
-        st.subheader("The file can be downloaded via the download icon in the top right of the table.")
-        st.write(df_merged)
-
-       
-
-
-
-    
-    
-
-
-    
\ No newline at end of file
+    job = st.session_state.get('job')
+    if job is not None and st.session_state.get('job_file') != file_hash:
+        # The redaction of another file
+        job.close()
+        job = st.session_state['job'] = None
+    running = job is not None and job.status in ('queued', 'running')
+    if st.sidebar.button("Redact my dataset", disabled=running):
+
+        anonymizer = cached_anonymizer(file_hash, df, parent_organization=parent_org, child_organization=child_org,
+                                       sensitive_columns=sensitive_columns, redact_column=redact_column)
+        anonymizer.update_settings(minimum_threshold=minimum_threshold, redact_zero=redact_zero,
+                                   redact_value=redact_value)
+        if job is not None:
+            job.close()
+        # The columns are redacted one after the other so the download keeps its columns and their order
+        job = RedactionJob(anonymizer, frequency_columns, job_pool(), vectorized=False)
+        st.session_state['job'] = job
+        st.session_state['job_file'] = file_hash
+
+    if job is not None:
+        show_job(job)
@@ -0,0 +1,151 @@
+"""Times and memory-profiles every step of the redaction on synthetic data of growing size.
+
+    python -m benchmarks.run --scales small medium --save benchmarks/baselines/baseline.json
+    python -m benchmarks.run --scales small medium --compare benchmarks/baselines/baseline.json
+
+Every step is timed on its own (best of --repeat runs) and its peak memory is measured with tracemalloc in a
+separate run, so the tracing does not slow down the timings. --compare exits with 1 when a step got slower or
+uses more memory than the baseline by more than --tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from dar_tool import DataAnonymizer
+from .synthetic import synthetic_hierarchy
+
+# Parents x children of every scale, every child has one row per combination of the sensitive columns
+SCALES = {
+    'small': dict(n_parents=10, n_children=10),
+    'medium': dict(n_parents=40, n_children=25),
+    'large': dict(n_parents=200, n_children=50),
+}
+DATA = dict(n_sensitive=3, cardinality=4, small_fraction=0.2, redact_fraction=0.01, n_frequency=3)
+SETTINGS = dict(parent_organization='ParentEntity', child_organization='ChildEntity',
+                sensitive_columns=['Subgroup0', 'Subgroup1', 'Subgroup2'], frequency='Count0',
+                redact_column='UserRedaction')
+FREQUENCY_COLUMNS = ['Count0', 'Count1', 'Count2']
+# Steps faster than this are left out of the comparison, their timings are mostly noise
+MIN_SECONDS = 0.005
+
+
+def _pipeline(anonymizer: DataAnonymizer, repeat_until_stable: bool) -> list:
+    """The steps of apply_anonymization, in order, as (name, callable)"""
+    steps = [('validate_inputs', lambda: anonymizer._validate(anonymizer.frequency)),
+             ('create_log', anonymizer._create_log),
+             ('redact_user_requested_records', anonymizer._redact_user_requested_records),
+             ('less_than_threshold', anonymizer._less_than_threshold)]
+    if repeat_until_stable:
+        steps.append(('suppress_until_stable', anonymizer._suppress_until_stable))
+    else:
+        steps += [('sum_redact', anonymizer._sum_redact),
+                  ('one_count_redacted', anonymizer._one_count_redacted),
+                  ('one_redact_zero', anonymizer._one_redact_zero),
+                  ('cross_suppression', anonymizer._cross_suppression)]
+    steps.append(('apply_log', anonymizer._apply_log))
+    return steps
+
+
+def _runs(df: pd.DataFrame) -> list:
+    """Every benchmarked run as (prefix, function returning its steps)"""
+    def pipeline(repeat_until_stable, **options):
+        return lambda: _pipeline(DataAnonymizer(df.copy(), repeat_until_stable=repeat_until_stable, **options,
+                                                **SETTINGS), repeat_until_stable)
+
+    def multiple(vectorized):
+        def steps():
+            anonymizer = DataAnonymizer(df.copy(), **SETTINGS)
+            return [('process_multiple_frequency_col',
+                     lambda: anonymizer.process_multiple_frequency_col(FREQUENCY_COLUMNS, vectorized=vectorized))]
+        return steps
+
+    return [('', pipeline(False)), ('stable/', pipeline(True)), ('lowmem/', pipeline(False, low_memory=True)),
+            ('compact/', pipeline(False, compact_dtypes=True)), ('loop/', multiple(False)),
+            ('vectorized/', multiple(True))]
+
+
+def benchmark_scale(scale: str, repeat: int = 3, seed: int = 0) -> list:
+    """Returns a record with the seconds and the peak memory of every step at one scale"""
+    df = synthetic_hierarchy(**SCALES[scale], **DATA, seed=seed)
+    records = []
+    for prefix, steps in _runs(df):
+        seconds: dict = {}
+        for _ in range(repeat):
+            for name, step in steps():
+                start = time.perf_counter()
+                step()
+                seconds[name] = min(seconds.get(name, np.inf), time.perf_counter() - start)
+
+        peak_mb: dict = {}
+        tracemalloc.start()
+        try:
+            for name, step in steps():
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                step()
+                peak_mb[name] = (tracemalloc.get_traced_memory()[1] - current) / 2 ** 20
+        finally:
+            tracemalloc.stop()
+
+        for name in seconds:
+            records.append({'scale': scale, 'rows': len(df), 'step': prefix + name,
+                            'seconds': round(seconds[name], 4), 'peak_mb': round(peak_mb[name], 2)})
+    return records
+
+
+def machine() -> dict:
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+
+
+def compare(df_results: pd.DataFrame, df_baseline: pd.DataFrame, tolerance: float) -> pd.DataFrame:
+    """Returns the steps slower or heavier than the baseline by more than tolerance"""
+    df_compared = df_results.merge(df_baseline, on=['scale', 'step'], suffixes=('', '_baseline'))
+    df_compared['time_ratio'] = (df_compared['seconds'] / df_compared['seconds_baseline']).round(2)
+    df_compared['memory_ratio'] = (df_compared['peak_mb'] / df_compared['peak_mb_baseline'].clip(lower=0.01)).round(2)
+    slower = (df_compared['time_ratio'] > 1 + tolerance) & (df_compared['seconds_baseline'] >= MIN_SECONDS)
+    heavier = (df_compared['memory_ratio'] > 1 + tolerance) & (df_compared['peak_mb_baseline'] >= 1)
+    return df_compared[slower | heavier]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of every step, the best one is kept')
+    parser.add_argument('--save', default=None, help='JSON file to save the results to as a baseline')
+    parser.add_argument('--compare', default=None, help='JSON baseline to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 is 25%%')
+    args = parser.parse_args(argv)
+    # Logging set up by the caller would time the info messages of every step as well
+    logging.disable(logging.INFO)
+
+    records = [record for scale in args.scales for record in benchmark_scale(scale, args.repeat)]
+    df_results = pd.DataFrame(records)
+    print(df_results.to_string(index=False))
+    if args.save is not None:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'machine': machine(), 'results': records}, baseline_file, indent=1)
+    if args.compare is None:
+        return 0
+    with open(args.compare) as baseline_file:
+        df_baseline = pd.DataFrame(json.load(baseline_file)['results'])
+    df_regressions = compare(df_results, df_baseline[['scale', 'step', 'seconds', 'peak_mb']], args.tolerance)
+    if df_regressions.empty:
+        print('No regression against', args.compare)
+        return 0
+    print('Regressions against', args.compare)
+    print(df_regressions[['scale', 'step', 'seconds', 'seconds_baseline', 'time_ratio', 'peak_mb',
+                          'peak_mb_baseline', 'memory_ratio']].to_string(index=False))
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
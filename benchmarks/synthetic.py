@@ -0,0 +1,35 @@
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+def synthetic_hierarchy(n_parents: int, n_children: int, n_sensitive: int = 2, cardinality: int = 3,
+                        small_fraction: float = 0.2, redact_fraction: float = 0.0, n_frequency: int = 1,
+                        minimum_threshold: int = 10, seed: int = 0) -> DataFrame:
+    """Generates aggregate data like a statewide extract: n_parents parents with n_children children each and
+    one row per child for every combination of n_sensitive sensitive columns of cardinality values.
+
+    A share small_fraction of the counts is at or below minimum_threshold (zeros included), the others are
+    spread above it. redact_fraction of the rows are flagged in the UserRedaction column. The frequency columns
+    are Count0, Count1, ... The columns are ParentEntity, ChildEntity, Subgroup0, Subgroup1, ...
+    """
+    rng = np.random.default_rng(seed)
+    combinations = np.array(list(product(range(cardinality), repeat=n_sensitive)), dtype=np.int64).reshape(-1, n_sensitive)
+    n_children_total = n_parents * n_children
+    n_rows = n_children_total * len(combinations)
+
+    child = np.repeat(np.arange(n_children_total), len(combinations))
+    df = pd.DataFrame({'ParentEntity': pd.Series(child // n_children).map('District{}'.format),
+                       'ChildEntity': pd.Series(child).map('School{}'.format)})
+    combination = np.tile(np.arange(len(combinations)), n_children_total)
+    for column in range(n_sensitive):
+        labels = np.array([f'Group{column}_{value}' for value in range(cardinality)], dtype=object)
+        df[f'Subgroup{column}'] = labels[combinations[combination, column]]
+    for frequency in range(n_frequency):
+        small = rng.random(n_rows) < small_fraction
+        df[f'Count{frequency}'] = np.where(small, rng.integers(0, minimum_threshold + 1, n_rows),
+                                           rng.integers(minimum_threshold + 1, 40 * minimum_threshold, n_rows))
+    df['UserRedaction'] = (rng.random(n_rows) < redact_fraction).astype(np.int64)
+    return df
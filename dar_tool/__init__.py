@@ -1 +1,7 @@
-from .suppression_check import DataAnonymizer
\ No newline at end of file
+from .suppression_check import DataAnonymizer
+from .reports import redact_reports
+from .sharding import anonymize_by_parent
+from .incremental import redact_incremental, update_redaction
+from .engine import AnonymizerConfig, RedactionResult
+from .instrumentation import CancellationToken, RedactionCancelled
+from .streaming import anonymize_file
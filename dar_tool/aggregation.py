@@ -0,0 +1,56 @@
+from pandas import DataFrame
+
+from util import LogUtil
+from .encoding import NULL_CODE
+
+logger = LogUtil.create_logger(__name__)
+
+
+class GroupingSetsAggregator:
+    """Computes every grouping set needed by the log from a single scan of the data.
+
+    The raw frame is aggregated once into the finest cube (every organization column plus every sensitive
+    column). Each coarser grouping set is then rolled up from the smallest cube already computed that
+    contains all of its columns, instead of grouping the raw frame again. This is the pandas equivalent of
+
+        select ParentEntity, ChildEntity, SubGroup1, SubGroup2, sum(GraduationCount) from record_table
+        group by grouping sets ((ParentEntity, SubGroup1, SubGroup2), (ParentEntity, SubGroup1), ...)
+
+    The key columns are integer codes (see CategoricalCodes), null values carry NULL_CODE. frequency is a
+    column or a list of columns, every column in the list is summed in the same scan.
+    """
+
+    def __init__(self, df: DataFrame, key_columns: list, frequency):
+        self.frequency = frequency
+        # Intermediate cubes keep null keys so that coarser sets can be rolled up from them,
+        # null keys are only removed when a grouping set is handed out.
+        finest_cube = df.groupby(key_columns, sort=True)[frequency].sum().reset_index()
+        self.cubes: dict = {tuple(key_columns): finest_cube}
+
+    def _rollup(self, group_by_col: list) -> DataFrame:
+        key = tuple(group_by_col)
+        if key not in self.cubes:
+            # Pick the smallest cube that already holds every requested column
+            candidates = [cube_key for cube_key in self.cubes if set(group_by_col).issubset(cube_key)]
+            source_key = min(candidates, key=lambda cube_key: len(self.cubes[cube_key]))
+            source = self.cubes[source_key]
+            self.cubes[key] = source.groupby(group_by_col, sort=True)[self.frequency].sum().reset_index()
+        return self.cubes[key]
+
+    def aggregate(self, group_by_col: list) -> DataFrame:
+        """Returns the same frame as df.groupby(group_by_col)[frequency].sum().reset_index() on the labels"""
+        df_grouped = self._rollup(group_by_col)
+        not_null = (df_grouped[group_by_col] != NULL_CODE).all(axis=1)
+        if not not_null.all():
+            df_grouped = df_grouped[not_null]
+        return df_grouped.reset_index(drop=True)
+
+    def grouping_sets(self, grouping_sets: list):
+        """Yields (group_by_col, aggregated frame) for every grouping set, in the order given.
+
+        Each grouping set is rolled up when it is asked for, from the smallest cube built so far that holds
+        its columns, so a caller that stops between two sets does not pay for the sets after them.
+        """
+        for group_by_col in grouping_sets:
+            logger.debug('grouping set>>%s', group_by_col)
+            yield list(group_by_col), self.aggregate(list(group_by_col))
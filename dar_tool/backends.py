@@ -0,0 +1,162 @@
+import numpy as np
+from pandas import DataFrame
+
+from util import LogUtil
+from .aggregation import GroupingSetsAggregator
+from .encoding import NULL_CODE
+
+logger = LogUtil.create_logger(__name__)
+
+
+class PandasBackend:
+    """Builds the aggregate levels of the log with pandas, see GroupingSetsAggregator.
+
+    A backend hands DataAnonymizer an aggregator for the coded data: an object with
+    grouping_sets(grouping_sets) yielding (group_by_col, aggregated frame) like GroupingSetsAggregator.
+    The suppression passes then run on the log in memory whatever the backend.
+    """
+
+    name = 'pandas'
+
+    def aggregator(self, df_codes: DataFrame, key_columns: list, frequency):
+        return GroupingSetsAggregator(df_codes, key_columns, frequency)
+
+
+class DuckDBBackend:
+    """Builds the aggregate levels of the log with one GROUPING SETS query in an in-process DuckDB.
+
+    DuckDB runs the query on several threads and spills to temp_directory when it does not fit in
+    memory_limit. The levels match the pandas backend: null keys are left out, the levels are sorted by
+    their keys and the frequency sums keep the type of the frequency columns. Needs the duckdb package.
+    Only the aggregation runs in DuckDB so far, the suppression passes and apply_log run on the log in memory
+    like with the other backends; moving them to DuckDB is a follow-up.
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, threads: int = None, memory_limit: str = None, temp_directory: str = None):
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self.temp_directory = temp_directory
+
+    def aggregator(self, df_codes: DataFrame, key_columns: list, frequency):
+        return DuckDBAggregator(df_codes, key_columns, frequency, self)
+
+    def connect(self):
+        try:
+            import duckdb
+        except ImportError as error:
+            raise ImportError("The duckdb backend needs the duckdb package, install it with pip install duckdb.") from error
+        connection = duckdb.connect()
+        if self.threads is not None:
+            connection.execute(f'SET threads = {int(self.threads)}')
+        if self.memory_limit is not None:
+            connection.execute(f"SET memory_limit = '{_escape(self.memory_limit)}'")
+        if self.temp_directory is not None:
+            connection.execute(f"SET temp_directory = '{_escape(self.temp_directory)}'")
+        return connection
+
+
+def _quote(column: str) -> str:
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("'", "''")
+
+
+class DuckDBAggregator:
+    """Aggregator of DuckDBBackend, every grouping set comes out of a single query"""
+
+    def __init__(self, df_codes: DataFrame, key_columns: list, frequency, backend: DuckDBBackend):
+        self.df_codes = df_codes
+        self.key_columns = list(key_columns)
+        self.frequency_columns = list(frequency) if isinstance(frequency, (list, tuple)) else [frequency]
+        self.backend = backend
+
+    def grouping_sets(self, grouping_sets: list):
+        """Yields (group_by_col, aggregated frame) for every grouping set, in the order given"""
+        grouping_sets = [list(group_by_col) for group_by_col in grouping_sets]
+        keys = ', '.join(_quote(column) for column in self.key_columns)
+        sums = ', '.join(f'coalesce(sum({_quote(column)}), 0) as {_quote(column)}' for column in self.frequency_columns)
+        sets = ', '.join('(' + ', '.join(_quote(column) for column in group_by_col) + ')' for group_by_col in grouping_sets)
+        query = (f'select {keys}, grouping({keys}) as grouping_id, {sums} from df_codes '
+                 f'group by grouping sets ({sets})')
+        logger.debug('grouping sets query>>%s', query)
+        connection = self.backend.connect()
+        try:
+            connection.register('df_codes', self.df_codes[self.key_columns + self.frequency_columns])
+            df_sets = connection.execute(query).df()
+        finally:
+            connection.close()
+
+        frequency_types = self.df_codes[self.frequency_columns].dtypes.to_dict()
+        for group_by_col in grouping_sets:
+            # grouping() sets the bit of every key column left out of the set, the first column is the highest bit
+            grouping_id = sum(1 << (len(self.key_columns) - 1 - position)
+                              for position, column in enumerate(self.key_columns) if column not in group_by_col)
+            df_grouped = df_sets.loc[df_sets['grouping_id'].to_numpy() == grouping_id, group_by_col + self.frequency_columns]
+            df_grouped = df_grouped.astype({column: np.int32 for column in group_by_col} | frequency_types)
+            not_null = (df_grouped[group_by_col] != NULL_CODE).all(axis=1)
+            df_grouped = df_grouped[not_null].sort_values(group_by_col).reset_index(drop=True)
+            yield group_by_col, df_grouped
+
+
+class PolarsBackend:
+    """Builds the aggregate levels of the log as lazy Polars queries over one scan of the coded data.
+
+    Every grouping set is a group_by of the same lazy frame, only the key and frequency columns are projected,
+    and the plans are collected together so Polars shares the scan and runs the group-bys on several threads.
+    The levels match the pandas backend. Needs the polars package.
+    """
+
+    name = 'polars'
+
+    def aggregator(self, df_codes: DataFrame, key_columns: list, frequency):
+        return PolarsAggregator(df_codes, key_columns, frequency)
+
+
+class PolarsAggregator:
+    """Aggregator of PolarsBackend"""
+
+    def __init__(self, df_codes: DataFrame, key_columns: list, frequency):
+        self.df_codes = df_codes
+        self.key_columns = list(key_columns)
+        self.frequency_columns = list(frequency) if isinstance(frequency, (list, tuple)) else [frequency]
+
+    def grouping_sets(self, grouping_sets: list):
+        """Yields (group_by_col, aggregated frame) for every grouping set, in the order given"""
+        try:
+            import polars as pl
+        except ImportError as error:
+            raise ImportError("The polars backend needs the polars package, install it with pip install polars.") from error
+        grouping_sets = [list(group_by_col) for group_by_col in grouping_sets]
+        records = pl.from_pandas(self.df_codes[self.key_columns + self.frequency_columns]).lazy()
+        # Null keys are left out before grouping, like the levels of the pandas backend
+        plans = [records.filter(pl.all_horizontal([pl.col(column) != NULL_CODE for column in group_by_col]))
+                 .group_by(group_by_col)
+                 .agg([pl.col(column).sum() for column in self.frequency_columns])
+                 .sort(group_by_col)
+                 for group_by_col in grouping_sets]
+        frequency_types = self.df_codes[self.frequency_columns].dtypes.to_dict()
+        for group_by_col, df_grouped in zip(grouping_sets, pl.collect_all(plans)):
+            # Column by column through numpy, to_pandas would need the pyarrow package
+            df_grouped = DataFrame({column: df_grouped[column].to_numpy() for column in df_grouped.columns})
+            df_grouped = df_grouped.astype({column: np.int32 for column in group_by_col} | frequency_types)
+            yield group_by_col, df_grouped
+
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend, 'polars': PolarsBackend}
+
+
+def get_backend(backend):
+    """Returns the backend for a name of BACKENDS or a backend object, None is the pandas backend"""
+    if backend is None:
+        return PandasBackend()
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError("Value for backend should be one of {}, not {}.".format(sorted(BACKENDS), backend))
+        return BACKENDS[backend]()
+    if not hasattr(backend, 'aggregator'):
+        raise ValueError("A backend object should have an aggregator method, {} does not.".format(backend))
+    return backend
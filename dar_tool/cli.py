@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from util import LogUtil
+from .instrumentation import StageTimer
+from .parallel import process_pool
+from .reports import redact_report
+from .table_io import FORMATS, file_format, write_table
+
+logger = LogUtil.create_logger(__name__)
+
+# Files picked up when the input of a job is a directory
+INPUT_EXTENSIONS = tuple(FORMATS)
+
+
+def load_manifest(path: str) -> dict:
+    """Reads a JSON or YAML manifest (YAML needs the pyyaml package).
+
+    The manifest holds a list of jobs and optionally the defaults shared by every job and n_jobs:
+
+        n_jobs: 4
+        defaults:
+          parent_organization: ParentEntity
+          sensitive_columns: [Subgroup1, Subgroup2]
+        jobs:
+          - input: graduation.csv
+            output: redacted/graduation.csv
+            log: logs/graduation.csv
+            frequency: GraduationCount
+          - input: enrollment/
+            output: redacted/enrollment/
+            frequency: EnrollmentCount
+
+    A job holds the DataAnonymizer arguments, input, output and log paths and optionally frequency_columns,
+    vectorized and project, see redact_reports. When input is a directory every data file in it is a job and
+    output and log are directories. Relative paths are relative to the manifest.
+    """
+    with open(path) as manifest_file:
+        if str(path).lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError as error:
+                raise ImportError("YAML manifests need the pyyaml package, install it with pip install pyyaml "
+                                  "or use a JSON manifest.") from error
+            manifest = yaml.safe_load(manifest_file)
+        else:
+            manifest = json.load(manifest_file)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('jobs'), list):
+        raise ValueError(f"The manifest {path} should be a mapping with a list of jobs.")
+    return manifest
+
+
+def expand_jobs(manifest: dict, base_dir: str = '.') -> list:
+    """Returns one job per input file with the defaults applied and the paths made absolute"""
+    defaults = manifest.get('defaults') or {}
+    jobs = []
+    for job in manifest['jobs']:
+        job = dict(defaults, **job)
+        if 'input' not in job:
+            raise KeyError(f"Every job of the manifest needs an input, {job} has none.")
+        for key in ('input', 'output', 'log'):
+            if job.get(key) is not None:
+                job[key] = os.path.join(base_dir, job[key])
+        if not os.path.isdir(job['input']):
+            jobs.append(job)
+            continue
+        for name in sorted(os.listdir(job['input'])):
+            if not name.lower().endswith(INPUT_EXTENSIONS):
+                continue
+            file_job = dict(job, input=os.path.join(job['input'], name))
+            stem, extension = os.path.splitext(name)
+            for key in ('output', 'log'):
+                if job.get(key) is not None:
+                    os.makedirs(job[key], exist_ok=True)
+                    file_job[key] = os.path.join(job[key], name if key == 'output' else f'{stem}_log{extension}')
+            jobs.append(file_job)
+    return jobs
+
+
+def run_job(job: dict) -> dict:
+    """Redacts the file of one job and returns its summary: rows, wall and CPU time and the peak memory the job
+    allocated, traced with tracemalloc like StageTimer, or the error when it failed. A worker process runs
+    several jobs, so its own peak would hold the largest job it ran before."""
+    report = {key: value for key, value in job.items() if key != 'input'}
+    report['df'] = job['input']
+    if report.get('output') is None:
+        report['output'] = _default_output(job['input'])
+    summary = {'input': job['input'], 'output': report['output'], 'status': 'ok', 'rows': None,
+               'seconds': None, 'cpu_seconds': None, 'peak_memory_mb': None, 'error': None}
+    with StageTimer(profile_memory=True) as timer:
+        try:
+            for key in ('output', 'log'):
+                if report.get(key) is not None and os.path.dirname(report[key]):
+                    os.makedirs(os.path.dirname(report[key]), exist_ok=True)
+            redact_report(report)
+        except Exception as error:
+            logger.exception('Job %s failed', job['input'])
+            summary.update(status='failed', error=f'{type(error).__name__}: {error}')
+    if summary['status'] == 'ok':
+        summary['rows'] = _count_rows(report['output'])
+    summary['seconds'] = round(timer.wall_seconds, 3)
+    summary['cpu_seconds'] = round(timer.cpu_seconds, 3)
+    summary['peak_memory_mb'] = None if timer.peak_memory_mb is None else round(timer.peak_memory_mb, 1)
+    return summary
+
+
+def _default_output(input_path: str) -> str:
+    stem, extension = os.path.splitext(input_path)
+    return f'{stem}_redacted{extension}'
+
+
+def _count_rows(path: str) -> int:
+    if file_format(path) == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    if file_format(path) != 'csv':
+        return None
+    with open(path) as output_file:
+        return max(sum(1 for _ in output_file) - 1, 0)
+
+
+def run_jobs(jobs: list, n_jobs: int = None) -> pd.DataFrame:
+    """Runs the jobs on n_jobs worker processes and returns their summaries in the order of the jobs"""
+    with process_pool(n_jobs) as pool:
+        if pool is None:
+            summaries = [run_job(job) for job in jobs]
+        else:
+            futures = [pool.submit(run_job, job) for job in jobs]
+            summaries = [future.result() for future in futures]
+    return pd.DataFrame(summaries, columns=['input', 'output', 'status', 'rows', 'seconds', 'cpu_seconds',
+                                            'peak_memory_mb', 'error'])
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='dar-tool', description='Redacts the report files listed in a manifest.')
+    parser.add_argument('manifest', help='JSON or YAML manifest of the jobs')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes, -1 uses every core (default: n_jobs of the manifest or 1)')
+    parser.add_argument('--summary', default=None, help='csv or Parquet file to write the job summary to')
+    parser.add_argument('--log-level', default=None,
+                        help='level of the logs printed, eg DEBUG or WARNING (default: DART_LOG_LEVEL or INFO)')
+    args = parser.parse_args(argv)
+    LogUtil.configure_logging(args.log_level)
+
+    manifest = load_manifest(args.manifest)
+    jobs = expand_jobs(manifest, os.path.dirname(os.path.abspath(args.manifest)))
+    n_jobs = args.jobs if args.jobs is not None else manifest.get('n_jobs')
+    logger.info('Running %s jobs', len(jobs))
+    start = time.perf_counter()
+    df_summary = run_jobs(jobs, n_jobs)
+
+    print(df_summary.drop(columns='error').to_string(index=False))
+    for row in df_summary[df_summary['status'] != 'ok'].itertuples():
+        print(f'{row.input}: {row.error}', file=sys.stderr)
+    print(f'{len(df_summary)} jobs, {(df_summary["status"] != "ok").sum()} failed, '
+          f'{time.perf_counter() - start:.1f} seconds')
+    if args.summary is not None:
+        write_table(df_summary, args.summary)
+    return int((df_summary['status'] != 'ok').any())
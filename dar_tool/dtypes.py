@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from .encoding import NULL_CODE
+from .table_io import dictionary_encode
+
+# Signed types only, the null code of the key columns is -1
+INTEGER_TYPES = (np.int8, np.int16, np.int32, np.int64)
+# Largest count a float32 MinimumValue holds exactly
+FLOAT32_EXACT = 2 ** 24
+
+
+def integer_type(low: int, high: int):
+    """Narrowest signed integer type holding every value from low to high"""
+    for candidate in INTEGER_TYPES:
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            return candidate
+    return np.int64
+
+
+class DtypePlan:
+    """Narrow types of the log and of the redacted data, chosen from the values of one run.
+
+    The counts get the narrowest integer type holding the sum of every row, as an aggregate level never adds
+    up to more, and MinimumValue float32 when the counts are exact in it. The coded organization and
+    sensitive columns of the log get the narrowest type holding their codes, and the redacted data and the
+    log returned hold them as categoricals, with Redact and RedactBreakdown as categoricals as well.
+    saved_bytes adds up what the narrow types of the log saved against the default ones.
+    """
+
+    def __init__(self, df: DataFrame, frequency_columns: list, labels: dict):
+        counts = df[frequency_columns].to_numpy(dtype=np.int64)
+        low = min(0, counts.clip(max=0).sum(axis=0).min(initial=0))
+        high = counts.clip(min=0).sum(axis=0).max(initial=0)
+        self.count_type = integer_type(low, high)
+        self.minimum_type = np.float32 if max(-low, high) < FLOAT32_EXACT else np.float64
+        self.code_types = {column: integer_type(NULL_CODE, len(column_labels)) for column, column_labels in labels.items()}
+        self.frequency_columns = list(frequency_columns)
+        self.saved_bytes = 0
+
+    def log_types(self, df_log: DataFrame) -> dict:
+        types = {column: code_type for column, code_type in self.code_types.items() if column in df_log.columns}
+        # The other frequency columns of a log are only filled on the detail rows, they are left as they are
+        types.update({column: self.count_type for column in self.frequency_columns
+                      if column in df_log.columns and pd.api.types.is_integer_dtype(df_log[column])})
+        types.update({column: self.minimum_type for column in df_log.columns if str(column).startswith('MinimumValue')})
+        if 'Grouping' in df_log.columns:
+            types['Grouping'] = integer_type(0, int(df_log['Grouping'].max()) if len(df_log) else 0)
+        return types
+
+    def compact_log(self, df_log: DataFrame) -> DataFrame:
+        """Returns df_log with the narrow types, counting the bytes saved"""
+        types = self.log_types(df_log)
+        before = df_log[list(types)].memory_usage(index=False).sum()
+        df_log = df_log.astype(types)
+        self.saved_bytes += int(before - df_log[list(types)].memory_usage(index=False).sum())
+        return df_log
+
+    def compact_output(self, df: DataFrame) -> DataFrame:
+        """Returns the redacted data or the rendered log with the narrow types: the counts that are still
+        numbers, RedactBinary as int8 and the labels as categoricals"""
+        types = {column: self.count_type for column in self.frequency_columns
+                 if column in df.columns and pd.api.types.is_integer_dtype(df[column])}
+        types.update({column: np.int8 for column in df.columns if str(column).startswith('RedactBinary')})
+        return dictionary_encode(df.astype(types))
+
+    @property
+    def saved_mb(self) -> float:
+        return self.saved_bytes / 2 ** 20
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+# Code given to null values. Grouping and joining on the codes treats null as one more value.
+NULL_CODE = -1
+
+
+class CategoricalCodes:
+    """Integer codes for the organization and sensitive columns of a DataFrame.
+
+    Each column is factorized once into int32 codes. The codes follow the sort order of the labels, so a
+    groupby on the codes returns the groups in the same order as a groupby on the labels. Sensitive columns
+    are compared as strings, only their distinct values are converted with astype(str).
+    Labels are only looked up again when a frame is decoded for output.
+    """
+
+    def __init__(self, df: DataFrame, organization_columns: list, sensitive_columns: list):
+        self.codes: dict = {}
+        self.labels: dict = {}
+        for column in organization_columns:
+            self.codes[column], self.labels[column] = self.factorize(df[column])
+        for column in sensitive_columns:
+            self.codes[column], self.labels[column] = self.factorize(df[column], as_string=True)
+
+    @classmethod
+    def from_codes(cls, codes: dict, labels: dict):
+        """Rebuilds the codes of a frame that was already encoded, eg in a worker process"""
+        encoded_columns = cls.__new__(cls)
+        encoded_columns.codes = dict(codes)
+        encoded_columns.labels = dict(labels)
+        return encoded_columns
+
+    @staticmethod
+    def factorize(values, as_string: bool = False):
+        codes, labels = pd.factorize(values, sort=True)
+        if as_string:
+            null_rows = codes == NULL_CODE
+            if null_rows.any():
+                # Null is converted like any other value, depending on the pandas version it stays null or becomes
+                # the string of the null value, 'None' or 'nan', so the nulls are converted one by one
+                null_codes, null_labels = pd.factorize(pd.Series(values[null_rows]).astype(str))
+                if (null_codes == NULL_CODE).any():
+                    null_codes = np.where(null_codes == NULL_CODE, len(null_labels), null_codes)
+                    null_labels = null_labels.insert(len(null_labels), np.nan)
+                codes = codes.copy()
+                codes[null_rows] = len(labels) + null_codes
+                labels = labels.append(null_labels)
+            # Distinct values can collapse into the same string, so factorize the converted labels again
+            label_codes, labels = pd.factorize(labels.astype(str), sort=True)
+            codes = label_codes[codes]
+        return codes.astype(np.int32), labels
+
+    def frame(self, columns: list, index=None) -> DataFrame:
+        """Returns the codes of the given columns as a DataFrame"""
+        return pd.DataFrame({column: self.codes[column] for column in columns}, index=index)
+
+    def decode(self, column: str, codes, categorical: bool = False):
+        """Looks up the labels of an array of codes, null codes become null values. A categorical keeps the
+        codes and holds every label once."""
+        if categorical:
+            return pd.Categorical.from_codes(np.asarray(codes), categories=self.labels[column])
+        return self.labels[column].array.take(np.asarray(codes), allow_fill=True)
+
+    def decode_frame(self, df: DataFrame, categorical: bool = False) -> DataFrame:
+        """Returns a copy of df with every coded column replaced by its labels"""
+        df_decoded = df.copy()
+        for column in self.codes:
+            if column in df_decoded.columns:
+                df_decoded[column] = self.decode(column, df_decoded[column].to_numpy(), categorical)
+        return df_decoded
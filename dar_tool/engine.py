@@ -0,0 +1,95 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import NamedTuple
+
+from pandas import DataFrame
+
+from .backends import get_backend
+from .instrumentation import CancellationToken
+from .suppression_check import DataAnonymizer
+
+
+class RedactionResult(NamedTuple):
+    """Result of AnonymizerConfig.run: the redacted data, the log and the metrics of every stage"""
+    df_redacted: DataFrame
+    df_log: DataFrame
+    stages: DataFrame
+
+
+@dataclass(frozen=True)
+class AnonymizerConfig:
+    """
+    The settings of a redaction, which can not be changed once made, and run(df) to redact a dataframe with them.
+
+    Every run builds its own DataAnonymizer and returns a RedactionResult, nothing of a run is kept on the
+    config, so one config can be shared by any number of threads or sessions and run on several frames at
+    once, see run_many. The dataframe given is not changed. The arguments are those of DataAnonymizer, with
+    frequency_columns (and vectorized) to redact several frequency columns like process_multiple_frequency_col.
+    The runs are single process: n_jobs, executor and profile_memory, which traces the memory of the whole
+    process, are left out.
+    """
+    parent_organization: str = None
+    child_organization: str = None
+    sensitive_columns: tuple = None
+    frequency: str = None
+    redact_column: str = None
+    minimum_threshold: int = 10
+    redact_zero: bool = False
+    redact_value: str = None
+    repeat_until_stable: bool = False
+    backend: object = None
+    low_memory: bool = False
+    compact_dtypes: bool = False
+    frequency_columns: tuple = None
+    vectorized: bool = True
+
+    def __post_init__(self):
+        # Lists given are frozen as tuples, so the config can not be changed through them
+        for name in ('sensitive_columns', 'frequency_columns'):
+            value = getattr(self, name)
+            if isinstance(value, list):
+                object.__setattr__(self, name, tuple(value))
+        if self.frequency is None and not self.frequency_columns:
+            raise KeyError("A frequency column or frequency_columns must be given.")
+        if self.repeat_until_stable not in [True, False]:
+            raise ValueError("Value for repeat_until_stable should be True or False, not {}.".format(
+                self.repeat_until_stable))
+        if int(self.minimum_threshold) < 0:
+            raise ValueError("Minimum threshold for redaction must be a positive number.")
+        get_backend(self.backend)
+
+    def replace(self, **changes) -> 'AnonymizerConfig':
+        """Returns a new config with the changes, this one is left as it is"""
+        return replace(self, **changes)
+
+    def anonymizer(self, df: DataFrame, progress=None, cancel_token: CancellationToken = None) -> DataAnonymizer:
+        """A new DataAnonymizer with these settings, only used by the run that asked for it"""
+        sensitive_columns = list(self.sensitive_columns) if isinstance(self.sensitive_columns, tuple) else self.sensitive_columns
+        frequency = self.frequency if self.frequency is not None else self.frequency_columns[-1]
+        return DataAnonymizer(df, parent_organization=self.parent_organization, child_organization=self.child_organization,
+                              sensitive_columns=sensitive_columns, frequency=frequency, redact_column=self.redact_column,
+                              minimum_threshold=self.minimum_threshold, redact_zero=self.redact_zero,
+                              redact_value=self.redact_value, repeat_until_stable=self.repeat_until_stable,
+                              backend=self.backend, low_memory=self.low_memory, compact_dtypes=self.compact_dtypes,
+                              progress=progress, cancel_token=cancel_token)
+
+    def run(self, df: DataFrame, progress=None, cancel_token: CancellationToken = None) -> RedactionResult:
+        """Redacts df with these settings. progress and cancel_token belong to this run, see DataAnonymizer."""
+        anonymizer = self.anonymizer(df, progress, cancel_token)
+        if self.frequency_columns:
+            df_redacted = anonymizer.process_multiple_frequency_col(list(self.frequency_columns), vectorized=self.vectorized)
+        else:
+            df_redacted = anonymizer.apply_anonymization()
+        return RedactionResult(df_redacted, anonymizer.get_log(), anonymizer.stage_report.to_frame())
+
+    def run_many(self, frames: list, max_workers: int = None, executor: Executor = None,
+                 cancel_token: CancellationToken = None) -> list:
+        """Redacts every frame on a pool of max_workers threads, or on the executor given, and returns the
+        results in the order of the frames. The threads share the process, the numpy and pandas kernels that
+        release the GIL run side by side. Cancelling cancel_token stops every run."""
+        def run(df):
+            return self.run(df, cancel_token=cancel_token)
+        if executor is not None:
+            return [future.result() for future in [executor.submit(run, df) for df in frames]]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(run, frames))
@@ -0,0 +1,97 @@
+import numpy as np
+from pandas import DataFrame
+
+
+class Groups:
+    """The groups of the log for one set of key columns, in CSR form.
+
+    rows holds the log rows covered and ids the group of each of them, the rows of group g are
+    rows[order[offsets[g]:offsets[g + 1]]]. The reductions take arrays lined up with rows (see take),
+    with one column per frequency column of the log, and a boolean mask of the same shape, so a pass
+    can reduce over the redacted or the not redacted rows of every group with one call. The results
+    are scattered back to the rows with result[ids].
+    """
+
+    def __init__(self, ids, n_groups: int, rows=None):
+        # The index keeps the groups of every set of key columns, int32 positions halve what it holds
+        position_type = np.int32 if len(ids) < 2 ** 31 else np.int64
+        self.ids = ids.astype(position_type, copy=False)
+        self.n_groups = n_groups
+        self.rows = rows
+        self.sizes = np.bincount(self.ids, minlength=n_groups)
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes)])
+        self.order = np.argsort(self.ids, kind='stable').astype(position_type, copy=False)
+
+    def take(self, values):
+        """Lines up a column of the whole log with the rows of these groups"""
+        return values if self.rows is None else values[self.rows]
+
+    def positions(self, mask):
+        """Log rows and frequency columns of the values in mask"""
+        rows, columns = np.nonzero(mask)
+        return (rows if self.rows is None else self.rows[rows]), columns
+
+    def select(self, group_ids):
+        """Returns the same groups restricted to the rows of group_ids, found from the offsets
+        without looking at the rows of the other groups"""
+        group_ids = np.unique(group_ids)
+        sizes = self.sizes[group_ids]
+        # Position of every selected row in order: the start of its group plus its rank in the group
+        starts = np.repeat(self.offsets[group_ids] - np.concatenate([[0], np.cumsum(sizes)[:-1]]), sizes)
+        selected = self.order[starts + np.arange(sizes.sum())]
+        rows = selected if self.rows is None else self.rows[selected]
+        return Groups(self.ids[selected], self.n_groups, rows)
+
+    def _reduce(self, ufunc, values, empty_value):
+        """Applies ufunc over the rows of every group, values is 1-D or has one column per frequency column"""
+        result = np.full((self.n_groups,) + values.shape[1:], empty_value, dtype=values.dtype)
+        not_empty = self.sizes > 0
+        if not_empty.any():
+            result[not_empty] = ufunc.reduceat(values[self.order], self.offsets[:-1][not_empty], axis=0)
+        return result
+
+    def count(self, mask):
+        """Number of rows in mask for every group"""
+        return self._reduce(np.add, mask.astype(np.int64), 0)
+
+    def sum(self, values, mask):
+        """Sum of values over the rows in mask for every group"""
+        return self._reduce(np.add, np.where(mask, values, 0), 0)
+
+    def min(self, values, mask):
+        """Minimum of values over the rows in mask for every group, NaN when the group has no such row"""
+        minimum = self._reduce(np.minimum, np.where(mask, values, np.inf), np.inf)
+        minimum[np.isinf(minimum)] = np.nan
+        return minimum
+
+
+class GroupIndex:
+    """Group membership of every log row, built once per log.
+
+    The suppression passes group the log by the same key columns over and over while only
+    RedactBinary changes, so the group of each row is worked out once per set of key columns
+    and reused instead of grouping and merging the log again on every pass.
+    The key columns are the Grouping column and the coded organization and sensitive columns,
+    null codes are a value like any other.
+    """
+
+    def __init__(self, df: DataFrame, key_columns: list):
+        self.n_rows = len(df)
+        self.columns: dict = {column: df[column].to_numpy() for column in key_columns}
+        self.groups_by_key: dict = {}
+
+    def groups(self, group_by_col: list, touched_rows=None) -> Groups:
+        """Groups of the log for group_by_col. When touched_rows is given only the groups holding
+        one of those rows are returned."""
+        key = tuple(group_by_col)
+        if key not in self.groups_by_key:
+            ids = np.zeros(self.n_rows, dtype=np.int64)
+            for column in group_by_col:
+                _, codes = np.unique(self.columns[column], return_inverse=True)
+                # Renumber after every column so the combined ids stay below n_rows * cardinality
+                _, ids = np.unique(ids * (codes.max(initial=0) + 1) + codes, return_inverse=True)
+            self.groups_by_key[key] = Groups(ids, ids.max(initial=-1) + 1)
+        groups = self.groups_by_key[key]
+        if touched_rows is None:
+            return groups
+        return groups.select(groups.ids[touched_rows])
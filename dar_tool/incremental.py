@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from util import LogUtil
+from .parallel import process_pool
+from .sharding import SHARD_ROW, _check_shardable, _combine_results, _redact_shards, _sharded_settings
+
+logger = LogUtil.create_logger(__name__)
+
+
+class RedactionState:
+    """A redaction that can be updated with a delta of rows, see redact_incremental and update_redaction.
+
+    df holds the current rows, df_redacted and df_log the redacted data and the summary log, like the result
+    of anonymize_by_parent. Every parent organization is redacted on its own and its results are kept by the
+    cross suppression decisions they were redacted with, so an update redacts the parents whose rows changed
+    again and the other parents only when the decisions of the whole data changed.
+    """
+
+    def __init__(self, df: DataFrame, settings: dict, parent_results: dict, df_redacted: DataFrame,
+                 df_log: DataFrame):
+        self.settings = settings
+        # The rows keep their SHARD_ROW id across updates, new rows get new ids
+        self._df = df
+        self._parent_results = parent_results
+        self.df_redacted = df_redacted
+        self.df_log = df_log
+
+    @property
+    def df(self) -> DataFrame:
+        return self._df.drop(columns=SHARD_ROW)
+
+    @property
+    def key_columns(self) -> list:
+        return _key_columns(self.settings)
+
+
+def _key_columns(settings: dict) -> list:
+    """Organization and sensitive columns, which tell the rows of the data apart"""
+    sensitive_columns = settings.get('sensitive_columns')
+    sensitive_columns = list(sensitive_columns) if isinstance(sensitive_columns, (list, tuple)) else [sensitive_columns]
+    organization_columns = [settings['parent_organization'], settings.get('child_organization')]
+    return [column for column in organization_columns if column is not None] + sensitive_columns
+
+
+def _parent_key(value):
+    """Key of a parent organization in RedactionState, None for an empty parent"""
+    return None if pd.isna(value) else value
+
+
+def redact_incremental(df: DataFrame, parent_organization: str, n_jobs: int = None, executor=None,
+                       **settings) -> RedactionState:
+    """
+    Redacts df like anonymize_by_parent, one shard per parent organization, and returns a RedactionState
+    that update_redaction redacts again after rows were added, corrected or removed.
+
+    The organization and sensitive columns must tell the rows apart, the delta finds its rows by them.
+    settings are the other DataAnonymizer arguments, one frequency column is redacted. Like anonymize_by_parent
+    it redacts like DataAnonymizer(..., positional_cross_join=False), not the default DataAnonymizer.
+    """
+    settings = dict(_sharded_settings(settings, 'redact_incremental'), parent_organization=parent_organization)
+    _check_shardable(df, parent_organization, settings.get('child_organization'))
+    key_columns = _key_columns(settings)
+    if df.duplicated(key_columns).any():
+        raise ValueError(f"The columns {key_columns} must tell the rows apart to redact incrementally, "
+                         f"some rows share their values.")
+    df = df.assign(**{SHARD_ROW: np.arange(len(df))})
+    state, _ = _redact(df, settings, {}, n_jobs, executor)
+    return state
+
+
+def update_redaction(state: RedactionState, inserted: DataFrame = None, updated: DataFrame = None,
+                     deleted: DataFrame = None, n_jobs: int = None, executor=None):
+    """
+    Applies a delta of rows to a redaction and returns (new state, diff).
+
+    inserted holds new rows, updated the new values of existing rows and deleted the rows to remove, all found
+    by the organization and sensitive columns (deleted only needs those). Only the parent organizations with
+    a changed row are redacted again, the levels without an organization are rolled up again from the totals
+    of every parent, and the result matches a redaction of the updated data from scratch. The other parents
+    are only redacted again when the cross suppression decisions of the whole data changed, then the results
+    they had for those decisions are used when they are kept.
+
+    diff holds the cells of the summary log whose redaction changed: Change is 'Redacted' for a cell redacted
+    now and not before, new cells included, 'Unredacted' for a cell not redacted anymore and 'Removed' for a
+    redacted cell that left the log with its deleted rows, see redaction_diff.
+    The state given is left as it was.
+    """
+    settings = state.settings
+    key_columns = state.key_columns
+    df = state._df
+    keys = pd.MultiIndex.from_frame(df[key_columns])
+    changed_parents = set()
+
+    if deleted is not None and len(deleted):
+        deleted_rows = _find_rows(keys, deleted, key_columns, 'delete')
+        changed_parents.update(df[settings['parent_organization']].iloc[deleted_rows].map(_parent_key))
+        df = df.drop(index=df.index[deleted_rows])
+        keys = pd.MultiIndex.from_frame(df[key_columns])
+
+    if updated is not None and len(updated):
+        updated_rows = _find_rows(keys, updated, key_columns, 'update')
+        columns = [column for column in updated.columns if column not in key_columns]
+        missing = [column for column in columns if column not in df.columns or column == SHARD_ROW]
+        if missing:
+            raise KeyError(f"The updated columns {missing} are not columns of the data.")
+        # The updated rows are replaced as a whole, so a column can change its type
+        df_updated = df.iloc[updated_rows].assign(**{column: updated[column].to_numpy() for column in columns})
+        df = pd.concat([df.drop(index=df.index[updated_rows]), df_updated]).loc[df.index]
+        changed_parents.update(updated[settings['parent_organization']].map(_parent_key))
+
+    if inserted is not None and len(inserted):
+        inserted_keys = pd.MultiIndex.from_frame(inserted[key_columns])
+        if inserted_keys.isin(keys).any() or inserted_keys.duplicated().any():
+            raise ValueError(f"The inserted rows must have new values of {key_columns}, some rows already exist.")
+        next_row = int(state._df[SHARD_ROW].max()) + 1 if len(state._df) else 0
+        inserted = inserted.assign(**{SHARD_ROW: np.arange(next_row, next_row + len(inserted))})
+        df = pd.concat([df, inserted[[column for column in df.columns if column in inserted.columns]]],
+                       ignore_index=True)
+        changed_parents.update(inserted[settings['parent_organization']].map(_parent_key))
+
+    df = df.reset_index(drop=True)
+    _check_shardable(df.drop(columns=SHARD_ROW), settings['parent_organization'], settings.get('child_organization'))
+    parent_results = {parent: dict(results) for parent, results in state._parent_results.items()
+                      if parent not in changed_parents}
+    logger.info('Redacting %s changed parent organizations again.', len(changed_parents))
+    new_state, redactions = _redact(df, settings, parent_results, n_jobs, executor)
+    logger.info('Redacted %s shards, the other results were kept.', redactions)
+    return new_state, redaction_diff(state.df_log, new_state.df_log, key_columns)
+
+
+def _find_rows(keys: pd.MultiIndex, df_delta: DataFrame, key_columns: list, action: str):
+    """Positions of the rows of df_delta in the data"""
+    missing = [column for column in key_columns if column not in df_delta.columns]
+    if missing:
+        raise KeyError(f"The rows to {action} need the columns {missing} to be found.")
+    rows = keys.get_indexer(pd.MultiIndex.from_frame(df_delta[key_columns]))
+    if (rows == -1).any():
+        raise KeyError(f"Some rows to {action} are not in the data: "
+                       f"{df_delta[key_columns][rows == -1].head().to_dict('records')}")
+    return rows
+
+
+def _redact(df: DataFrame, settings: dict, parent_results: dict, n_jobs: int = None, executor=None):
+    """Redacts df one parent per shard, with the results kept in parent_results. Returns the new state and the
+    number of shard redactions run."""
+    parent_organization = settings['parent_organization']
+    parents, shards = [], []
+    for parent, df_shard in df.groupby(parent_organization, dropna=False, sort=True):
+        parents.append(_parent_key(parent))
+        shards.append(df_shard)
+    cache = [parent_results.get(parent, {}) for parent in parents]
+    cached = sum(len(results) for results in cache)
+
+    with process_pool(n_jobs, executor) as pool:
+        results = _redact_shards(pool, shards, settings, cache=cache)
+    if results is None:
+        logger.info('The shards did not agree, redacting the data as one shard.')
+        results = _redact_shards(None, [df], settings)
+        # No result of one parent is kept, the next update redacts every parent
+        parent_results = {}
+    else:
+        parent_results = dict(zip(parents, cache))
+    redactions = sum(len(results) for results in cache) - cached
+
+    df_redacted, df_log = _combine_results(*results, settings)
+    # Rows go back in the order of df
+    order = pd.Series(np.arange(len(df)), index=df[SHARD_ROW].to_numpy())
+    df_redacted = df_redacted.iloc[np.argsort(order[df_redacted[SHARD_ROW]].to_numpy(), kind='stable')]
+    df_redacted = df_redacted.drop(columns=SHARD_ROW).reset_index(drop=True)
+    return RedactionState(df, settings, parent_results, df_redacted, df_log), redactions
+
+
+def redaction_diff(df_before: DataFrame, df_after: DataFrame, key_columns: list) -> DataFrame:
+    """Cells of the log df_after whose RedactBinary changed from df_before, with a Change column that is
+    'Redacted' or 'Unredacted'. A cell only in df_after is 'Redacted' when it is redacted. A cell only in
+    df_before, eg of a deleted row, is 'Removed' when it was redacted, with the values it had in df_before."""
+    match_columns = ['Grouping'] + list(key_columns)
+    df_merged = df_after.merge(df_before[match_columns + ['RedactBinary']], on=match_columns, how='left',
+                               suffixes=('', 'Before'))
+    before = df_merged['RedactBinaryBefore'].fillna(0).to_numpy() == 1
+    after = df_merged['RedactBinary'].to_numpy() == 1
+    df_diff = df_merged[before != after].drop(columns='RedactBinaryBefore')
+    df_diff.insert(len(df_diff.columns), 'Change', np.where(after[before != after], 'Redacted', 'Unredacted'))
+
+    df_removed = df_before.merge(df_after[match_columns], on=match_columns, how='left', indicator=True)
+    removed = (df_removed['_merge'] == 'left_only').to_numpy() & (df_removed['RedactBinary'].to_numpy() == 1)
+    if removed.any():
+        df_removed = df_removed[removed].drop(columns='_merge').assign(Change='Removed')
+        df_diff = pd.concat([df_diff, df_removed[df_diff.columns]])
+    return df_diff.reset_index(drop=True)
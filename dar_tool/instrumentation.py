@@ -0,0 +1,165 @@
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+from pandas import DataFrame
+
+# Keys of the metrics of every stage, in the order of StageReport.to_frame
+STAGE_METRICS = ['stage', 'frequency', 'wall_seconds', 'cpu_seconds', 'peak_memory_mb', 'rows_in', 'rows_out',
+                 'newly_redacted']
+# Keys of the progress reported for every step of a stage
+PROGRESS_KEYS = ['stage', 'frequency', 'step', 'steps', 'combination', 'combinations', 'rows']
+
+
+class StageReport:
+    """Metrics of every stage a DataAnonymizer ran, one dict per stage in the order they ran.
+
+    A stage is validate_inputs, create_log, a suppression pass or apply_log. Its metrics are the stage name,
+    the frequency column(s) redacted, the wall and CPU seconds, the peak memory allocated by the stage in MB
+    (None unless the anonymizer profiles memory), the rows in and out (data or log rows) and the number of
+    values the stage redacted. Stages of later runs are added after the earlier ones, clear starts over.
+    """
+
+    def __init__(self):
+        self.stages: list = []
+
+    def add(self, metrics: dict):
+        self.stages.append(metrics)
+
+    def clear(self):
+        self.stages = []
+
+    def to_frame(self) -> DataFrame:
+        return pd.DataFrame(self.stages, columns=STAGE_METRICS)
+
+    def totals(self) -> DataFrame:
+        """Seconds, peak memory and redactions of every stage name over all of its runs"""
+        return self.to_frame().groupby('stage', sort=False).agg(
+            runs=('stage', 'size'), wall_seconds=('wall_seconds', 'sum'), cpu_seconds=('cpu_seconds', 'sum'),
+            peak_memory_mb=('peak_memory_mb', 'max'), newly_redacted=('newly_redacted', 'sum')).reset_index()
+
+
+# Stages tracing memory right now. tracemalloc traces the whole process, it is started by the first of them
+# and stopped by the last, under the lock, so stages that overlap on several threads do not stop each other.
+_memory_lock = threading.Lock()
+_traced_timers: set = set()
+_started_tracing = False
+
+
+def _fold_peak():
+    """Adds the peak traced since the last reset to every stage tracing, then starts a new peak"""
+    peak = tracemalloc.get_traced_memory()[1]
+    for timer in _traced_timers:
+        timer.peak_memory = max(timer.peak_memory, peak)
+    tracemalloc.reset_peak()
+
+
+class StageTimer:
+    """Measures one stage: wall and CPU time, and the peak memory it allocated when profile_memory is True.
+
+    The CPU time is the one of the thread that runs the stage, so stages run side by side on a thread pool
+    (AnonymizerConfig.run_many, the jobs of the app) do not count each other's work. The threads a stage
+    starts itself, eg those of the duckdb and polars backends, are not counted either. Memory is traced with
+    tracemalloc, which slows the stage down, so it is only done on request. tracemalloc traces the whole
+    process, the peak holds the allocations of other threads running at the same time. Stages that overlap,
+    nested or on other threads, share the tracing: it runs until the last of them ends and every stage gets
+    the peak of its own run. A tracing started by other code is left running, its peak is reset.
+    """
+
+    def __init__(self, profile_memory: bool = False):
+        self.profile_memory = profile_memory
+        self.tracing = False
+
+    def __enter__(self):
+        global _started_tracing
+        self.start_memory = None
+        if self.profile_memory:
+            with _memory_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _started_tracing = True
+                _fold_peak()
+                self.start_memory = self.peak_memory = tracemalloc.get_traced_memory()[0]
+                _traced_timers.add(self)
+                self.tracing = True
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _started_tracing
+        self.wall_seconds = time.perf_counter() - self.start
+        self.cpu_seconds = time.thread_time() - self.cpu_start
+        self.peak_memory_mb = None
+        if self.tracing:
+            with _memory_lock:
+                _fold_peak()
+                _traced_timers.discard(self)
+                if not _traced_timers and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
+            self.tracing = False
+            self.peak_memory_mb = (self.peak_memory - self.start_memory) / 2 ** 20
+        return False
+
+
+class RedactionCancelled(Exception):
+    """Raised by a DataAnonymizer stopped with its cancellation token"""
+
+
+class CancellationToken:
+    """Asks a running DataAnonymizer to stop, from any thread.
+
+    The anonymizer looks at the token before every stage and between the sensitive combinations of a stage,
+    and raises RedactionCancelled once cancel was called. Its log is then left half done, the next run
+    builds it again.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self, stage: str):
+        if self.cancelled:
+            raise RedactionCancelled(f"The redaction was cancelled in the {stage} stage.")
+
+
+class StageProgress:
+    """Progress of one stage, reported after every step: a grouping set of create_log, a sensitive combination
+    of a suppression pass, or the whole stage when it works on every combination at once.
+
+    The callback is called with a dict of PROGRESS_KEYS: the stage, the frequency column(s), the step done out
+    of steps, the index (from 1) of the sensitive combination of the step out of combinations, None when the
+    step has none, and the rows looked at so far in the stage. The token is looked at after every step.
+    """
+
+    def __init__(self, stage: str, frequency: str, steps: int, sensitive_combinations: list, callback=None,
+                 token: CancellationToken = None):
+        self.stage = stage
+        self.frequency = frequency
+        self.steps = steps
+        self.sensitive_combinations = [tuple(combination) for combination in sensitive_combinations]
+        self.sensitive_columns = {column for combination in self.sensitive_combinations for column in combination}
+        self.callback = callback
+        self.token = token
+        self.done = 0
+        self.rows = 0
+
+    def step(self, columns: list = None, rows: int = 0):
+        """Reports a step on the columns given, its combination is the sensitive columns among them"""
+        self.done += 1
+        self.rows += int(rows)
+        if self.callback is not None:
+            combination = tuple(column for column in columns or [] if column in self.sensitive_columns)
+            index = self.sensitive_combinations.index(combination) + 1 if combination in self.sensitive_combinations else None
+            self.callback({'stage': self.stage, 'frequency': self.frequency, 'step': self.done, 'steps': self.steps,
+                           'combination': index, 'combinations': len(self.sensitive_combinations), 'rows': self.rows})
+        if self.token is not None:
+            self.token.check(self.stage)
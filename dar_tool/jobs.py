@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import CancelledError, Executor
+
+from pandas import DataFrame
+
+from util import LogUtil
+from .instrumentation import CancellationToken, RedactionCancelled
+from .suppression_check import DataAnonymizer
+from .table_io import write_table
+
+logger = LogUtil.create_logger(__name__)
+
+# Stages of a run of every frequency column at once, the progress of a job counts them
+PASS_STAGES = ['redact_user_requested_records', 'less_than_threshold', 'sum_redact', 'one_count_redacted',
+               'one_redact_zero', 'cross_suppression']
+STABLE_PASS_STAGES = ['redact_user_requested_records', 'less_than_threshold', 'suppress_until_stable']
+
+
+class JobCancelled(RedactionCancelled):
+    """Raised by the result of a cancelled job"""
+
+
+class RedactionJob:
+    """
+    Redaction of the frequency columns of a DataAnonymizer run in the background on an executor, like
+    process_multiple_frequency_col.
+
+    The job watches the stages the anonymizer runs: stages holds the metrics of the finished ones, last_step
+    the progress of the last step of the stage running, see StageProgress, and progress the share of the
+    stages done. cancel stops a job that has not started yet, or a running one at its next step, result then
+    raises JobCancelled. The anonymizer must not be used by anything else until the job is done.
+    """
+
+    def __init__(self, anonymizer: DataAnonymizer, frequency_columns: list, executor: Executor,
+                 vectorized: bool = True):
+        self.anonymizer = anonymizer
+        self.frequency_columns = list(frequency_columns) if isinstance(frequency_columns, (list, tuple)) else [frequency_columns]
+        self.vectorized = vectorized
+        self.stages: list = []
+        self.last_step: dict = None
+        passes = STABLE_PASS_STAGES if anonymizer.repeat_until_stable else PASS_STAGES
+        # create_log and the passes once for every column at once, validate_inputs and apply_log as well per column
+        self.expected_stages = 1 + len(passes) if vectorized else (3 + len(passes)) * len(self.frequency_columns)
+        self.cancel_token = CancellationToken()
+        self._output_dir = None
+        self.future = executor.submit(self._run)
+
+    def _observe(self, metrics: dict):
+        self.stages.append(metrics)
+        self.last_step = None
+
+    def _step(self, step: dict):
+        self.last_step = step
+
+    def _run(self) -> DataFrame:
+        anonymizer = self.anonymizer
+        progress, cancel_token = anonymizer.progress, anonymizer.cancel_token
+        anonymizer.observers.append(self._observe)
+        anonymizer.progress, anonymizer.cancel_token = self._step, self.cancel_token
+        try:
+            return anonymizer.process_multiple_frequency_col(self.frequency_columns, vectorized=self.vectorized)
+        finally:
+            anonymizer.observers.remove(self._observe)
+            anonymizer.progress, anonymizer.cancel_token = progress, cancel_token
+
+    def cancel(self):
+        if not self.future.done():
+            logger.info('Cancelling the redaction of %s', self.frequency_columns)
+        self.cancel_token.cancel()
+        self.future.cancel()
+
+    @property
+    def status(self) -> str:
+        """queued, running, done, cancelled or failed"""
+        if not self.future.done():
+            return 'running' if self.future.running() else 'queued'
+        if self.future.cancelled():
+            return 'cancelled'
+        error = self.future.exception()
+        if isinstance(error, RedactionCancelled):
+            return 'cancelled'
+        return 'failed' if error is not None else 'done'
+
+    @property
+    def progress(self) -> float:
+        """Share of the stages done, with the share of the steps done of the stage running, 1 once the job is
+        done. A run that redacts the columns one after the other runs more stages than expected, its progress
+        stays below 1 until it is done."""
+        if self.future.done():
+            return 1.0
+        step = self.last_step
+        stage_done = step['step'] / step['steps'] if step is not None and step['steps'] else 0
+        return min((len(self.stages) + stage_done) / self.expected_stages, 0.99)
+
+    @property
+    def current_stage(self) -> str:
+        """The stage of the last step reported, or the last stage done"""
+        if self.last_step is not None:
+            return self.last_step['stage']
+        return self.stages[-1]['stage'] if self.stages else None
+
+    def result(self, timeout: float = None) -> DataFrame:
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise JobCancelled("The redaction was cancelled before it started.") from None
+        except JobCancelled:
+            raise
+        except RedactionCancelled as error:
+            raise JobCancelled(str(error)) from error
+
+    def output_file(self, extension: str = '.csv') -> str:
+        """Writes the redacted data to a temporary file with the extension, csv or parquet, once per extension,
+        and returns its path, so it can be downloaded without holding another copy of the data"""
+        if self._output_dir is None:
+            self._output_dir = tempfile.mkdtemp(prefix='dart_job_')
+        path = os.path.join(self._output_dir, 'redacted' + extension)
+        if not os.path.exists(path):
+            # Written next to it first, a write that fails leaves no file behind
+            partial_path = os.path.join(self._output_dir, 'partial' + extension)
+            write_table(self.result(), partial_path)
+            os.replace(partial_path, path)
+        return path
+
+    def close(self):
+        """Cancels the job if it still runs and removes its output files"""
+        self.cancel()
+        if self._output_dir is not None:
+            shutil.rmtree(self._output_dir, ignore_errors=True)
+            self._output_dir = None
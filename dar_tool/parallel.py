@@ -0,0 +1,100 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from util import LogUtil
+
+logger = LogUtil.create_logger(__name__)
+
+
+class SharedArrays:
+    """Numpy arrays placed in shared memory so worker processes read them instead of receiving a pickled copy.
+
+    Only the name, dtype and shape of every block is pickled, a worker attaches to the blocks when the object
+    is unpickled. Arrays of Python objects can not be shared and are pickled with the object.
+    The process that created the blocks frees them with close once every worker is done, a worker only closes
+    a copy it attached to itself, see attached. Workers that are threads share the object of the caller.
+    """
+
+    def __init__(self, arrays: dict):
+        self.names = list(arrays)
+        self.blocks: dict = {}
+        self.specs: dict = {}
+        self.objects: dict = {}
+        self.owner = True
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            if values.dtype.hasobject:
+                self.objects[name] = values
+                continue
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, values.dtype, buffer=block.buf)[...] = values
+            self.blocks[name] = block
+            self.specs[name] = (block.name, values.dtype.str, values.shape)
+
+    def __getstate__(self):
+        return {'names': self.names, 'specs': self.specs, 'objects': self.objects}
+
+    def __setstate__(self, state):
+        self.names = state['names']
+        self.specs = state['specs']
+        self.objects = state['objects']
+        self.owner = False
+        self.blocks = {name: shared_memory.SharedMemory(name=block_name)
+                       for name, (block_name, dtype, shape) in self.specs.items()}
+
+    @property
+    def attached(self) -> bool:
+        """True for a copy unpickled in a worker process, which it closes once it is done with the blocks"""
+        return not self.owner
+
+    def arrays(self) -> dict:
+        """Returns the arrays in the order they were given, the shared ones are views on the blocks"""
+        arrays = {}
+        for name in self.names:
+            if name in self.objects:
+                arrays[name] = self.objects[name]
+            else:
+                block_name, dtype, shape = self.specs[name]
+                arrays[name] = np.ndarray(shape, dtype, buffer=self.blocks[name].buf)
+        return arrays
+
+    def close(self):
+        """Detaches from the blocks, the views returned by arrays must not be used afterwards"""
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+
+def worker_count(n_jobs: int) -> int:
+    """Number of worker processes for n_jobs, -1 uses every core"""
+    if n_jobs is None:
+        return 1
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+@contextmanager
+def process_pool(n_jobs: int = None, executor: Executor = None):
+    """Yields the executor to send independent runs to, or None when they run in this process.
+    An executor given by the caller is used as is and left running."""
+    if executor is not None:
+        yield executor
+    elif worker_count(n_jobs) > 1:
+        logger.info('Starting %s worker processes.', worker_count(n_jobs))
+        with ProcessPoolExecutor(max_workers=worker_count(n_jobs)) as pool:
+            yield pool
+    else:
+        yield None
+
+
+def split(items: list, n_parts: int) -> list:
+    """Splits items in at most n_parts consecutive lists of almost the same length"""
+    bounds = np.linspace(0, len(items), min(n_parts, len(items)) + 1).round().astype(int)
+    return [list(items[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
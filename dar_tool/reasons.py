@@ -0,0 +1,90 @@
+import numpy as np
+from pandas import DataFrame
+
+NOT_REDACTED = 'Not Redacted'
+SECONDARY_SUPPRESSION = 'Secondary Suppression'
+# first_reason of a value that is not redacted
+NO_REASON = -1
+
+
+class RedactionReasons:
+    """Why every value of the log is redacted.
+
+    The log can hold several frequency columns, the state is kept for every (row, frequency column) pair.
+    Each reason (a Redact name and a RedactBreakdown text) is given a bit the first time it is used. A value holds
+    the bitmask of its reasons and the code of its first reason, RedactBinary is bits != 0. The order the reasons
+    were applied in is kept as a list of (rows, columns, reason) events so RedactBreakdown can be rebuilt exactly,
+    with a reason repeated when a pass applied it more than once.
+    The Redact and RedactBreakdown strings are only built when the log is rendered.
+    """
+
+    def __init__(self, n_rows: int, n_columns: int = 1):
+        self.redact_names: list[str] = []
+        self.breakdown_names: list[str] = []
+        # Secondary reasons replace the Redact name of a value that was already redacted
+        self.secondary: list[bool] = []
+        self.bits = np.zeros((n_rows, n_columns), dtype=np.int64)
+        self.first_reason = np.full((n_rows, n_columns), NO_REASON, dtype=np.int8)
+        self.events: list = []
+
+    def reason(self, redact_name: str, breakdown_name: str, secondary: bool = False) -> int:
+        """Returns the code of a reason, registering it the first time"""
+        for code in range(len(self.redact_names)):
+            if (self.redact_names[code], self.breakdown_names[code], self.secondary[code]) == (
+                    redact_name, breakdown_name, secondary):
+                return code
+        if len(self.redact_names) == 63:
+            raise ValueError("A log can not hold more than 63 different redaction reasons.")
+        self.redact_names.append(redact_name)
+        self.breakdown_names.append(breakdown_name)
+        self.secondary.append(secondary)
+        return len(self.redact_names) - 1
+
+    @property
+    def redacted(self):
+        return self.bits != 0
+
+    def add(self, rows, columns, code: int):
+        """Applies the reason to the values at (rows, columns), two arrays of positions in the log"""
+        if len(rows) == 0:
+            return
+        self.bits[rows, columns] |= np.int64(1) << code
+        first = self.first_reason[rows, columns] == NO_REASON
+        self.first_reason[rows[first], columns[first]] = code
+        self.events.append((rows, columns, code))
+
+    def redact_labels(self, rows, columns):
+        """Redact name of the values at (rows, columns)"""
+        names = np.array(self.redact_names + [NOT_REDACTED], dtype=object)
+        labels = names[self.first_reason[rows, columns]]
+        secondary_bits = np.int64(sum(1 << code for code, secondary in enumerate(self.secondary) if secondary))
+        labels[(self.bits[rows, columns] & secondary_bits) != 0] = SECONDARY_SUPPRESSION
+        return labels
+
+    def breakdown_labels(self, column: int = 0):
+        """RedactBreakdown of every row of a frequency column: its reasons joined in the order they were applied"""
+        labels = np.full(len(self.bits), NOT_REDACTED, dtype=object)
+        events = [(event_rows[event_columns == column], code) for event_rows, event_columns, code in self.events]
+        events = [(event_rows, code) for event_rows, code in events if len(event_rows) > 0]
+        if events:
+            rows = np.concatenate([event_rows for event_rows, code in events])
+            codes = np.concatenate([np.full(len(event_rows), code) for event_rows, code in events])
+            # Events of the same row next to each other, in the order they were applied
+            order = np.argsort(rows, kind='stable')
+            rows, codes = rows[order], codes[order]
+            names = np.array(self.breakdown_names, dtype=object)[codes]
+            # Position of every event among the events of its row
+            starts = np.flatnonzero(np.concatenate([[True], rows[1:] != rows[:-1]]))
+            rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.append(starts, len(rows))))
+            labels[rows[rank == 0]] = names[rank == 0]
+            for position in range(1, rank.max() + 1):
+                at_position = rank == position
+                labels[rows[at_position]] = labels[rows[at_position]] + ', ' + names[at_position]
+        return labels
+
+    def render(self, df: DataFrame, column: int = 0) -> DataFrame:
+        """Returns df with the RedactBinary, Redact and RedactBreakdown columns of a frequency column"""
+        rows = np.arange(len(self.bits))
+        return df.assign(RedactBinary=self.redacted[:, column].astype(np.int64),
+                         Redact=self.redact_labels(rows, np.full(len(rows), column)),
+                         RedactBreakdown=self.breakdown_labels(column))
@@ -0,0 +1,59 @@
+from pandas import DataFrame
+
+from util import LogUtil
+from .parallel import process_pool
+from .suppression_check import DataAnonymizer
+from .table_io import job_columns, read_table, write_table
+
+logger = LogUtil.create_logger(__name__)
+
+
+def redact_reports(reports: list, n_jobs: int = None, executor=None) -> list:
+    """Redacts independent reports, each one in a worker process when n_jobs or executor is given.
+
+    Every report is a dict of DataAnonymizer arguments with the data under 'df', either a DataFrame or the
+    path of a csv, Parquet, Arrow IPC (Feather) or Excel file. A path is read by the worker, so the data is never
+    pickled to it. Optional keys:
+        frequency_columns: redacts several frequency columns with process_multiple_frequency_col
+        vectorized: passed on to process_multiple_frequency_col
+        project: when True only the columns the redaction needs are read from the file (see job_columns),
+            the result holds only those columns
+        output: path of a file the worker writes the result to, the path is returned instead of the result
+        log: path of a file the worker writes the log (get_log) to
+    Parquet and Arrow outputs store the Redact and RedactBreakdown columns dictionary-encoded.
+    Returns the results in the order of the reports.
+    """
+    with process_pool(n_jobs, executor) as pool:
+        if pool is None:
+            return [redact_report(report) for report in reports]
+        futures = [pool.submit(redact_report, report) for report in reports]
+        return [future.result() for future in futures]
+
+
+def redact_report(report: dict):
+    """Redacts one report of redact_reports"""
+    report = dict(report)
+    df = report.pop('df')
+    frequency_columns = report.pop('frequency_columns', None)
+    vectorized = report.pop('vectorized', False)
+    output = report.pop('output', None)
+    log = report.pop('log', None)
+    project = report.pop('project', False)
+    if not isinstance(df, DataFrame):
+        logger.info('Reading report %s', df)
+        df = read_table(df, job_columns(frequency_columns=frequency_columns, **report) if project else None)
+
+    anonymizer = DataAnonymizer(df, **report)
+    if frequency_columns is None:
+        df_redacted = anonymizer.apply_anonymization()
+    else:
+        df_redacted = anonymizer.process_multiple_frequency_col(frequency_columns, vectorized=vectorized)
+
+    if log is not None:
+        write_table(anonymizer.get_log(), log)
+    if output is None:
+        return df_redacted
+    write_table(df_redacted, output)
+    logger.info('Report written to %s', output)
+    return output
+
@@ -0,0 +1,247 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from util import LogUtil
+from .encoding import NULL_CODE
+from .parallel import process_pool, worker_count
+from .suppression_check import DataAnonymizer
+
+logger = LogUtil.create_logger(__name__)
+
+# Position of every input row, carried through the shards to put the rows back in order
+SHARD_ROW = 'ShardRow'
+# Feedback rounds before the shards are given up on and the data is redacted as one shard
+MAX_FEEDBACK_ROUNDS = 10
+
+
+def anonymize_by_parent(df: DataFrame, parent_organization: str, n_jobs: int = None, executor=None,
+                        max_shard_rows: int = None, **settings):
+    """
+    Redacts df one parent organization at a time and returns (redacted data, summary log).
+
+    Every log level that groups by an organization only holds rows of one parent, as each child belongs
+    to a single parent, so the parents are split in shards that are redacted on their own, in worker
+    processes when n_jobs or executor is given. A shard holds whole parents, consecutive in the sort
+    order, with at most max_shard_rows rows when it is given.
+
+    Two things cross the parents and go through a global reduce:
+        the levels without an organization (eg the totals by SubGroup1) are rolled up from the totals of
+        every shard and redacted on their own,
+        cross suppression looks at a combination only when a redacted value of it exists in any parent,
+        and repeat_until_stable runs as many rounds as the parent that needs the most.
+    The decisions of every shard are combined and fed back, the shards that decided otherwise are redacted
+    again with the combined decisions until they all agree.
+
+    The result matches DataAnonymizer(..., positional_cross_join=False), not the default positional join,
+    which depends on where every row of every parent sits in the log, which a shard can not know. The two
+    can redact different values, see _sharded_settings.
+    settings are the other DataAnonymizer arguments, one frequency column is redacted.
+    """
+    settings = _sharded_settings(settings, 'anonymize_by_parent')
+    _check_shardable(df, parent_organization, settings.get('child_organization'))
+
+    df = df.assign(**{SHARD_ROW: np.arange(len(df))})
+    parent_codes, _ = pd.factorize(df[parent_organization], sort=True)
+    # Null parents go last, like the other null values
+    parent_codes = np.where(parent_codes == -1, parent_codes.max(initial=-1) + 1, parent_codes)
+    shard_of_parent = _shard_parents(np.bincount(parent_codes), worker_count(n_jobs), max_shard_rows)
+    shard_ids = shard_of_parent[parent_codes]
+    shards = [df[shard_ids == shard] for shard in range(shard_of_parent.max(initial=-1) + 1)]
+    logger.info('Redacting %s parent organizations in %s shards.', len(shard_of_parent), len(shards))
+
+    settings = dict(settings, parent_organization=parent_organization)
+    with process_pool(n_jobs, executor) as pool:
+        results = _redact_shards(pool, shards, settings)
+    if results is None:
+        logger.info('The shards did not agree, redacting the data as one shard.')
+        results = _redact_shards(None, [df], settings)
+    df_redacted, df_summary = _combine_results(*results, settings)
+    df_redacted = df_redacted.sort_values(SHARD_ROW, kind='stable').drop(columns=SHARD_ROW).reset_index(drop=True)
+    return df_redacted, df_summary
+
+
+def _sharded_settings(settings: dict, function: str) -> dict:
+    """settings without positional_cross_join, which the shards can not follow: True is refused, and a warning
+    is logged when it is not given, as DataAnonymizer joins by position by default and can redact other values"""
+    settings = dict(settings)
+    if 'positional_cross_join' not in settings:
+        logger.warning('%s redacts like DataAnonymizer(..., positional_cross_join=False), which can differ from the '
+                       'default DataAnonymizer. Pass positional_cross_join=False to confirm.', function)
+    elif settings.pop('positional_cross_join') is not False:
+        raise ValueError(f"{function} can only join the cross suppression minimums by row, "
+                         f"positional_cross_join must be False.")
+    return settings
+
+
+def _check_shardable(df: DataFrame, parent_organization: str, child_organization: str = None):
+    """Raises when df can not be split by parent organization"""
+    if parent_organization is None:
+        raise KeyError("You must specify a parent organization column to shard by.")
+    if SHARD_ROW in df.columns:
+        raise KeyError(f"The column name '{SHARD_ROW}' is used to keep the order of the rows, please rename it.")
+    if child_organization is not None and (df.groupby(child_organization)[parent_organization].nunique(dropna=False) > 1).any():
+        raise ValueError(f"Every '{child_organization}' must belong to a single '{parent_organization}' to shard by it.")
+
+
+def _combine_results(shard_results: list, df_statewide: DataFrame, settings: dict):
+    """Returns the rows of every shard, still with their SHARD_ROW, and the summary log of the whole data"""
+    df_redacted = pd.concat([result[0] for result in shard_results], ignore_index=True)
+
+    organization_columns = [column for column in [settings['parent_organization'], settings.get('child_organization')]
+                            if column is not None]
+    sensitive_columns = settings.get('sensitive_columns')
+    sensitive_columns = list(sensitive_columns) if isinstance(sensitive_columns, (list, tuple)) else [sensitive_columns]
+    df_summary = pd.concat([result[1] for result in shard_results] + [df_statewide], ignore_index=True)
+    # The statewide levels only hold empty organizations, they take the type of the organization levels
+    df_summary = df_summary.astype({column: shard_results[0][1][column].dtype for column in organization_columns})
+    df_summary = df_summary.sort_values(['Grouping'] + organization_columns + sensitive_columns,
+                                        na_position='first', kind='stable').reset_index(drop=True)
+    return df_redacted, df_summary
+
+
+def _shard_parents(parent_sizes, n_shards: int, max_shard_rows: int = None):
+    """Shard of every parent, consecutive parents are put together up to max_shard_rows rows or in
+    n_shards shards of about the same number of rows"""
+    if max_shard_rows is None:
+        starts = np.concatenate([[0], np.cumsum(parent_sizes)[:-1]])
+        return (starts * n_shards // max(parent_sizes.sum(), 1)).astype(np.int64)
+    shard_of_parent = np.zeros(len(parent_sizes), dtype=np.int64)
+    shard, shard_rows = 0, 0
+    for parent, size in enumerate(parent_sizes):
+        if shard_rows > 0 and shard_rows + size > max_shard_rows:
+            shard, shard_rows = shard + 1, 0
+        shard_of_parent[parent] = shard
+        shard_rows += size
+    return shard_of_parent
+
+
+def _redact_shards(pool, shards: list, settings: dict, redact_shard=None, cache: list = None):
+    """
+    Redacts the shards and the levels without an organization until every shard made the cross suppression
+    decisions of the whole data. Returns the result of every shard and the redacted statewide levels, or
+    None when the decisions do not settle.
+    redact_shard(shard, settings, forced) redacts one shard, _redact_shard by default. It returns a tuple
+    like _redact_shard, only the totals, decisions and last round with a change are used here.
+    cache, when given, holds a dict per shard of its results by _forced_key. The results it holds are used
+    instead of redacting the shard again and the new ones are added to it.
+    """
+    redact_shard = _redact_shard if redact_shard is None else redact_shard
+    repeat_until_stable = settings.get('repeat_until_stable', False)
+    forced = [None] * len(shards)
+    results = [None] * len(shards)
+    pending = list(range(len(shards)))
+    statewide_change_round = 0
+    for feedback_round in range(MAX_FEEDBACK_ROUNDS):
+        if cache is not None:
+            for shard in pending:
+                results[shard] = cache[shard].get(_forced_key(forced[shard]))
+        redacted = [shard for shard in pending if results[shard] is None or cache is None]
+        if pool is None:
+            for shard in redacted:
+                results[shard] = redact_shard(shards[shard], settings, forced[shard])
+        else:
+            futures = {shard: pool.submit(redact_shard, shards[shard], settings, forced[shard]) for shard in redacted}
+            for shard, future in futures.items():
+                results[shard] = future.result()
+        if cache is not None:
+            for shard in redacted:
+                cache[shard][_forced_key(forced[shard])] = results[shard]
+
+        # Reduce: a combination is looked at when any shard looks at it, for as many rounds as any shard needs
+        while True:
+            rounds = 1
+            if repeat_until_stable:
+                rounds = max([result[4] for result in results] + [statewide_change_round]) + 1
+            decisions_per_round = max(len(result[3]) // _rounds_run(result, forced[shard], repeat_until_stable)
+                                      for shard, result in enumerate(results))
+            decisions = [any(result[3][index] for result in results if index < len(result[3]))
+                         for index in range(rounds * decisions_per_round)]
+            df_statewide, statewide_change_round = _redact_statewide(results, settings, (decisions, rounds))
+            if not repeat_until_stable or statewide_change_round < rounds:
+                break
+
+        # Feedback: the shards that decided otherwise are redacted again with the combined decisions
+        pending = [shard for shard, result in enumerate(results)
+                   if (forced[shard] or (result[3], _rounds_run(result, None, repeat_until_stable))) != (decisions, rounds)]
+        if not pending:
+            return results, df_statewide
+        logger.info('Feedback round %s redacts %s shards again.', feedback_round + 1, len(pending))
+        for shard in pending:
+            forced[shard] = (decisions, rounds)
+    return None
+
+
+def _forced_key(forced):
+    """Hashable key of the forced decisions and rounds of a shard, None when it was not forced"""
+    return None if forced is None else (tuple(forced[0]), forced[1])
+
+
+def _rounds_run(result, forced, repeat_until_stable: bool) -> int:
+    """Suppression rounds a shard ran: the forced number, or one more than its last round with a change"""
+    if forced is not None:
+        return forced[1]
+    return result[4] + 1 if repeat_until_stable else 1
+
+
+def _redact_shard(df_shard: DataFrame, settings: dict, forced=None):
+    """Worker side of _redact_shards: redacts one shard and returns its rows, its organization levels, its
+    totals for the statewide levels, its cross suppression decisions and its last round with a change"""
+    anonymizer = DataAnonymizer(df_shard, **settings)
+    anonymizer.positional_cross_join = False
+    if forced is not None:
+        anonymizer.forced_cross_decisions, anonymizer.forced_rounds = forced
+    df_redacted = anonymizer.apply_anonymization()
+
+    df_log = anonymizer.get_log()
+    organization_levels = df_log['Grouping'] < _statewide_grouping(anonymizer)
+    df_summary = df_log[organization_levels].drop(columns=_detail_only_columns(anonymizer, df_log))
+    df_totals = df_shard.groupby(anonymizer.sensitive_columns, dropna=False)[anonymizer.frequency].sum().reset_index()
+    return (df_redacted, df_summary, df_totals, anonymizer.cross_decisions, anonymizer.last_change_round)
+
+
+def _redact_statewide(results: list, settings: dict, forced):
+    """Rolls the levels without an organization up from the totals of every shard and redacts them with the
+    cross suppression decisions of the whole data. Returns the levels and their last round with a change."""
+    parent_organization = settings['parent_organization']
+    child_organization = settings.get('child_organization')
+    df_totals = pd.concat([result[2] for result in results], ignore_index=True)
+    df_totals[parent_organization] = np.nan
+    if child_organization is not None:
+        df_totals[child_organization] = np.nan
+    statewide_settings = {key: value for key, value in settings.items() if key not in ('redact_column', 'redact_value')}
+    anonymizer = DataAnonymizer(df_totals, **statewide_settings)
+    frequency = anonymizer.frequency
+
+    df_codes = anonymizer.detail_codes()
+    aggregator = anonymizer.backend.aggregator(df_codes[anonymizer.sensitive_columns + [frequency]],
+                                               anonymizer.sensitive_columns, [frequency])
+    grouping_value = _statewide_grouping(anonymizer)
+    df_levels: list = []
+    for group_by_col, df_grouped in aggregator.grouping_sets(anonymizer.sensitive_combinations):
+        if df_grouped.empty:
+            continue
+        df_levels.append(df_grouped.assign(Grouping=grouping_value))
+        grouping_value += 1
+    key_columns = [column for column in anonymizer.organization_columns if column is not None] + anonymizer.sensitive_columns
+    df_log = pd.concat(df_levels, ignore_index=True).reindex(columns=key_columns + [frequency, 'Grouping'])
+    df_log[key_columns] = df_log[key_columns].fillna(NULL_CODE).astype(np.int32)
+    anonymizer._set_log(df_log, [frequency], df_log[[frequency]].to_numpy())
+
+    anonymizer.positional_cross_join = False
+    anonymizer.forced_cross_decisions, anonymizer.forced_rounds = forced
+    anonymizer._run_suppression()
+    return anonymizer.get_log(), anonymizer.last_change_round
+
+
+def _statewide_grouping(anonymizer: DataAnonymizer) -> int:
+    """Grouping of the first level without an organization, the levels are numbered like in _create_log"""
+    organization_columns = [column for column in anonymizer.organization_columns if column is not None]
+    return len(organization_columns) * len(anonymizer.sensitive_combinations) + 1
+
+
+def _detail_only_columns(anonymizer: DataAnonymizer, df_log: DataFrame) -> list:
+    """Columns of the log that are empty on the organization levels or only hold values of one shard"""
+    key_columns = [column for column in anonymizer.organization_columns if column is not None] + anonymizer.sensitive_columns
+    kept = key_columns + [anonymizer.frequency, 'Grouping', 'RedactBinary', 'Redact', 'RedactBreakdown']
+    return [column for column in df_log.columns if column not in kept]
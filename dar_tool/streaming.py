@@ -0,0 +1,145 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from util import LogUtil
+from .parallel import process_pool
+from .table_io import is_parquet, job_columns
+from .sharding import _redact_shard, _redact_shards, _sharded_settings
+
+logger = LogUtil.create_logger(__name__)
+
+# Rows read from the input file at a time
+CHUNK_ROWS = 100_000
+
+
+def anonymize_file(input_path: str, output_path: str, parent_organization: str, log_path: str = None,
+                   chunksize: int = CHUNK_ROWS, n_buckets: int = 16, n_jobs: int = None, executor=None,
+                   spill_dir: str = None, read_options: dict = None, project: bool = False, **settings) -> str:
+    """
+    Redacts a csv or Parquet file that does not fit in memory and writes the result to output_path.
+
+    The input is read chunksize rows at a time and every row is spilled to one of n_buckets buckets on disk
+    by a hash of its parent organization, so a bucket holds whole parents. The buckets are then redacted one
+    at a time like the shards of anonymize_by_parent, with the same reduce of the levels without an
+    organization and the same feedback of the cross suppression decisions, so the result matches
+    anonymize_by_parent on the whole file, and like it DataAnonymizer(..., positional_cross_join=False), not
+    the default DataAnonymizer. Memory is bounded by the largest bucket instead of the file.
+
+    The redacted rows are written bucket by bucket, the rows of a bucket in the order of the input. log_path,
+    when given, receives the summary log: the organization levels bucket by bucket, then the levels without
+    an organization. The spill files go to a temporary directory in spill_dir and are removed at the end.
+    read_options are passed on to pandas.read_csv, eg dtype to read a key column with the same type in every
+    chunk. When project is True only the columns the redaction needs are read (see job_columns) and written.
+    Parquet files are read and written with pyarrow. settings are the other DataAnonymizer arguments.
+    Returns output_path.
+    """
+    settings = _sharded_settings(settings, 'anonymize_file')
+    child_organization = settings.get('child_organization')
+    if parent_organization is None:
+        raise KeyError("You must specify a parent organization column to split the file by.")
+    if not isinstance(n_buckets, int) or n_buckets < 1:
+        raise ValueError("Value for n_buckets should be a positive whole number, not {}.".format(n_buckets))
+    settings = dict(settings, parent_organization=parent_organization)
+    read_options = dict(read_options or {})
+    if project:
+        read_options['columns'] = job_columns(**settings)
+
+    with tempfile.TemporaryDirectory(dir=spill_dir) as spill:
+        buckets = _spill_buckets(input_path, spill, parent_organization, child_organization, chunksize,
+                                 n_buckets, read_options)
+        logger.info('Redacting %s buckets of %s.', len(buckets), input_path)
+        with process_pool(n_jobs, executor) as pool:
+            results = _redact_shards(pool, buckets, settings, _redact_bucket)
+        if results is None:
+            raise ValueError("The cross suppression decisions of the buckets did not settle, "
+                             "try again with fewer buckets.")
+        bucket_results, df_statewide = results
+
+        _write_chunks(output_path, (pd.read_pickle(result[0]) for result in bucket_results))
+        if log_path is not None:
+            summaries = (pd.read_pickle(result[1]) for result in bucket_results)
+            _write_chunks(log_path, _chain(summaries, [df_statewide]))
+    logger.info('Redacted file written to %s', output_path)
+    return output_path
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+
+def read_chunks(path: str, chunksize: int = CHUNK_ROWS, columns: list = None, **read_options):
+    """Yields the rows of a csv or Parquet file as DataFrames of at most chunksize rows, only the given
+    columns are read when columns is given"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns, **read_options)
+
+
+def _write_chunks(path: str, chunks):
+    """Writes DataFrames one after the other to a csv or Parquet file"""
+    if is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(path, table.schema)
+                else:
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+
+def _spill_buckets(input_path: str, spill: str, parent_organization: str, child_organization: str,
+                   chunksize: int, n_buckets: int, read_options: dict) -> list:
+    """Spills the rows of the input to the directories of their buckets, one pickle per chunk, and returns
+    the directories of the buckets that got rows"""
+    pairs = None
+    used = np.zeros(n_buckets, dtype=bool)
+    for chunk_number, df_chunk in enumerate(read_chunks(input_path, chunksize, **read_options)):
+        if parent_organization not in df_chunk.columns:
+            raise KeyError(f"The parent organization column '{parent_organization}' is not in {input_path}.")
+        if child_organization is not None:
+            pairs = pd.concat([pairs, df_chunk[[child_organization, parent_organization]]]).drop_duplicates()
+        # Hash of the text of the parent, so a parent goes to the same bucket whatever the chunk
+        hashes = pd.util.hash_pandas_object(df_chunk[parent_organization].astype(str), index=False).to_numpy()
+        bucket_ids = hashes % np.uint64(n_buckets)
+        for bucket in np.unique(bucket_ids):
+            bucket_dir = os.path.join(spill, f'bucket_{bucket}')
+            os.makedirs(bucket_dir, exist_ok=True)
+            df_chunk[bucket_ids == bucket].to_pickle(os.path.join(bucket_dir, f'chunk_{chunk_number:08d}.pkl'))
+            used[bucket] = True
+
+    if pairs is not None and (pairs.groupby(child_organization)[parent_organization].nunique(dropna=False) > 1).any():
+        raise ValueError(f"Every '{child_organization}' must belong to a single '{parent_organization}' to split the file by it.")
+    return [os.path.join(spill, f'bucket_{bucket}') for bucket in np.flatnonzero(used)]
+
+
+def _redact_bucket(bucket_dir: str, settings: dict, forced=None):
+    """Worker side of anonymize_file: redacts the rows spilled to a bucket and writes its redacted rows and
+    organization levels next to them. Returns the paths of both in place of the frames of _redact_shard."""
+    chunk_files = sorted(name for name in os.listdir(bucket_dir) if name.startswith('chunk_'))
+    df_bucket = pd.concat([pd.read_pickle(os.path.join(bucket_dir, name)) for name in chunk_files],
+                          ignore_index=True)
+    df_redacted, df_summary, df_totals, cross_decisions, last_change_round = _redact_shard(df_bucket, settings, forced)
+    redacted_path = os.path.join(bucket_dir, 'redacted.pkl')
+    summary_path = os.path.join(bucket_dir, 'summary.pkl')
+    df_redacted.to_pickle(redacted_path)
+    df_summary.to_pickle(summary_path)
+    return (redacted_path, summary_path, df_totals, cross_decisions, last_change_round)
@@ -1,10 +1,20 @@
 
+import logging
+
+import numpy as np
 import pandas as pd
-#import logging
+from concurrent.futures import wait
 from itertools import combinations
 
 from pandas import DataFrame
 
+from .backends import get_backend
+from .dtypes import DtypePlan
+from .encoding import CategoricalCodes, NULL_CODE
+from .group_index import GroupIndex
+from .instrumentation import CancellationToken, StageProgress, StageReport, StageTimer
+from .parallel import SharedArrays, process_pool, split, worker_count
+from .reasons import RedactionReasons, SECONDARY_SUPPRESSION
 from util import LogUtil
 
 # Configure logging
@@ -19,13 +29,36 @@ from util import LogUtil
 
 
 logger = LogUtil.create_logger(__name__)
+# One aggregate level out of every LEVEL_SAMPLE_EVERY is shown in the debug log of create_log
+LEVEL_SAMPLE_EVERY = 5
+# Default of the update_settings arguments that are left as they are
+UNCHANGED = object()
+
+
 class DataAnonymizer:
 
 
     # Initialize the class with a dataframe (df) and optionally, a list of sensitive columns, organization columns, and user specified redaction column.
     def __init__(self, df: DataFrame, parent_organization:str = None, child_organization:str=None, sensitive_columns=None,
                  frequency: str = None, redact_column:str=None, minimum_threshold:int=10, redact_zero:bool
-                 =False, redact_value:str=None):
+                 =False, redact_value:str=None, repeat_until_stable:bool=False, n_jobs:int=1, executor=None, backend=None,
+                 observers=None, profile_memory:bool=False, low_memory:bool=False,
+                 compact_dtypes:bool=False, progress=None, cancel_token:CancellationToken=None,
+                 positional_cross_join:bool=True):
+
+        # Validate repeat_until_stable input
+        if repeat_until_stable not in [True, False]:
+            raise ValueError(
+                "Value for repeat_until_stable should be True or False, not {}. Please only use True or False without quotation marks.".format(
+                    repeat_until_stable))
+
+        # Validate n_jobs input
+        if not isinstance(n_jobs, int) or isinstance(n_jobs, bool) or (n_jobs < 1 and n_jobs != -1):
+            raise ValueError(
+                "Value for n_jobs should be a positive whole number or -1 to use every core, not {}.".format(n_jobs))
+
+        # Validate backend input
+        backend = get_backend(backend)
 
         self.original_columns = df.columns.tolist()
         logger.info('original_columns that came>>%s', self.original_columns)
@@ -40,9 +73,13 @@ class DataAnonymizer:
             organization_columns = [parent_organization, child_organization]
         logger.info(organization_columns)
 
-        df.loc[:, 'Original'] = 1
-        # Create a copy of the input dataframe and store it as an instance variable
-        self.df: DataFrame = df.copy()
+        # The dataframe given is left as it is. In low memory mode its columns are shared instead of copied,
+        # so it should not be changed in place while the anonymizer uses it.
+        if low_memory:
+            self.df: DataFrame = df.copy(deep=False)
+            self.df['Original'] = 1
+        else:
+            self.df: DataFrame = df.assign(Original=1)
 
         self.organization_columns = list(organization_columns) if isinstance(organization_columns, (list, tuple)) else [
             organization_columns]
@@ -66,6 +103,55 @@ class DataAnonymizer:
         self.child_organization = child_organization
         self.redact_zero = redact_zero
         self.redact_value = redact_value
+        self.repeat_until_stable = repeat_until_stable
+        # Independent runs are sent to n_jobs worker processes, or to the concurrent.futures executor given
+        self.n_jobs = n_jobs
+        self.executor = executor
+        # Builds the aggregate levels of the log, 'pandas' (the default), 'duckdb' or a backend object
+        self.backend = backend
+        # (frequency columns, aggregate levels) of the last log built, see _aggregate_levels
+        self._levels_cache = None
+        # Metrics of every stage run, see StageReport. Each observer is called with the metrics of a stage as it ends.
+        self.stage_report = StageReport()
+        self.observers: list = list(observers) if observers is not None else []
+        self.profile_memory = profile_memory
+        # Called with the progress of every step of a stage, see StageProgress. The run stops with
+        # RedactionCancelled before a stage or between two steps once cancel_token is cancelled.
+        self.progress = progress
+        self.cancel_token = cancel_token
+        # The data is shared instead of copied and the detail rows of the log only hold the columns the passes read
+        self.low_memory = low_memory
+        # The log gets the narrowest types of its values and the results categoricals, see DtypePlan. The plan
+        # of the last log built is kept, its saved_mb is what it saved.
+        self.compact_dtypes = compact_dtypes
+        self.dtype_plan: DtypePlan = None
+        # Codes of the organization and sensitive columns, built once by the first run
+        self.encoded_columns: CategoricalCodes = None
+        # The log keeps the codes while the passes run, df_log returns it with the labels
+        self._log: DataFrame = None
+        # Rows redacted since the last suppression round, None while every group is looked at
+        self.touched_rows = None
+        # Frequency column of each touched row
+        self.touched_columns = None
+        # Frequency columns of the log and their values, one column each
+        self.frequency_columns: list = None
+        self.frequency_values = None
+        # Log row of every row of the data: its detail row, or the row it was dropped as a duplicate of.
+        # apply_log gathers the redaction of every row with it.
+        self.detail_log_rows = None
+        # Cross suppression joins the minimums back by position like the original merge, see _cross_suppression.
+        # The sharded engine (see sharding.py) only joins them by row, as the positions span every parent.
+        if positional_cross_join not in [True, False]:
+            raise ValueError("Value for positional_cross_join should be True or False, not {}.".format(positional_cross_join))
+        self.positional_cross_join = positional_cross_join
+        # Whether cross suppression looked at each combination, in the order they were met. When
+        # forced_cross_decisions is set those decisions are used instead, with forced_rounds rounds of
+        # repeat_until_stable, so a shard decides like a run on the whole data.
+        self.cross_decisions: list = []
+        self.forced_cross_decisions: list = None
+        self.forced_rounds: int = None
+        # Last suppression round that redacted a new value
+        self.last_change_round = 0
 
 
     def validate_inputs(self, df, parent_organization, child_organization, sensitive_columns, frequency, redact_column,
@@ -163,113 +249,108 @@ class DataAnonymizer:
                              Check your input dataframe and use more subgroups or organizations as needed to make sure each row identifies a unique group. 
                              The following grouping column values are duplicated: \n {df[subset_cols][df.duplicated(subset=subset_cols)]}
                              """)
-        if sensitive_columns is not None:
-            for column in sensitive_columns:
-                df[column] = df[column].astype(str)
-
-        # Ensure that the frequency column contains only integer values
+        # Ensure that the frequency column contains only integer values, the frame given is not changed
         try:
-            df[frequency] = df[frequency].astype(int)
+            df[frequency].astype(int)
         except ValueError:
             raise ValueError(f"All values in the frequency column '{frequency}' must be integers.")
 
-    def create_log(self):
+    def _validate(self, frequency: str, minimum_threshold: int = None):
+        """Validates the inputs of a run on frequency, then makes the frequency column of the data integers"""
+        minimum_threshold = self.minimum_threshold if minimum_threshold is None else minimum_threshold
+        self.validate_inputs(self.df, self.parent_organization, self.child_organization, self.sensitive_columns,
+                             frequency, self.redact_column, minimum_threshold, self.redact_zero)
+        self.df[frequency] = self.df[frequency].astype(int)
+
+    def _create_log(self, frequency_columns: list = None) -> bool:
+        """Builds the log of self.frequency. When several frequency columns are given they are aggregated in
+        the same scan and the passes run on all of them at once, which needs every column to keep the same
+        log rows. Returns False, without building the log, when the columns would keep different rows."""
         logger.info('Creating log!')
-        df_dataframes: DataFrame = pd.DataFrame()
-        grouping_value = 0
-        if self.organization_columns[0] is not None:
-            for organization_column in self.organization_columns:
-                for sensitive_combination in self.sensitive_combinations:
-                    group_by_col: list = [organization_column] + list(sensitive_combination)
-                    logger.info('group_by_col>>%s,frequency_col>>%s', group_by_col, self.frequency)
+        frequency_columns = [self.frequency] if frequency_columns is None else list(frequency_columns)
+        organization_columns = [column for column in self.organization_columns if column is not None]
 
-                    """
-                    sum of GraduationCount for group of ParentEntity1, SubGroup1 SubGroup2
-                    group_by_col is an array of columns
-                    For eg
-                    
-                    select ParentEntity1, SubGroup1 SubGroup2, sum(GraduationCount) from record_table
-                    group by ParentEntity1, SubGroup1 SubGroup2
-                    
-                    and assigning result  to a new table called df_grouped
-                    """
-                    df_grouped: DataFrame = self.df.groupby(group_by_col)[self.frequency].sum().reset_index()
-                    logger.info('df_grouped>>>')
-                    logger.info("****")
-                    logger.info('%s', df_grouped)
-                    if not df_grouped.empty:
-                        # assigning a new column Grouping and give current grouping_value
-                        df_grouped.loc[:, 'Grouping'] = grouping_value
-                        logger.info('after adding grouping')
-                        
-                        grouping_value += 1
-                        """
-                        records where GraduationCount column value > threshold
-                        select * from df_grouped where GraduationCount > 10
-                        assign result to new record assigning to   df_not_redacted
-                        from df_grouped 
-                        """
-                        df_not_redacted = df_grouped[df_grouped[self.frequency] > self.minimum_threshold]
-
-                        """
-                        min of frequency column and group by organization_column
-                        here organization_column = ParentEntity
-                        frequency = GraduationCount
-                        This is 
-                        select ParentEntity,min(GraduationCount) from df_not_redacted
-                        """
-                        df_grouped_min = df_not_redacted.groupby([organization_column])[
-                            self.frequency].min().reset_index()
-                        ## rename GraduationCount to MinimumValue
-                        df_grouped_min = df_grouped_min.rename(columns={self.frequency: "MinimumValue"})
-
-                        # Ensure that the parent and child columns are strings
-                        df_grouped_min[organization_column] = df_grouped_min[organization_column].astype(str)
-                        """Join df_grouped and df_grouped_min on organization_column 
-                        select * from df_grouped df
-                        join df_grouped_min dfn left join df.organization_column = dfn
-                        and assign the result back to df_group
-                        """
-                        df_grouped = df_grouped.merge(df_grouped_min, on=[organization_column], how='left')
-                        """This is a union
-                        select * from df_dataframes
-                        union
-                        select * from df_grouped
-                        
-                        assign the result to df_dataframes
-                        """
-                        df_dataframes = pd.concat([df_dataframes, df_grouped], ignore_index=True)
-                        logger.info('For Group>>%s,values\n>>%s',df_dataframes.columns,df_dataframes)
+        """
+        Every aggregate level of the log is a grouping set, for eg
+        
+        select ParentEntity, SubGroup1, SubGroup2, sum(GraduationCount) from record_table
+        group by grouping sets ((ParentEntity, SubGroup1, SubGroup2), (ParentEntity, SubGroup1), ..., (SubGroup2))
+        
+        The order of the grouping sets decides the Grouping value of each level.
+        """
+        grouping_sets: list = []
+        for organization_column in organization_columns:
+            for sensitive_combination in self.sensitive_combinations:
+                grouping_sets.append([organization_column] + list(sensitive_combination))
         if self.parent_organization is not None:
-            df_grouped: DataFrame = self.df.groupby([self.parent_organization])[self.frequency].sum().reset_index()
-
-            if not df_grouped.empty:
-                df_grouped.loc[:, 'Grouping'] = grouping_value
-                grouping_value += 1
-                df_not_redacted = df_grouped[df_grouped[self.frequency] > self.minimum_threshold]
-                df_grouped_min = df_not_redacted.groupby(['Grouping'])[self.frequency].min().reset_index()
-                df_grouped_min = df_grouped_min.rename(columns={self.frequency: "MinimumValue"})
-                df_grouped = df_grouped.merge(df_grouped_min, on=['Grouping'], how='left')
-                df_dataframes = pd.concat([df_dataframes, df_grouped], ignore_index=True)
-
+            grouping_sets.append([self.parent_organization])
         for sensitive_combination in self.sensitive_combinations:
-            list_combination = list(sensitive_combination)
-            df_grouped = self.df.groupby(list_combination)[self.frequency].sum().reset_index()
-            if not df_grouped.empty:
-                df_grouped.loc[:, 'Grouping'] = grouping_value
-                grouping_value += 1
-                df_dataframes = pd.concat([df_dataframes, df_grouped], ignore_index=True)
-                df_not_redacted = df_dataframes[df_dataframes[self.frequency] > self.minimum_threshold]
-                if (list_combination != self.sensitive_columns) | (len(self.sensitive_columns) == 1):
-                    df_grouped_min = df_not_redacted.groupby(['Grouping'] + list_combination)[
-                        self.frequency].min().reset_index()
-                    string_combination = ''.join(list_combination)
-                    df_grouped_min = df_grouped_min.rename(
-                        columns={self.frequency: "MinimumValue" + string_combination})
-                    df_dataframes = df_dataframes.merge(df_grouped_min, on=['Grouping'] + list_combination, how='left')
-
-        self.df.loc[:, 'Grouping'] = grouping_value
-        df_log:DataFrame = pd.concat([df_dataframes, self.df])
+            grouping_sets.append(list(sensitive_combination))
+
+        # Scan the data once and roll every coarser grouping set up from the finest cube
+        key_columns = organization_columns + self.sensitive_columns
+        levels = self._aggregate_levels(grouping_sets, frequency_columns,
+                                        self._stage_progress('create_log', len(grouping_sets), frequency_columns))
+        # The log frame only holds self.frequency, the values of every frequency column are kept apart
+        other_frequency_columns = [column for column in frequency_columns if column != self.frequency]
+
+        df_grouped_list: list[DataFrame] = []
+        frequency_values_list: list = []
+        minimum_columns: list = []
+        grouping_value = 0
+        sample_levels = LogUtil.Sampler(LEVEL_SAMPLE_EVERY)
+        for group_by_col, df_grouped in levels:
+            if df_grouped.empty:
+                continue
+            logger.debug('group_by_col>>%s,frequency_col>>%s', group_by_col, self.frequency)
+            if logger.isEnabledFor(logging.DEBUG) and sample_levels():
+                logger.debug('level %s (codes)>>%s', grouping_value, LogUtil.LazyFrame(df_grouped))
+            frequency_values_list.append(df_grouped[frequency_columns].to_numpy())
+            df_grouped = df_grouped.drop(columns=other_frequency_columns)
+            # assigning a new column Grouping and give current grouping_value
+            df_grouped['Grouping'] = grouping_value
+            grouping_value += 1
+            # records where GraduationCount column value > threshold, the rest are left out of the minimums
+            frequency_not_redacted = df_grouped[self.frequency].where(df_grouped[self.frequency] > self.minimum_threshold)
+
+            if group_by_col[0] in organization_columns and len(group_by_col) > 1:
+                """
+                min of frequency column group by organization_column
+                select ParentEntity, min(GraduationCount) from df_not_redacted group by ParentEntity
+                """
+                df_grouped['MinimumValue'] = frequency_not_redacted.groupby(df_grouped[group_by_col[0]]).transform('min')
+            elif group_by_col == [self.parent_organization]:
+                # Minimum across every parent organization
+                df_grouped['MinimumValue'] = frequency_not_redacted.min()
+            elif (group_by_col != self.sensitive_columns) | (len(self.sensitive_columns) == 1):
+                # Minimum for the combination is taken over every level built so far, see below
+                minimum_columns.append((group_by_col, grouping_value - 1))
+            df_grouped_list.append(df_grouped)
+
+        # Union all of the levels in one go instead of growing the log inside the loop
+        df_dataframes: DataFrame = pd.concat(df_grouped_list, ignore_index=True) if df_grouped_list else pd.DataFrame()
+
+        for list_combination, last_grouping_value in minimum_columns:
+            """
+            select Grouping, SubGroup1, min(GraduationCount) from df_dataframes
+            where GraduationCount > 10 and Grouping <= last_grouping_value
+            group by Grouping, SubGroup1
+            
+            Levels built after the combination do not get a minimum.
+            """
+            frequency_not_redacted = df_dataframes[self.frequency].where(
+                (df_dataframes[self.frequency] > self.minimum_threshold) & (df_dataframes['Grouping'] <= last_grouping_value))
+            string_combination = ''.join(list_combination)
+            df_dataframes["MinimumValue" + string_combination] = frequency_not_redacted.groupby(
+                [df_dataframes['Grouping']] + [df_dataframes[column] for column in list_combination]).transform('min')
+
+        # Detail rows carry every column of the data, with the organization and sensitive columns coded
+        # (in low memory mode only the columns the passes read)
+        df_detail: DataFrame = self.detail_codes(self._pass_columns(frequency_columns) if self.low_memory else None)
+        df_detail['Grouping'] = grouping_value
+        frequency_values_list.append(df_detail[frequency_columns].to_numpy())
+        df_log:DataFrame = pd.concat([df_dataframes, df_detail])
+        frequency_values = np.concatenate(frequency_values_list)
         duplicate_columns:list[str | list[str]] = []
         if self.organization_columns[0] is not None and self.redact_column is not None:
             duplicate_columns = self.organization_columns + self.sensitive_columns + [self.frequency] + [
@@ -281,51 +362,148 @@ class DataAnonymizer:
         elif self.organization_columns[0] is None and self.redact_column is None:
             duplicate_columns = self.sensitive_columns + [self.frequency]
         else:
-            print(self.redact_column)
-            print(self.organization_columns)
-
-        df_log = df_log.drop_duplicates(duplicate_columns)
+            logger.debug('redact_column>>%s, organization_columns>>%s', self.redact_column, self.organization_columns)
+
+        # Levels that do not group by a column leave it empty, it gets the null code like missing values
+        df_log[key_columns] = df_log[key_columns].fillna(NULL_CODE).astype(np.int32)
+        if self.compact_dtypes:
+            self.dtype_plan = DtypePlan(self.df, frequency_columns, self.encoded_columns.labels)
+            df_log = self.dtype_plan.compact_log(df_log)
+            frequency_values = frequency_values.astype(self.dtype_plan.count_type)
+
+        # Log row kept for every row when the duplicates are dropped on each frequency column
+        first_rows = self._first_duplicates(df_log, duplicate_columns, frequency_values)
+        if (first_rows != first_rows[:, [0]]).any():
+            logger.info('The frequency columns %s keep different log rows.', frequency_columns)
+            return False
+        keep = first_rows[:, 0] == np.arange(len(df_log))
+        # Detail rows dropped as duplicates take the redaction of the log row that was kept
+        self.detail_log_rows = (np.cumsum(keep) - 1)[first_rows[len(df_dataframes):, 0]]
+        df_log = df_log[keep]
         df_log = df_log.reset_index(drop=True)
-        df_log.loc[:, 'RedactBinary'] = 0
-        df_log.loc[:, 'Redact'] = 'Not Redacted'
 
         if self.organization_columns[0] is not None:
-            df_not_redacted = df_log[(df_log[self.frequency] > self.minimum_threshold)]
-            df_grouped_min = df_not_redacted.groupby(self.organization_columns, dropna=False)[
-                self.frequency].min().reset_index()
-            df_grouped_min = df_grouped_min.rename(columns={self.frequency: "MinimumValueTotal"})
-
-            # Ensure that the parent and child columns are strings
-            df_grouped_min[self.organization_columns[0]] = df_grouped_min[self.organization_columns[0]].astype(str)
-            if len(self.organization_columns) > 1 and self.organization_columns[1] is not None:
-                df_grouped_min[self.organization_columns[1]] = df_grouped_min[self.organization_columns[1]].astype(str)
-
-            df_log = df_log.merge(df_grouped_min, on=self.organization_columns, how='left')
-            df_log.loc[df_log['MinimumValue'].isnull(), 'MinimumValue'] = df_log['MinimumValueTotal']
-            df_log = df_log.drop('MinimumValueTotal', axis=1)
-        self.df_log: DataFrame = df_log.copy()
-
-        df_log = df_log.drop_duplicates()
-
-        self.df_log = self.df_log.reset_index(drop=True)
-
-        self.df_log.loc[:, 'RedactBinary'] = 0
-
-        self.df_log.loc[:, 'Redact'] = 'Not Redacted'
-
-        self.df_log.loc[:, 'RedactBreakdown'] = 'Not Redacted'
-
+            """
+            Rows without a MinimumValue get the minimum of their organizations
+            select ParentEntity, ChildEntity, min(GraduationCount) from df_log
+            where GraduationCount > 10 group by ParentEntity, ChildEntity
+            """
+            frequency_not_redacted = df_log[self.frequency].where(df_log[self.frequency] > self.minimum_threshold)
+            minimum_total = frequency_not_redacted.groupby(
+                [df_log[column] for column in self.organization_columns]).transform('min')
+            df_log['MinimumValue'] = df_log['MinimumValue'].fillna(minimum_total)
+
+        self._set_log(df_log, frequency_columns, frequency_values[keep])
+        if self.compact_dtypes:
+            logger.info('Compact dtypes saved %.1f MB of the log.', self.dtype_plan.saved_mb)
         logger.info('Log created!')
+        logger.debug('log (codes)>>%s', LogUtil.LazyFrame(df_log))
+        return True
+
+    def _aggregate_levels(self, grouping_sets: list, frequency_columns: list, progress: StageProgress) -> list:
+        """Returns (group_by_col, aggregated frame) for every grouping set, with a progress step per grouping
+        set. The levels do not depend on the threshold or the redaction settings, the last ones built are kept
+        and reused by the next run on the same frequency columns, eg after update_settings. Low memory mode
+        does not keep them."""
+        key = tuple(frequency_columns)
+        if self._levels_cache is not None and self._levels_cache[0] == key:
+            for group_by_col, df_grouped in self._levels_cache[1]:
+                progress.step(group_by_col, len(df_grouped))
+            return self._levels_cache[1]
+        key_columns = [column for column in self.organization_columns if column is not None] + self.sensitive_columns
+        df_codes: DataFrame = self.detail_codes(key_columns + frequency_columns)
+        aggregator = self.backend.aggregator(df_codes, key_columns, frequency_columns)
+        levels: list = []
+        for group_by_col, df_grouped in aggregator.grouping_sets(grouping_sets):
+            levels.append((group_by_col, df_grouped))
+            progress.step(group_by_col, len(df_grouped))
+        if not self.low_memory:
+            self._levels_cache = (key, levels)
+        return levels
+
+    def update_settings(self, minimum_threshold: int = UNCHANGED, redact_zero: bool = UNCHANGED,
+                        redact_value=UNCHANGED, repeat_until_stable: bool = UNCHANGED):
+        """Changes the settings that only the suppression passes use and returns the anonymizer. The codes of
+        the data and the aggregate levels built by the last run are kept, so the next run only redoes the passes.
+        Settings that are not given are left as they are."""
+        if repeat_until_stable is not UNCHANGED:
+            if repeat_until_stable not in [True, False]:
+                raise ValueError(
+                    "Value for repeat_until_stable should be True or False, not {}. Please only use True or False without quotation marks.".format(
+                        repeat_until_stable))
+            self.repeat_until_stable = repeat_until_stable
+        if minimum_threshold is not UNCHANGED:
+            self.minimum_threshold = int(minimum_threshold)
+        if redact_zero is not UNCHANGED:
+            self.redact_zero = redact_zero
+        if redact_value is not UNCHANGED:
+            self.redact_value = redact_value
+        return self
+
+    def _set_log(self, df_log: DataFrame, frequency_columns: list, frequency_values):
+        """Makes df_log, with coded key columns, the log the passes run on"""
+        key_columns = [column for column in self.organization_columns if column is not None] + self.sensitive_columns
+        self._log = df_log
+        # One column per frequency column, the passes work on all of them at once
+        self.frequency_columns = frequency_columns
+        self.frequency_values = frequency_values
+        # Group membership of the log rows, shared by every secondary suppression pass
+        self.group_index = GroupIndex(self._log, ['Grouping'] + key_columns)
+        self.organization_not_null = self._organization_not_null(self._log).to_numpy()
+
+        # RedactBinary, Redact and RedactBreakdown are rendered from the reasons when the log is returned
+        self.redaction = RedactionReasons(len(self._log), len(frequency_columns))
+        self.cross_decisions = []
+        self.last_change_round = 0
+
+    def _first_duplicates(self, df_log: DataFrame, duplicate_columns: list, frequency_values):
+        """For every row and frequency column, the first row with the same duplicate_columns values"""
+        first_rows = np.empty(frequency_values.shape, dtype=np.int64)
+        df_keys = df_log[duplicate_columns].reset_index(drop=True)
+        for column in range(frequency_values.shape[1]):
+            df_keys[self.frequency] = frequency_values[:, column]
+            # Groups are numbered in the order they first appear
+            group_ids = df_keys.groupby(duplicate_columns, dropna=False, sort=False).ngroup().to_numpy()
+            _, first_row = np.unique(group_ids, return_index=True)
+            first_rows[:, column] = first_row[group_ids]
+        return first_rows
+
+    def create_log(self):
+        self._create_log()
         return self.df_log
 
+    def detail_codes(self, columns: list = None) -> DataFrame:
+        """Returns a copy of the data, or of the given columns, with the organization and sensitive columns
+        replaced by their codes. The columns are factorized the first time and the codes are reused by later runs."""
+        key_columns = [column for column in self.organization_columns if column is not None] + self.sensitive_columns
+        if self.encoded_columns is None:
+            organization_columns = [column for column in self.organization_columns if column is not None]
+            self.encoded_columns = CategoricalCodes(self.df, organization_columns, self.sensitive_columns)
+        df = self.df if columns is None else self.df[columns]
+        return df.assign(**{column: self.encoded_columns.codes[column] for column in key_columns if column in df.columns})
+
+    def _pass_columns(self, frequency_columns: list) -> list:
+        """Columns of the data the suppression passes read"""
+        key_columns = [column for column in self.organization_columns if column is not None] + self.sensitive_columns
+        columns = key_columns + list(frequency_columns)
+        if self.redact_column is not None and self.redact_column not in columns:
+            columns.append(self.redact_column)
+        return columns
+
+    def _organization_not_null(self, df: DataFrame):
+        # groupby leaves out null organizations, the codes keep them so they are filtered out explicitly
+        organization_columns = [column for column in self.organization_columns if column is not None]
+        return (df[organization_columns] != NULL_CODE).all(axis=1)
+
     # Develop script to autopopulate log for each function
 
     def data_logger(self, filter_value, redact_name, redact_breakdown_name):
-        """Updates
+        """Records a redaction reason for the rows matching a where condition.
+            The reason shows up in
             column RedactBreakdown,
-            column Redact and
-            column RedactBinary to 1
-            based on certain where conditions
+            column Redact (when it is the first reason of the row) and
+            column RedactBinary as 1
+            once the log is rendered
         Args:
             filter_value: This is actually where condition provided  by the caller
             redact_name: This value is used to update column Redact
@@ -333,447 +511,323 @@ class DataAnonymizer:
         Returns:
                 None
         """
-        # Update RedactBreakdown column append comma if filter condition matches
-        self.df_log.loc[filter_value & (self.df_log['Redact'] != 'User-requested redaction'), 'RedactBreakdown'] += ', '
-        # Update column RedactBreakdown by replacing  'Not Redacted' to ', '
-        self.df_log.loc[:, 'RedactBreakdown'] = self.df_log['RedactBreakdown'].str.replace('Not Redacted, ', '')
-
-        # Update column RedactBreakdown with redact_breakdown_name field value
-        # if filter_value condition matches and Redact column != 'User-requested redaction'
-        self.df_log.loc[filter_value & (
-                    self.df_log['Redact'] != 'User-requested redaction'), 'RedactBreakdown'] += redact_breakdown_name
-        # Update column Redact with redact_name field value
-        self.df_log.loc[filter_value & (self.df_log['RedactBinary'] != 1), 'Redact'] = redact_name
-
-        # Update column RedactBinary with 1 if some condition match
-        self.df_log.loc[filter_value & (self.df_log['RedactBinary'] != 1), 'RedactBinary'] = 1
+        filter_value = np.asarray(filter_value, dtype=bool)
+        if filter_value.ndim == 1:
+            # A condition on the rows applies to every frequency column
+            filter_value = np.broadcast_to(filter_value[:, None], self.redaction.bits.shape)
+        rows, columns = np.nonzero(filter_value)
+        # Values the user asked to redact keep that as their only reason
+        keep = self.redaction.redact_labels(rows, columns) != 'User-requested redaction'
+        # Redact keeps the first reason of a value, the breakdown lists every reason
+        self.redaction.add(rows[keep], columns[keep], self.redaction.reason(redact_name, redact_breakdown_name))
 
         # Take value given by user and apply to log
-    def redact_user_requested_records(self):
+    def _redact_user_requested_records(self):
         logger.info('Seeing if user redact column exists.')
         if self.redact_column is not None:
-            self.data_logger((self.df_log[self.redact_column] == 1), 'User-requested redaction',
+            self.data_logger((self._log[self.redact_column] == 1), 'User-requested redaction',
                              'User-requested redaction')
 
-            self.df_log = self.df_log.drop(self.redact_column, axis=1)
+            self._log = self._log.drop(self.redact_column, axis=1)
 
+        self._stage_progress('redact_user_requested_records', 1).step(rows=len(self._log))
         logger.info('Completed review if user redact column exists.')
+
+    def redact_user_requested_records(self):
+        self._redact_user_requested_records()
         return self.df_log
 
     # Method to redact values in the dataframe that are less than a minimum threshold (possibly including 0)
-    def less_than_threshold(self):
+    def _less_than_threshold(self):
         # Create a boolean mask that identifies rows where the column specified by 'frequency'
         # has values less than 'minimum_threshold'
         # and also identify rows equal to 0 if correct parameter was passed in
         if self.redact_zero == False:
             logger.info('Redacting values that are less than the threshold and not zero.')
-            condition = (self.df_log[self.frequency] <= self.minimum_threshold) & (self.df_log[self.frequency] != 0)
+            condition = (self.frequency_values <= self.minimum_threshold) & (self.frequency_values != 0)
             redact_breakdown_name = f'Less Than or equal to {self.minimum_threshold} and not equal to zero'
             logger_value = 'Completed redacting values less than or equal to the threshold and not zero.'
         else:
             logger.info('Redacting values that are less than the threshold or equal to zero.')
-            condition = (self.df_log[self.frequency] <= self.minimum_threshold) | (self.df_log[self.frequency] == 0)
+            condition = (self.frequency_values <= self.minimum_threshold) | (self.frequency_values == 0)
             redact_breakdown_name = f'Less Than or equal to {self.minimum_threshold} or zero'
             logger_value = 'Completed redacting values less than or equal to the threshold or equal to zero.'
 
         self.data_logger(condition, 'Primary Suppression', redact_breakdown_name)
 
+        self._stage_progress('less_than_threshold', 1).step(rows=len(self._log))
         logger.info(logger_value)
 
+    def less_than_threshold(self):
+        self._less_than_threshold()
         # Return the updated dataframe
         return self.df_log
 
-    # Method to redact values in the dataframe that are the sum of minimum threshold
-    def sum_redact(self):
-        # Filter rows where the value in column specified by 'frequency' is less than 'minimum_threshold' but not zero
-        df_log_na:DataFrame = self.df_log.copy()
+    def _secondary_suppression(self, positions, redact_breakdown_name):
+        """Marks the log values at positions, a (rows, columns) pair, as secondary suppression and appends
+        redact_breakdown_name to their breakdown"""
+        rows, columns = positions
+        if self.touched_rows is not None:
+            # Newly redacted rows change their groups for the passes still to come
+            newly_redacted = ~self.redaction.redacted[rows, columns]
+            self.touched_rows = np.concatenate([self.touched_rows, rows[newly_redacted]])
+            self.touched_columns = np.concatenate([self.touched_columns, columns[newly_redacted]])
+        self.redaction.add(rows, columns,
+                           self.redaction.reason(SECONDARY_SUPPRESSION, redact_breakdown_name, secondary=True))
+
+    def _touched_values(self, group_by_col, groups):
+        """Values of groups in a group holding a touched row of the same frequency column. The groups of
+        the other frequency columns were looked at without change already."""
+        touched = np.zeros((groups.n_groups, self.redaction.bits.shape[1]), dtype=bool)
+        touched[self.group_index.groups(group_by_col).ids[self.touched_rows], self.touched_columns] = True
+        return touched[groups.ids]
+
+    def _redact_group_minimum(self, group_by_col, redacted_filter, redact_breakdown_name):
+        """
+        For every group where redacted_filter(sum, count) holds on the redacted rows, redacts the rows
+        equal to the smallest value not yet redacted, eg for sum_redact
+        
+        select Grouping, ParentEntity, SubGroup1, min(GraduationCount) from df_log where RedactBinary != 1
+        and (Grouping, ParentEntity, SubGroup1) in (select Grouping, ParentEntity, SubGroup1 from df_log
+        where RedactBinary = 1 group by Grouping, ParentEntity, SubGroup1 having sum(GraduationCount) <= 10)
+        group by Grouping, ParentEntity, SubGroup1
+        
+        When touched_rows is set only the groups holding one of those rows are looked at. Every frequency
+        column is looked at in the same call.
+        """
+        groups = self.group_index.groups(group_by_col, self.touched_rows)
+        frequency = groups.take(self.frequency_values)
+        redacted = groups.take(self.redaction.redacted)
+        if self.organization_columns[0] is not None:
+            # Levels without an organization are not part of the organization groups
+            redacted_in_group = redacted & groups.take(self.organization_not_null)[:, None]
+        else:
+            redacted_in_group = redacted
+        redacted_count = groups.count(redacted_in_group)
+        redacted_sum = groups.sum(frequency, redacted_in_group)
+        group_selected = (redacted_count > 0) & redacted_filter(redacted_sum, redacted_count)
+        minimum = groups.min(frequency, ~redacted)
+        mask = group_selected[groups.ids] & (frequency == minimum[groups.ids])
+        if self.touched_rows is not None:
+            mask &= self._touched_values(group_by_col, groups)
+        self._secondary_suppression(groups.positions(mask), redact_breakdown_name)
+        return len(groups.ids)
+
+    def _secondary_group_columns(self):
+        """Key columns of every group looked at by the secondary suppression passes"""
+        if self.organization_columns[0] is not None:
+            return [['Grouping'] + self.organization_columns + list(sensitive_combination)
+                    for sensitive_combination in self.sensitive_combinations
+                    if list(sensitive_combination) != self.sensitive_columns]
+        return [['Grouping'] + list(sensitive_combination) for sensitive_combination in self.sensitive_combinations
+                if list(sensitive_combination) != self.sensitive_columns]
 
-        temp_value = 'NaFill'
+    # Method to redact values in the dataframe that are the sum of minimum threshold
+    def _sum_redact(self):
+        def sum_less_than_threshold(redacted_sum, redacted_count):
+            return redacted_sum <= self.minimum_threshold
 
-        for sensitive_column in self.sensitive_columns:
-            df_log_na[sensitive_column] = df_log_na[sensitive_column].fillna(temp_value)
-            # Grouping by Organization and counting StudentCount, then filtering groups with a single record
-        if self.organization_columns[0] is not None:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if list_combination != self.sensitive_columns:
-                    sum_redact_group_col = ['Grouping'] + self.organization_columns + list_combination
-                    logger.info('sum_redact_group_col>>%s',sum_redact_group_col)
-                    string_combination = ''.join(list_combination)
-                    df_redacted = df_log_na[df_log_na['RedactBinary'] == 1]
-                    df_sum_of_frequency_group_redacted = df_redacted.groupby(sum_redact_group_col)[self.frequency].sum().reset_index()
-                    df_less_than_threshold_from_redacted = df_sum_of_frequency_group_redacted[df_sum_of_frequency_group_redacted[self.frequency] <= self.minimum_threshold]
-                    if not df_less_than_threshold_from_redacted.empty:
-                        df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                        df_minimum_from_not_redacted = \
-                        df_not_redacted.groupby(sum_redact_group_col,dropna=False)[self.frequency].min().reset_index()
-                        df_minimum_from_not_redacted = df_minimum_from_not_redacted.rename(columns={self.frequency: 'LastMiniumValue'})
-
-                        # Ensure that the parent and child columns are strings
-                        df_minimum_from_not_redacted[self.organization_columns[0]] = df_minimum_from_not_redacted[self.organization_columns[0]].astype(str)
-                        if len(self.organization_columns) > 1 and self.organization_columns[1] is not None:
-                            df_minimum_from_not_redacted[self.organization_columns[1]] = df_minimum_from_not_redacted[self.organization_columns[1]].astype(
-                                str)
-
-                        df_minimum_redacted = df_less_than_threshold_from_redacted.merge(df_minimum_from_not_redacted, on=sum_redact_group_col)
-                        df_minimum_redacted = df_minimum_redacted[
-                            ['Grouping'] + self.organization_columns + list_combination + ['LastMiniumValue']]
-                        df_minimum_one = df_log_na.merge(df_minimum_redacted,
-                                                         on=['Grouping'] + self.organization_columns + list_combination,
-                                                         how='left')
-                        condition = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                        df_log_na.loc[condition, 'RedactBinary'] = 1
-                        df_log_na.loc[condition, 'Redact'] = 'Secondary Suppression'
-                        df_log_na.loc[condition, 'RedactBreakdown'] += ', Sum of values less than threshold'
-        elif len(self.sensitive_combinations) == 1:
-            df_redacted = df_log_na[df_log_na['RedactBinary'] == 1]
-            df_sum_of_frequency_group_redacted = df_redacted.groupby(['Grouping'], dropna=False)[self.frequency].sum().reset_index()
-            df_less_than_threshold_from_redacted = df_sum_of_frequency_group_redacted[df_sum_of_frequency_group_redacted[self.frequency] <= self.minimum_threshold]
-            df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-            df_minimum_from_not_redacted = df_not_redacted.groupby(['Grouping'], dropna=False)[self.frequency].min().reset_index()
-            df_minimum_from_not_redacted = df_minimum_from_not_redacted.rename(columns={self.frequency: 'LastMiniumValue'})
-            df_minimum_redacted = df_less_than_threshold_from_redacted.merge(df_minimum_from_not_redacted, on=['Grouping'])
-            df_minimum_redacted = df_minimum_redacted[['Grouping'] + ['LastMiniumValue']]
-            df_minimum_one = df_log_na.merge(df_minimum_redacted, on=['Grouping'], how='left')
-            condition = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-            df_log_na.loc[condition, 'RedactBinary'] = 1
-            df_log_na.loc[condition, 'Redact'] = 'Secondary Suppression'
-            df_log_na.loc[condition, 'RedactBreakdown'] += ', Sum of values less than threshold'
+        # Grouping by Organization and summing StudentCount, then filtering groups under the threshold
+        if self.organization_columns[0] is None and len(self.sensitive_combinations) == 1:
+            group_columns = [['Grouping']]
         else:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if list_combination != self.sensitive_columns:
-                    string_combination = ''.join(list_combination)
-                    df_redacted = df_log_na[df_log_na['RedactBinary'] == 1]
-                    df_sum_of_frequency_group_redacted = df_redacted.groupby(['Grouping'] + list_combination, dropna=False)[
-                        self.frequency].sum().reset_index()
-                    df_less_than_threshold_from_redacted = df_sum_of_frequency_group_redacted[df_sum_of_frequency_group_redacted[self.frequency] <= self.minimum_threshold]
-                    if not df_less_than_threshold_from_redacted.empty:
-                        df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                        df_minimum_from_not_redacted = df_not_redacted.groupby(['Grouping'] + list_combination, dropna=False)[
-                            self.frequency].min().reset_index()
-                        df_minimum_from_not_redacted = df_minimum_from_not_redacted.rename(columns={self.frequency: 'LastMiniumValue'})
-                        df_minimum_redacted = df_less_than_threshold_from_redacted.merge(df_minimum_from_not_redacted, on=['Grouping'] + list_combination)
-                        df_minimum_redacted = df_minimum_redacted[['Grouping'] + list_combination + ['LastMiniumValue']]
-                        df_minimum_one = df_log_na.merge(df_minimum_redacted, on=['Grouping'] + list_combination,
-                                                         how='left')
-                        condition = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                        df_log_na.loc[condition, 'RedactBinary'] = 1
-                        df_log_na.loc[condition, 'Redact'] = 'Secondary Suppression'
-                        df_log_na.loc[condition, 'RedactBreakdown'] += ', Sum of values less than threshold'
-
-        self.df_log.loc[df_log_na['RedactBinary'] == 1, 'RedactBinary'] = 1
-        self.df_log.loc[df_log_na['Redact'] == 'Secondary Suppression', 'Redact'] = 'Secondary Suppression'
-        self.df_log.loc[:, 'RedactBreakdown'] = df_log_na['RedactBreakdown']
-        self.df_log.loc[:, 'RedactBreakdown'] = self.df_log['RedactBreakdown'].str.replace('Not Redacted, ', '')
+            group_columns = self._secondary_group_columns()
+        progress = self._stage_progress('sum_redact', len(group_columns))
+        for sum_redact_group_col in group_columns:
+            logger.debug('sum_redact_group_col>>%s', sum_redact_group_col)
+            rows = self._redact_group_minimum(sum_redact_group_col, sum_less_than_threshold,
+                                              'Sum of values less than threshold')
+            progress.step(sum_redact_group_col, rows)
 
+    def sum_redact(self):
+        self._sum_redact()
         # Return the updated dataframe
         return self.df_log
 
     # Method to redact values in the dataframe that are the only value in the group
-    def one_count_redacted(self):
+    def _one_count_redacted(self):
         logger.info('Start review of if secondary disclosure avoidance is needed and begin application.')
-        # Filter rows where the value in the column specified by 'frequency' is less than 'minimum_threshold' but not zero
-        # Filter rows where the value in column specified by 'frequency' is less than 'minimum_threshold' but not zero
-        df_log_na = self.df_log.copy()
 
-        temp_value = 'NaFill'
+        def one_redacted(redacted_sum, redacted_count):
+            return redacted_count == 1
 
-        for sensitive_column in self.sensitive_columns:
-            df_log_na[sensitive_column] = df_log_na[sensitive_column].fillna(temp_value)
-            # Grouping by Organization and counting StudentCount, then filtering groups with a single record
+        # Grouping by Organization and counting StudentCount, then filtering groups with a single record
         if self.organization_columns[0] is not None:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if list_combination != self.sensitive_columns:
-                    string_combination = ''.join(list_combination)
-                    df_redact_less = df_log_na[df_log_na['RedactBinary'] == 1]
-                    df_redact_less.loc[:, 'Redacted'] = 1
-                    df_count_value = \
-                    df_redact_less.groupby(['Grouping'] + self.organization_columns + list_combination)[
-                        self.frequency].count().reset_index()
-                    df_one_redacted = df_count_value[df_count_value[self.frequency] == 1]
-                    if not df_one_redacted.empty:
-                        df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                        df_minimum = \
-                        df_not_redacted.groupby(['Grouping'] + self.organization_columns + list_combination,
-                                                dropna=False)[self.frequency].min().reset_index()
-                        df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-                        df_minimum_redacted = df_one_redacted.merge(df_minimum, on=[
-                                                                                       'Grouping'] + self.organization_columns + list_combination)
-                        df_minimum_redacted = df_minimum_redacted[
-                            ['Grouping'] + self.organization_columns + list_combination + ['LastMiniumValue']]
-                        df_minimum_one = df_log_na.merge(df_minimum_redacted,
-                                                         on=['Grouping'] + self.organization_columns + list_combination,
-                                                         how='left')
-                        condition = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                        df_log_na.loc[condition, 'RedactBinary'] = 1
-                        df_log_na.loc[condition, 'Redact'] = 'Secondary Suppression'
-                        df_log_na.loc[condition, 'RedactBreakdown'] += ', Sum of values less than threshold'
+            group_columns = self._secondary_group_columns()
+            redact_breakdown_name = 'Sum of values less than threshold'
         elif len(self.sensitive_combinations) == 1:
-            df_redact_less = df_log_na[df_log_na['RedactBinary'] == 1]
-            df_count_value = df_redact_less.groupby(['Grouping'], dropna=False)[self.frequency].count().reset_index()
-            df_one_redacted = df_count_value[df_count_value[self.frequency] == 1]
-            df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-            df_minimum = df_not_redacted.groupby(['Grouping'], dropna=False)[self.frequency].min().reset_index()
-            df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-            df_minimum_redacted = df_one_redacted.merge(df_minimum, on=['Grouping'])
-            df_minimum_redacted = df_minimum_redacted[['Grouping'] + ['LastMiniumValue']]
-            df_minimum_one = df_log_na.merge(df_minimum_redacted, on=['Grouping'], how='left')
-            condition = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-            df_log_na.loc[condition, 'RedactBinary'] = 1
-            df_log_na.loc[condition, 'Redact'] = 'Secondary Suppression'
-            df_log_na.loc[condition, 'RedactBreakdown'] += ', One count redacted leading to secondary suppression'
+            group_columns = [['Grouping']]
+            redact_breakdown_name = 'One count redacted leading to secondary suppression'
         else:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if list_combination != self.sensitive_columns:
-                    string_combination = ''.join(list_combination)
-                    df_redact_less = df_log_na[df_log_na['RedactBinary'] == 1]
-                    df_count_value = df_redact_less.groupby(['Grouping'] + list_combination, dropna=False)[
-                        self.frequency].count().reset_index()
-                    df_one_redacted = df_count_value[df_count_value[self.frequency] == 1]
-                    if not df_one_redacted.empty:
-                        df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                        df_minimum = df_not_redacted.groupby(['Grouping'] + list_combination, dropna=False)[
-                            self.frequency].min().reset_index()
-                        df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-                        df_minimum_redacted = df_one_redacted.merge(df_minimum, on=['Grouping'] + list_combination)
-                        df_minimum_redacted = df_minimum_redacted[['Grouping'] + list_combination + ['LastMiniumValue']]
-                        df_minimum_one = df_log_na.merge(df_minimum_redacted, on=['Grouping'] + list_combination,
-                                                         how='left')
-                        condition = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                        df_log_na.loc[condition, 'RedactBinary'] = 1
-                        df_log_na.loc[condition, 'Redact'] = 'Secondary Suppression'
-                        df_log_na.loc[
-                            condition, 'RedactBreakdown'] += ', One count redacted leading to secondary suppression'
-
-        self.df_log.loc[df_log_na['RedactBinary'] == 1, 'RedactBinary'] = 1
-        self.df_log.loc[df_log_na['Redact'] == 'Secondary Suppression', 'Redact'] = 'Secondary Suppression'
-        self.df_log.loc[:, 'RedactBreakdown'] = df_log_na['RedactBreakdown']
-        self.df_log.loc[:, 'RedactBreakdown'] = self.df_log['RedactBreakdown'].str.replace('Not Redacted, ', '')
+            group_columns = self._secondary_group_columns()
+            redact_breakdown_name = 'One count redacted leading to secondary suppression'
+        progress = self._stage_progress('one_count_redacted', len(group_columns))
+        for group_by_col in group_columns:
+            rows = self._redact_group_minimum(group_by_col, one_redacted, redact_breakdown_name)
+            progress.step(group_by_col, rows)
 
         logger.info('Completion of initial step with secondary disclosure avoidance!')
+
+    def one_count_redacted(self):
+        self._one_count_redacted()
         # Return the updated dataframe
         return self.df_log
 
-    def one_redact_zero(self):
+    def _one_redact_zero(self):
         logger.info(
             'Start review of next step of secondary disclosure avoidance where review of one count of redacted category in a group.')
-        df_log_na = self.df_log.copy()
-
-        temp_value = 'NaFill'
 
-        for sensitive_column in self.sensitive_columns:
-            df_log_na[sensitive_column] = df_log_na[sensitive_column].fillna(temp_value)
+        def one_redacted(redacted_sum, redacted_count):
+            return redacted_count == 1
 
-            # Grouping by Organization and counting StudentCount, then filtering groups with a single record
-        if self.organization_columns[0] is not None:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if list_combination != self.sensitive_columns:
-                    string_combination = ''.join(list_combination)
-                    df_redact_less = df_log_na[df_log_na['RedactBinary'] == 1]
-                    df_redact_less.loc[:, 'Redacted'] = 1
-                    df_count = df_redact_less.groupby(['Grouping'] + self.organization_columns + list_combination)[
-                        'Redacted'].count().reset_index()
-                    df_one_redacted = df_count[df_count['Redacted'] == 1]
-                    if not df_one_redacted.empty:
-                        df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                        df_minimum = \
-                        df_not_redacted.groupby(['Grouping'] + self.organization_columns + list_combination,
-                                                dropna=False)[self.frequency].min().reset_index()
-                        df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-                        df_minimum_redacted = df_one_redacted.merge(df_minimum, on=[
-                                                                                       'Grouping'] + self.organization_columns + list_combination)
-                        df_minimum_one = df_log_na.merge(df_minimum_redacted,
-                                                         on=['Grouping'] + self.organization_columns + list_combination,
-                                                         how='left')
-                        mask = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                        df_log_na.loc[mask, 'RedactBinary'] = 1
-                        df_log_na.loc[mask, 'Redact'] = 'Secondary Suppression'
-                        df_log_na.loc[
-                            mask, 'RedactBreakdown'] += ', Redacting zeroes or other remaining values missed in one count function'
-
-        else:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if list_combination != self.sensitive_columns:
-                    string_combination = ''.join(list_combination)
-                    df_redact_less = df_log_na[df_log_na['RedactBinary'] == 1]
-                    df_redact_less.loc[:, 'Redacted'] = 1
-                    df_count = df_redact_less.groupby(['Grouping'] + list_combination)['Redacted'].count().reset_index()
-                    df_one_redacted = df_count[df_count['Redacted'] == 1]
-                    if not df_one_redacted.empty:
-                        df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                        df_minimum = df_not_redacted.groupby(['Grouping'] + list_combination, dropna=False)[
-                            self.frequency].min().reset_index()
-                        df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-                        df_minimum_redacted = df_one_redacted.merge(df_minimum, on=['Grouping'] + list_combination)
-                        df_minimum_one = df_log_na.merge(df_minimum_redacted, on=['Grouping'] + list_combination,
-                                                         how='left')
-                        mask = (df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                        df_log_na.loc[mask, 'RedactBinary'] = 1
-                        df_log_na.loc[mask, 'Redact'] = 'Secondary Suppression'
-                        df_log_na.loc[
-                            mask, 'RedactBreakdown'] += ', Redacting zeroes or other remaining values missed in one count function'
-
-        self.df_log.loc[df_log_na['RedactBinary'] == 1, 'RedactBinary'] = 1
-        self.df_log.loc[df_log_na['Redact'] == 'Secondary Suppression', 'Redact'] = 'Secondary Suppression'
-        self.df_log.loc[:, 'RedactBreakdown'] = df_log_na['RedactBreakdown']
-        self.df_log.loc[:, 'RedactBreakdown'] = self.df_log['RedactBreakdown'].str.replace('Not Redacted, ', '')
+        # Grouping by Organization and counting StudentCount, then filtering groups with a single record
+        group_columns = self._secondary_group_columns()
+        progress = self._stage_progress('one_redact_zero', len(group_columns))
+        for group_by_col in group_columns:
+            rows = self._redact_group_minimum(group_by_col, one_redacted,
+                                              'Redacting zeroes or other remaining values missed in one count function')
+            progress.step(group_by_col, rows)
 
         logger.info(
             'Complete review of secondary disclosure avoidance where review of one count of redacted category in a group.')
 
+    def one_redact_zero(self):
+        self._one_redact_zero()
         return self.df_log
 
     # Apply cross suppression for aggreagte values that need to be redacted
-    def cross_suppression(self):
+    def _cross_suppression(self):
         logger.info(
             'Begin analysis if secondary redaction on aggregate levels needs to be applied to original dataframe.')
 
-        df_log_na = self.df_log.copy()
+        organization_columns = self.organization_columns if self.organization_columns[0] is not None else []
+        # Aggregate levels that were redacted before cross suppression started
+        parent_redact = (self._log['Grouping'].to_numpy() > 0)[:, None] & self.redaction.redacted
+        # Two steps per combination, one for each loop below
+        progress = self._stage_progress('cross_suppression', 2 * len(self._secondary_group_columns()))
 
-        temp_value = 'NaFill'
-
-        for sensitive_column in self.sensitive_columns:
-            df_log_na[sensitive_column] = df_log_na[sensitive_column].fillna(temp_value)
-
-        df_parent_redact = self.df_log[(self.df_log['Grouping'] > 0) & (self.df_log['RedactBinary'] == 1)]
-        redact_parent_name = 'RedactParentBinary'
-        df_parent_redact = df_parent_redact.rename(columns={'RedactBinary': redact_parent_name})
-        if self.organization_columns[0] is not None:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                df_test = df_parent_redact[
-                    df_parent_redact[self.organization_columns + list(sensitive_combination)].notna().all(axis=1)]
-                if (list_combination != self.sensitive_columns) & (not df_test.empty):
-                    string_combination = ''.join(list_combination)
-                    df_parent_list = df_parent_redact[
-                        self.organization_columns + list(sensitive_combination) + [redact_parent_name]]
-                    df_parent_list = df_parent_list.drop_duplicates()
-                    df_primary = df_log_na.merge(df_parent_list, on=self.organization_columns + list_combination,
-                                                 how='left')
-                    df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                    df_minimum = df_not_redacted.groupby(self.organization_columns + list_combination, dropna=False)[
-                        self.frequency].min().reset_index()
-                    df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-
-                    for organization_column in self.organization_columns:
-                        df_primary[organization_column] = df_primary[organization_column].astype(str)
-                        df_minimum[organization_column] = df_minimum[organization_column].astype(str)
-
-                    df_minimum_redacted = df_primary.merge(df_minimum, on=self.organization_columns + list_combination)
-                    df_minimum_redacted = df_minimum_redacted[
-                        ['Grouping'] + self.organization_columns + list_combination + ['LastMiniumValue'] + [
-                            redact_parent_name]]
-                    df_minimum = df_minimum_redacted.drop_duplicates()
-                    df_minimum_one = df_log_na.merge(df_minimum_redacted,
-                                                     on=['Grouping'] + self.organization_columns + list_combination,
-                                                     how='left')
-
-                    mask = (df_minimum_one['RedactParentBinary'] == 1) & (df_minimum_one['RedactBinary'] != 1) & (
-                                df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                    df_log_na.loc[mask, 'RedactBinary'] = 1
-                    df_log_na.loc[mask, 'Redact'] = 'Secondary Suppression'
-                    df_log_na.loc[mask, 'RedactBreakdown'] += ', Redacting based on aggregate level redaction'
-
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if (list_combination != self.sensitive_columns):
-                    string_combination = ''.join(list_combination)
-                    df_redacted = self.df_log[(df_log_na['RedactBinary'] == 1) & (df_log_na['Grouping'] == 0)]
-
-                    # One count of redacted value is present
-                    df_count = \
-                    df_redacted.groupby(['Grouping'] + self.organization_columns + list(sensitive_combination))[
-                        'RedactBinary'].count().reset_index()
-                    df_one_count = df_count[df_count['RedactBinary'] == 1]
-                    df_one_count = df_one_count[['Grouping'] + self.organization_columns + list(sensitive_combination)]
-                    df_one_count = df_one_count.drop_duplicates()
-                    df_one_count = df_log_na.merge(df_one_count, on=['Grouping'] + self.organization_columns + list(
-                        sensitive_combination))
-                    df_one_count = df_one_count[(df_one_count['RedactBinary'] == 0)]
-                    df_minimum = \
-                    df_one_count.groupby(['Grouping'] + self.organization_columns + list(sensitive_combination))[
-                        self.frequency].min().reset_index()
-                    df_minimum = df_minimum.rename(columns={self.frequency: 'CrossMinimum' + string_combination})
-                    df_minimum_value = df_log_na.merge(df_minimum, on=['Grouping'] + self.organization_columns + list(
-                        sensitive_combination), how='left')
-                    mask = (df_minimum_value['RedactBinary'] != 1) & (
-                                df_minimum_value["CrossMinimum" + string_combination] == df_minimum_value[
-                            self.frequency])
-
-                    df_log_na.loc[mask, 'RedactBinary'] = 1
-                    df_log_na.loc[mask, 'Redact'] = 'Secondary Suppression'
-                    df_log_na.loc[mask, 'RedactBreakdown'] += ', Redacting based on aggregate level redaction'
+        for sensitive_combination in self.sensitive_combinations:
+            list_combination = list(sensitive_combination)
+            if list_combination == self.sensitive_columns:
+                continue
+            # A null sensitive value stands for every value of the column, it is never matched to a row
+            combination_not_null = (self._log[list_combination] != NULL_CODE).all(axis=1).to_numpy()
+            parent_list = parent_redact & combination_not_null[:, None]
+            # Frequency columns with a redacted aggregate level for the combination
+            if organization_columns:
+                active = (parent_list & self.organization_not_null[:, None]).any(axis=0)
+            else:
+                active = parent_list.any(axis=0)
+            self.cross_decisions.append(bool(active.any()))
+            if self.forced_cross_decisions is not None:
+                active = np.full_like(active, self.forced_cross_decisions[len(self.cross_decisions) - 1])
+            if not active.any():
+                progress.step(list_combination)
+                continue
+            """
+            Rows of a redacted aggregate level for the organization and combination, eg
+            select ParentEntity, SubGroup1, min(GraduationCount) from df_log where RedactBinary != 1
+            and (ParentEntity, SubGroup1) in (select ParentEntity, SubGroup1 from df_log
+            where Grouping > 0 and RedactBinary = 1)
+            group by ParentEntity, SubGroup1
+            
+            The organization branch looks at every group, see below.
+            """
+            groups = self.group_index.groups(organization_columns + list_combination,
+                                             None if organization_columns else self.touched_rows)
+            frequency = groups.take(self.frequency_values)
+            not_redacted = ~groups.take(self.redaction.redacted)
+            minimum = groups.min(frequency, not_redacted)
+            mask = (groups.count(groups.take(parent_list))[groups.ids] > 0) & not_redacted & (
+                    frequency == minimum[groups.ids])
+            if organization_columns:
+                if self.positional_cross_join:
+                    """
+                    The minimums were joined back with a merge on Grouping, organization and combination against
+                    a frame that still held one row per log row, so every log row came back once per row of its
+                    group and the mask was applied by position. The rows that merge kept on pandas 3 are kept
+                    here on any pandas version: the mask of each row is repeated by its group size and cut to the
+                    log length. The merge kept other rows on pandas 2, see data/expected for the pinned output.
+                    As the rows shift with the groups before them, all groups are looked at every time.
+                    """
+                    grouping_groups = self.group_index.groups(['Grouping'] + organization_columns + list_combination)
+                    has_minimum = groups.count(not_redacted)[groups.ids] > 0
+                    group_sizes = grouping_groups.sizes[grouping_groups.ids]
+                    for column in range(mask.shape[1]):
+                        repeats = np.where(has_minimum[:, column], group_sizes, 1)
+                        mask[:, column] = np.repeat(mask[:, column], repeats)[:len(mask)]
+                if self.touched_rows is not None:
+                    # Frequency columns without a touched row are done
+                    active[np.setdiff1d(np.arange(len(active)), self.touched_columns)] = False
+            else:
+                mask = mask & groups.take(combination_not_null)[:, None]
+                if self.touched_rows is not None:
+                    mask &= self._touched_values(organization_columns + list_combination, groups)
+            mask[:, ~active] = False
+            self._secondary_suppression(groups.positions(mask), 'Redacting based on aggregate level redaction')
+            progress.step(list_combination, len(groups.ids))
 
-        else:
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                df_test = df_parent_redact[df_parent_redact[list(sensitive_combination)].notna().all(axis=1)]
-                if (list_combination != self.sensitive_columns) & (not df_test.empty):
-                    string_combination = ''.join(list_combination)
-                    df_parent_list = df_parent_redact[list(sensitive_combination) + [redact_parent_name]]
-                    df_parent_list = df_parent_list.drop_duplicates()
-                    df_primary = self.df_log.merge(df_parent_list, on=list_combination, how='left')
-                    df_not_redacted = df_log_na[df_log_na['RedactBinary'] != 1]
-                    df_minimum = df_not_redacted.groupby(list_combination, dropna=False)[
-                        self.frequency].min().reset_index()
-                    df_minimum = df_minimum.rename(columns={self.frequency: 'LastMiniumValue'})
-                    df_minimum_redacted = df_primary.merge(df_minimum, on=list_combination)
-                    df_minimum_redacted = df_minimum_redacted[
-                        ['Grouping'] + list_combination + ['LastMiniumValue'] + [redact_parent_name]]
-                    df_minimum_redacted = df_minimum_redacted.drop_duplicates()
-                    df_minimum_one = df_log_na.merge(df_minimum_redacted, on=['Grouping'] + list_combination,
-                                                     how='left')
-
-                    mask = (df_minimum_one['RedactParentBinary'] == 1) & (df_minimum_one['RedactBinary'] != 1) & (
-                                df_minimum_one[self.frequency] == df_minimum_one['LastMiniumValue'])
-                    df_log_na.loc[mask, 'RedactBinary'] = 1
-                    df_log_na.loc[mask, 'Redact'] = 'Secondary Suppression'
-                    df_log_na.loc[mask, 'RedactBreakdown'] += ', Redacting based on aggregate level redaction'
-            for sensitive_combination in self.sensitive_combinations:
-                list_combination = list(sensitive_combination)
-                if (list_combination != self.sensitive_columns):
-                    string_combination = ''.join(list_combination)
-                    df_redacted = df_log_na[(df_log_na['RedactBinary'] == 1) & (df_log_na['Grouping'] == 0)]
-                    df_count = df_redacted.groupby(['Grouping'] + list(sensitive_combination))[
-                        'RedactBinary'].count().reset_index()
-                    df_one_count = df_count[df_count['RedactBinary'] == 1]
-                    df_one_count = df_one_count[['Grouping'] + list(sensitive_combination)]
-                    df_one_count = df_one_count.drop_duplicates()
-                    df_one_count = df_log_na.merge(df_one_count, on=['Grouping'] + list(sensitive_combination))
-                    df_one_count = df_one_count[(df_one_count['RedactBinary'] == 0)]
-                    df_minimum = df_one_count.groupby(['Grouping'] + list(sensitive_combination))[
-                        self.frequency].min().reset_index()
-                    df_minimum = df_minimum.rename(columns={self.frequency: 'CrossMinimum' + string_combination})
-                    df_minimum_value = df_log_na.merge(df_minimum, on=['Grouping'] + list(sensitive_combination),
-                                                       how='left')
-                    mask = (df_minimum_value['RedactBinary'] != 1) & (
-                                df_minimum_value["CrossMinimum" + string_combination] == df_minimum_value[
-                            self.frequency])
-                    df_log_na.loc[mask, 'RedactBinary'] = 1
-                    df_log_na.loc[mask, 'Redact'] = 'Secondary Suppression'
-                    df_log_na.loc[mask, 'RedactBreakdown'] += ', Redacting based on aggregate level redaction'
-
-        self.df_log.loc[df_log_na['RedactBinary'] == 1, 'RedactBinary'] = 1
-        self.df_log.loc[df_log_na['Redact'] == 'Secondary Suppression', 'Redact'] = 'Secondary Suppression'
-        self.df_log.loc[:, 'RedactBreakdown'] = df_log_na['RedactBreakdown']
-        self.df_log.loc[:, 'RedactBreakdown'] = self.df_log['RedactBreakdown'].str.replace('Not Redacted, ', '')
+        for sensitive_combination in self.sensitive_combinations:
+            list_combination = list(sensitive_combination)
+            if list_combination == self.sensitive_columns:
+                continue
+            # One count of redacted value is present
+            group_by_col = ['Grouping'] + organization_columns + list_combination
+            groups = self.group_index.groups(group_by_col, self.touched_rows)
+            frequency = groups.take(self.frequency_values)
+            redacted = groups.take(self.redaction.redacted)
+            one_count = redacted & (groups.take(self._log['Grouping'].to_numpy()) == 0)[:, None]
+            if organization_columns:
+                one_count &= groups.take(
+                    self.organization_not_null & (self._log[list_combination] != NULL_CODE).all(axis=1).to_numpy())[:, None]
+            minimum = groups.min(frequency, ~redacted)
+            mask = (groups.count(one_count)[groups.ids] == 1) & ~redacted & (frequency == minimum[groups.ids])
+            if self.touched_rows is not None:
+                mask &= self._touched_values(group_by_col, groups)
+            self._secondary_suppression(groups.positions(mask), 'Redacting based on aggregate level redaction')
+            progress.step(list_combination, len(groups.ids))
 
         logger.info(
             'Completion of analysis if secondary redaction on aggregate levels needs to be applied to original dataframe.')
+
+    def cross_suppression(self):
+        self._cross_suppression()
         return self.df_log
 
+    def _suppress_until_stable(self):
+        """
+        Repeats the secondary suppression passes until a round redacts no new value. After the first round
+        only the groups holding a value redacted since the previous round started are looked at again, the
+        other groups have not changed since they were last looked at. Each frequency column is only looked
+        at again for its own newly redacted values, so it stops after the same rounds as when it is redacted alone.
+        """
+        suppression_round = 0
+        newly_redacted = None
+        while ((newly_redacted is None or len(newly_redacted[0]) > 0) if self.forced_rounds is None
+               else suppression_round < self.forced_rounds):
+            suppression_round += 1
+            redacted_before = self.redaction.redacted
+            self.touched_rows, self.touched_columns = (None, None) if newly_redacted is None else newly_redacted
+            self._sum_redact()
+            self._one_count_redacted()
+            self._one_redact_zero()
+            self._cross_suppression()
+            newly_redacted = np.nonzero(self.redaction.redacted != redacted_before)
+            if len(newly_redacted[0]) > 0:
+                self.last_change_round = suppression_round
+            logger.info('Suppression round %s redacted %s new values.', suppression_round, len(newly_redacted[0]))
+        self.touched_rows = None
+        self.touched_columns = None
 
     """
     Will anonymize multiple frequency columns from the dataframe
     for each frequency column call DataAnonymizer
     and merge all of the redacted data set together into one
+    
+    With vectorized=True the frequency columns are aggregated in one scan and redacted together, and the
+    result holds one row per row of the dataframe, see _process_frequency_columns
     """
-    def process_multiple_frequency_col(self, frequency_columns):
+    def process_multiple_frequency_col(self, frequency_columns, vectorized: bool = False):
 
         logger.info('Inside process_multiple_frequency_col')
 
@@ -781,6 +835,8 @@ class DataAnonymizer:
             raise Exception("frequency_columns is missing")
 
         frequency_columns = frequency_columns if isinstance(frequency_columns,list)  else [frequency_columns]
+        if vectorized:
+            return self._process_frequency_columns(frequency_columns)
         frequency_column_len = len(frequency_columns)
         initial_columns = self.df.columns.tolist()
         cols_without_freq = [col for col in initial_columns if col not in frequency_columns]
@@ -802,7 +858,7 @@ class DataAnonymizer:
             return df_merged
 
 
-        logger.info("found composite_key>>"+str(composite_key))
+        logger.info("found composite_key>>%s", composite_key)
 
         df_copy_arr = []
 
@@ -815,7 +871,7 @@ class DataAnonymizer:
 
             #from initial_columns get a column copy of current looping agg_colum or  that is not in other_freq_cols
             select_cols = [col for col in initial_columns if col not in other_freq_cols]
-            logger.info('selecting cols for copy>>%s',select_cols,exc_info=1)
+            logger.debug('selecting cols for copy>>%s', select_cols)
 
             # will use this select_cols to select a new data frame from incoming datafram and add it to df_copy_arr
             df_copy_arr.append( self.df.loc[:,select_cols] )
@@ -826,7 +882,7 @@ class DataAnonymizer:
 
             agg_colum = frequency_columns[idx]
             self.frequency = agg_colum
-            logger.info("processing frequency column>>%s",str(agg_colum))
+            logger.info("processing frequency column>>%s", agg_colum)
             df_copy = df_copy_arr[idx]
 
             df_merged: DataFrame = self.apply_anonymization()
@@ -838,7 +894,7 @@ class DataAnonymizer:
             }
 
             df_merged = df_merged.rename(columns=redact_key_pair_columns)
-            logger.info("df_merged cols>>%s",str(df_merged.columns.tolist()))
+            logger.debug("df_merged cols>>%s", df_merged.columns)
             #First in the loop is the main dataframe will use to merge other anonymized datafram
             if idx == 0:
                 df_first = df_merged
@@ -854,89 +910,287 @@ class DataAnonymizer:
         return df_first
 
 
+    def _process_frequency_columns(self, frequency_columns: list) -> DataFrame:
+        """
+        Redacts every frequency column in one run: the log is built from a single scan holding all of the
+        columns and each pass works on all of them at once. The result keeps the rows and columns of the
+        dataframe, with RedactBinary_<column>, Redact_<column> and RedactBreakdown_<column> after each
+        frequency column, so no merge is needed to put the columns side by side.
+        When the columns keep different log rows, they are redacted one after the other instead.
+        """
+        for frequency in frequency_columns:
+            self._validate(frequency)
+        n_runs = worker_count(self.n_jobs) if self.executor is None or self.n_jobs != 1 else len(frequency_columns)
+        with process_pool(self.n_jobs, self.executor) as pool:
+            if pool is None or n_runs == 1 or len(frequency_columns) == 1:
+                redact_columns = self._redaction_columns(frequency_columns)
+            else:
+                redact_columns = self._parallel_redaction_columns(pool, split(frequency_columns, n_runs))
+
+        df_detail: DataFrame = self.encoded_columns.decode_frame(self.detail_codes(self.original_columns),
+                                                                 self.compact_dtypes)
+        columns: dict = {}
+        for column in self.original_columns:
+            columns[column] = df_detail[column]
+            if column in redact_columns:
+                df_rendered = redact_columns[column].set_axis(self.df.index)
+                if self.redact_value is not None:
+                    columns[column] = columns[column].astype(type(self.redact_value)).mask(
+                        df_rendered['RedactBinary'] == 1, self.redact_value)
+                for redact_column in ['RedactBinary', 'Redact', 'RedactBreakdown']:
+                    columns[redact_column + '_' + column] = df_rendered[redact_column]
+        logger.info("done processing multiple frequency col")
+        return self._compact_output(DataFrame(columns))
+
+    def _redaction_columns(self, frequency_columns: list) -> dict:
+        """Redacts the frequency columns and returns the RedactBinary, Redact and RedactBreakdown columns
+        of every one of them, lined up with the rows of the dataframe"""
+        # Like the loop over the columns, the log left behind is the one of the last column
+        self.frequency = frequency_columns[-1]
+        if self._run_stage('create_log', lambda: self._create_log(frequency_columns)):
+            runs = [frequency_columns]
+        else:
+            logger.info('Redacting the frequency columns one at a time.')
+            runs = [[frequency] for frequency in frequency_columns]
+
+        redact_columns: dict = {}
+        for run in runs:
+            if run is not frequency_columns:
+                self.frequency = run[0]
+                self._run_stage('create_log', self._create_log)
+            self._run_suppression()
+            for column, frequency in enumerate(run):
+                df_rendered = self.redaction.render(DataFrame(index=self._log.index), column)
+                redact_columns[frequency] = df_rendered.iloc[self.detail_log_rows].reset_index(drop=True)
+        return redact_columns
+
+    def _parallel_redaction_columns(self, pool, runs: list) -> dict:
+        """
+        Sends every run but the last to the worker processes and redacts the last one here, so the log
+        left behind is the same as when the runs are done one after the other. The workers read the coded
+        columns from shared memory instead of receiving a pickled copy of the dataframe.
+        """
+        key_columns = [column for column in self.organization_columns if column is not None] + self.sensitive_columns
+        data_columns = [column for runs_columns in runs for column in runs_columns]
+        if self.redact_column is not None:
+            data_columns.append(self.redact_column)
+        df_codes: DataFrame = self.detail_codes()
+        shared = SharedArrays({column: df_codes[column].to_numpy() for column in key_columns + data_columns})
+        settings = {'parent_organization': self.parent_organization, 'child_organization': self.child_organization,
+                    'sensitive_columns': self.sensitive_columns, 'redact_column': self.redact_column,
+                    'minimum_threshold': self.minimum_threshold, 'redact_zero': self.redact_zero,
+                    'repeat_until_stable': self.repeat_until_stable, 'backend': self.backend}
+        futures = []
+        try:
+            futures = [pool.submit(_redact_shared_columns, shared, self.encoded_columns.labels, settings, run)
+                       for run in runs[:-1]]
+            redact_columns = self._redaction_columns(runs[-1])
+            for future in futures:
+                for frequency, df_rendered in future.result().items():
+                    redact_columns[frequency] = df_rendered.astype({'Redact': str, 'RedactBreakdown': str})
+        finally:
+            # Worker threads read the blocks of this process, they are closed once no run uses them
+            wait(futures)
+            shared.close()
+        return redact_columns
+
     # Integrate log into main dataframe
-    def apply_log(self):
+    def _apply_log(self):
+        """Puts the redaction of every row of the data next to it. The redaction is gathered from the log row of
+        every row, see detail_log_rows, the columns of the data are taken as they are."""
         logger.info('Start applying log to given dataframe.')
-        logger.info(f'original columns>>{self.df.columns}')
-        if self.organization_columns[0] is not None:
-            df_redacted = self.df.merge(self.df_log,
-                                        on=self.organization_columns + self.sensitive_columns + [self.frequency],
-                                        how='inner')
-            columns = self.organization_columns + self.sensitive_columns + [self.frequency] + ['RedactBinary', 'Redact',
-                                                                                               'RedactBreakdown']
-            # columns = list(set(columns) | set(self.df.columns))
-            logger.info("organization_columns not null columns>>%s", str(columns))
-        else:
-            df_redacted = self.df.merge(self.df_log, on=self.sensitive_columns + [self.frequency], how='inner')
-            columns = self.sensitive_columns + [self.frequency] + ['RedactBinary', 'Redact', 'RedactBreakdown']
-            logger.info("organization_columns is null columns>>{columns}", )
-            # columns = list(set(columns) | set(self.df.columns))
+        column = self.frequency_columns.index(self.frequency)
+        log_rows = self.detail_log_rows
+        key_columns = [column for column in self.organization_columns if column is not None] + self.sensitive_columns
+        columns = key_columns + [self.frequency] + ['RedactBinary', 'Redact', 'RedactBreakdown']
         if self.redact_column is not None:
             columns = columns + [self.redact_column]
-
-        logger.info(f'df_redacted columns before selection>>+{df_redacted.columns}')
-        logger.info(f"In Apply Log columns to use>>{str(columns)}")
-        absent_cols = list(set(self.original_columns) - set(columns))
-        rename_hash = {}
-        for index, item in enumerate(absent_cols):
-            absent_cols[index] = item + '_x'
-            rename_hash[absent_cols[index]] = item
-
-        logger.info(f'absent_cols>>,rename_hash >>{str(absent_cols)+":"+str(rename_hash)}')
-        columns =  columns + absent_cols
-        logger.info(f'columns after adding absent_cols >>{str(absent_cols)}')
-        msg = f'columns after adding absent_cols >>{absent_cols}'
-        print(msg)
-        df_redacted = df_redacted[columns]
-        df_redacted = df_redacted.rename(columns=rename_hash)
+        columns = columns + [name for name in self.original_columns if name not in columns]
+        logger.debug("In Apply Log columns to use>>%s", columns)
+
+        redaction = {'RedactBinary': self.redaction.redacted[log_rows, column].astype(np.int64),
+                     'Redact': self.redaction.redact_labels(log_rows, np.full(len(log_rows), column)),
+                     'RedactBreakdown': self.redaction.breakdown_labels(column)[log_rows]}
+        values: dict = {}
+        for name in columns:
+            if name in redaction:
+                values[name] = redaction[name]
+            elif name in key_columns:
+                # The labels of the codes, sensitive values are compared as strings
+                values[name] = self.encoded_columns.decode(name, self.encoded_columns.codes[name], self.compact_dtypes)
+            else:
+                values[name] = self.df[name].array
+        df_redacted = DataFrame(values, columns=columns)
 
         if self.redact_value is not None:
             datatype_of_variable = type(self.redact_value)
             df_redacted[self.frequency] = df_redacted[self.frequency].astype(datatype_of_variable)
             df_redacted.loc[df_redacted['RedactBinary'] == 1, self.frequency] = self.redact_value
 
-        self.df_redacted = df_redacted
-
+        self.df_redacted = self._compact_output(df_redacted)
+        self._stage_progress('apply_log', 1).step(rows=len(df_redacted))
         logger.info('Finished applying log to given dataframe!')
-        # print(self.df_redacted.to_string())
+
+    def _compact_output(self, df: DataFrame) -> DataFrame:
+        """df with the narrow types of the dtype plan when compact_dtypes is set"""
+        if not self.compact_dtypes or self.dtype_plan is None:
+            return df
+        return self.dtype_plan.compact_output(df)
+
+    def apply_log(self):
+        self._apply_log()
         return self.df_redacted
 
     # New method to call the specified functions
     def get_log(self):
         logger.info('Pulling log from class.')
+        if self._log is None:
+            return None
+        df_log = self.encoded_columns.decode_frame(
+            self.redaction.render(self._log, self.frequency_columns.index(self.frequency)), self.compact_dtypes)
         logger.info('Log returned from class!')
-        return self.df_log
-
-    def apply_anonymization(self):
-
-        self.validate_inputs(self.df, self.parent_organization, self.child_organization, self.sensitive_columns, self.frequency, self.redact_column,
-                             self.minimum_threshold, self.redact_zero)  # Validating user inputs
-
-        self.create_log()
+        return self._compact_output(df_log)
 
-        # Call redact_user_requested_records
-        self.redact_user_requested_records()
+    @property
+    def df_log(self) -> DataFrame:
+        """The log with the organization and sensitive values, decoded from the working log on every access"""
+        return self.get_log()
 
-        # Call less_than_threshold
-        # Do Primary Suppression
-        self.less_than_threshold()
-
-        # Call sum_redact
-        self.sum_redact()
+    def apply_anonymization(self):
 
-        # Call one_count_redacted
-        self.one_count_redacted()
+        self._run_stage('validate_inputs', lambda: self._validate(self.frequency))  # Validating user inputs
 
-        # Call one_redact_zero
-        self.one_redact_zero()
+        self._run_stage('create_log', self._create_log)
 
-        # Call cross_suppression
-        self.cross_suppression()
+        self._run_suppression()
 
         # Call apply_log
-        self.apply_log()
+        self._run_stage('apply_log', self._apply_log)
 
         # Return the updated dataframe
 
         return self.df_redacted
 
+    def sweep_thresholds(self, thresholds: list):
+        """
+        Redacts the data for every threshold in one run and returns (summary, masks).
+
+        The log is built once and the passes work on one column per threshold, the same way several frequency
+        columns are redacted at once, so the thresholds cost about as much as one run with wider arrays.
+        masks has one boolean column per threshold, lined up with the rows of the dataframe, True where the
+        value is redacted. summary has one row per threshold with
+            cells_suppressed: rows of the dataframe redacted
+            cells_suppressed_share: the same as a share of the rows
+            counts_lost: sum of the frequency of the redacted rows
+            log_cells_suppressed: redacted values over every aggregate level of the log
+        Every threshold gives the redactions of apply_anonymization with that threshold. The anonymizer is left
+        without a log, the settings are left as they were.
+        """
+        thresholds = list(thresholds) if isinstance(thresholds, (list, tuple, np.ndarray, pd.Series)) else [thresholds]
+        if not thresholds:
+            raise ValueError("At least one threshold should be given to sweep.")
+        if min(thresholds) < 0:
+            raise ValueError("Minimum threshold for redaction must be a positive number.")
+        self._run_stage('validate_inputs', lambda: self._validate(self.frequency, min(thresholds)))
+
+        minimum_threshold = self.minimum_threshold
+        try:
+            self.minimum_threshold = int(thresholds[0])
+            self._run_stage('create_log', self._create_log)
+            # One column of the same frequency per threshold, the passes compare each column with its threshold
+            self._set_log(self._log, [self.frequency] * len(thresholds),
+                          np.repeat(self.frequency_values, len(thresholds), axis=1))
+            self.minimum_threshold = np.array(thresholds, dtype=np.int64)
+            self._run_suppression()
+            log_redacted = self.redaction.redacted
+            detail_redacted = log_redacted[self.detail_log_rows]
+        finally:
+            self.minimum_threshold = minimum_threshold
+            self._log = None
+
+        frequency = self.df[self.frequency].to_numpy()
+        masks = DataFrame(detail_redacted, index=self.df.index, columns=thresholds)
+        summary = DataFrame({'threshold': thresholds,
+                             'cells_suppressed': detail_redacted.sum(axis=0),
+                             'cells_suppressed_share': detail_redacted.mean(axis=0) if len(frequency) else 0.0,
+                             'counts_lost': np.where(detail_redacted, frequency[:, None], 0).sum(axis=0),
+                             'log_cells_suppressed': log_redacted.sum(axis=0)})
+        return summary, masks
+
+    def _run_suppression(self):
+        """Runs the primary and secondary suppression on the log"""
+        # Call redact_user_requested_records
+        self._run_stage('redact_user_requested_records', self._redact_user_requested_records)
+
+        # Call less_than_threshold
+        # Do Primary Suppression
+        self._run_stage('less_than_threshold', self._less_than_threshold)
+
+        if self.repeat_until_stable:
+            # Repeat the secondary suppression until nothing new is redacted
+            self._run_stage('suppress_until_stable', self._suppress_until_stable)
+        else:
+            # Call sum_redact
+            self._run_stage('sum_redact', self._sum_redact)
+
+            # Call one_count_redacted
+            self._run_stage('one_count_redacted', self._one_count_redacted)
+
+            # Call one_redact_zero
+            self._run_stage('one_redact_zero', self._one_redact_zero)
+
+            # Call cross_suppression
+            self._run_stage('cross_suppression', self._cross_suppression)
+
+    def _stage_progress(self, stage: str, steps: int, frequency_columns: list = None) -> StageProgress:
+        """Progress of a stage of steps steps, reported to the progress callback"""
+        frequency_columns = frequency_columns or self.frequency_columns or [self.frequency]
+        return StageProgress(stage, ', '.join(map(str, frequency_columns)), steps, self.sensitive_combinations,
+                             self.progress, self.cancel_token)
+
+    def _run_stage(self, stage: str, function):
+        """Runs one stage, records its metrics in stage_report and hands them to the observers. A cancelled
+        run stops before the stage."""
+        if self.cancel_token is not None:
+            self.cancel_token.check(stage)
+        log_stage = self._log is not None and stage not in ('validate_inputs', 'create_log')
+        rows_in = len(self._log) if log_stage else len(self.df)
+        redacted_before = int(np.count_nonzero(self.redaction.bits)) if log_stage else 0
+        with StageTimer(self.profile_memory) as timer:
+            result = function()
+        if stage == 'apply_log':
+            rows_out, newly_redacted = len(self.df_redacted), 0
+        elif stage == 'validate_inputs':
+            rows_out, newly_redacted = len(self.df), 0
+        elif result is False:
+            # create_log left the log as it was, the columns are redacted one at a time
+            rows_out, newly_redacted = 0, 0
+        else:
+            rows_out = len(self._log) if self._log is not None else 0
+            newly_redacted = int(np.count_nonzero(self.redaction.bits)) - redacted_before if log_stage else 0
+        frequency_columns = self.frequency_columns if stage != 'validate_inputs' and self.frequency_columns else [self.frequency]
+        metrics = {'stage': stage, 'frequency': ', '.join(map(str, frequency_columns)),
+                   'wall_seconds': timer.wall_seconds, 'cpu_seconds': timer.cpu_seconds,
+                   'peak_memory_mb': timer.peak_memory_mb, 'rows_in': rows_in, 'rows_out': rows_out,
+                   'newly_redacted': newly_redacted}
+        self.stage_report.add(metrics)
+        for observer in self.observers:
+            observer(metrics)
+        return result
+
+
+def _redact_shared_columns(shared: SharedArrays, labels: dict, settings: dict, frequency_columns: list) -> dict:
+    """Worker side of DataAnonymizer._parallel_redaction_columns"""
+    arrays = shared.arrays()
+    # The frame and the codes are copied out of the shared blocks before they are closed. Worker threads share
+    # the blocks of the caller, which closes them once every run is done.
+    df = DataFrame(arrays)
+    codes = {column: arrays[column].copy() for column in labels}
+    del arrays
+    if shared.attached:
+        shared.close()
+    anonymizer = DataAnonymizer(df, **settings)
+    anonymizer.encoded_columns = CategoricalCodes.from_codes(codes, labels)
+    # The labels repeat a lot, as categories they are sent back once
+    return {frequency: df_rendered.astype({'Redact': 'category', 'RedactBreakdown': 'category'})
+            for frequency, df_rendered in anonymizer._redaction_columns(frequency_columns).items()}
@@ -0,0 +1,66 @@
+import pandas as pd
+from pandas import DataFrame
+
+# File formats by extension, Parquet and Arrow IPC (Feather) need the pyarrow package
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather',
+           '.ipc': 'feather', '.xlsx': 'excel'}
+# Columns of the redacted data and of the log that only hold a few distinct labels
+LABEL_COLUMNS = ('Redact', 'RedactBreakdown')
+
+
+def file_format(path) -> str:
+    """Format of a file by its extension, csv when the extension is not known"""
+    name = str(getattr(path, 'name', path)).lower()
+    for extension, format_name in FORMATS.items():
+        if name.endswith(extension):
+            return format_name
+    return 'csv'
+
+
+def is_parquet(path) -> bool:
+    return file_format(path) == 'parquet'
+
+
+def job_columns(parent_organization: str = None, child_organization: str = None, sensitive_columns=None,
+                frequency: str = None, redact_column: str = None, frequency_columns: list = None, **settings) -> list:
+    """Columns of the data a redaction reads, the others can be left out when the file is read"""
+    sensitive_columns = list(sensitive_columns) if isinstance(sensitive_columns, (list, tuple)) else [sensitive_columns]
+    columns = [parent_organization, child_organization] + sensitive_columns + [frequency, redact_column]
+    columns += list(frequency_columns or [])
+    return list(dict.fromkeys(column for column in columns if column is not None))
+
+
+def read_table(path, columns: list = None, format_name: str = None) -> DataFrame:
+    """Reads a csv, Parquet, Arrow IPC (Feather) or Excel file by its extension, or by format_name for a file
+    object without a name. Only the given columns are read when columns is given, Parquet and Arrow files skip
+    the others on disk."""
+    format_name = file_format(path) if format_name is None else format_name
+    if format_name == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if format_name == 'feather':
+        return pd.read_feather(path, columns=columns)
+    if format_name == 'excel':
+        return pd.read_excel(path, usecols=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def dictionary_encode(df: DataFrame) -> DataFrame:
+    """Returns df with the Redact and RedactBreakdown columns, those of every frequency column included, as
+    categories, which Parquet and Arrow files store dictionary-encoded"""
+    label_columns = [column for column in df.columns
+                     if str(column) in LABEL_COLUMNS or str(column).startswith(tuple(name + '_' for name in LABEL_COLUMNS))]
+    return df.astype({column: 'category' for column in label_columns if df[column].dtype != 'category'})
+
+
+def write_table(df: DataFrame, path):
+    """Writes a csv, Parquet or Arrow IPC (Feather) file by its extension, the redaction labels are
+    dictionary-encoded in Parquet and Arrow files"""
+    format_name = file_format(path)
+    if format_name == 'parquet':
+        dictionary_encode(df).to_parquet(path, index=False)
+    elif format_name == 'feather':
+        dictionary_encode(df).reset_index(drop=True).to_feather(path)
+    elif format_name == 'excel':
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
@@ -9,10 +9,19 @@ setup(
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown', 
     url='https://github.com/P20WCommunityOfInnovation/DisclosureAvoidance', 
-    packages=find_packages(), 
+    packages=find_packages(exclude=['test', 'test.*', 'benchmarks', 'benchmarks.*']), 
     install_requires=[
         'pandas>=1.0.0'
     ],
+    extras_require={
+        'duckdb': ['duckdb'],
+        'polars': ['polars'],
+        # The optional backends are installed for the tests, which compare them with pandas
+        'test': ['pytest', 'duckdb', 'polars'],
+    },
+    entry_points={
+        'console_scripts': ['dar-tool=dar_tool.cli:main'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
 
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+from dar_tool import DataAnonymizer
+from dar_tool.aggregation import GroupingSetsAggregator
+from dar_tool.backends import get_backend
+from dar_tool.encoding import CategoricalCodes
+
+
+@pytest.mark.parametrize("grouping_set", [['ParentEntity', 'Subgroup1', 'Subgroup2'], ['ChildEntity', 'Subgroup2'], ['ParentEntity'], ['Subgroup1']])
+def test_rollup_matches_groupby(grouping_set):
+    """ Test that every rolled up grouping set matches a direct groupby on the raw data."""
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[[0, 5], 'Subgroup1'] = None
+    key_columns = ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2']
+    encoded_columns = CategoricalCodes(df, ['ParentEntity', 'ChildEntity'], ['Subgroup1', 'Subgroup2'])
+    df_codes = encoded_columns.frame(key_columns)
+    df_codes['GraduationCount'] = df['GraduationCount']
+    aggregator = GroupingSetsAggregator(df_codes, key_columns, 'GraduationCount')
+    # Roll up a finer set first so the requested one is derived from an intermediate cube
+    aggregator.aggregate(['ParentEntity', 'ChildEntity', 'Subgroup2'])
+
+    # The sensitive columns are grouped as strings like CategoricalCodes encodes them, on pandas 2 a null becomes
+    # the string 'None' and is kept as a group
+    df_strings = df.assign(**{column: df[column].astype(str) for column in ['Subgroup1', 'Subgroup2']})
+    expected = df_strings.groupby(grouping_set)['GraduationCount'].sum().reset_index()
+    result = encoded_columns.decode_frame(aggregator.aggregate(grouping_set))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_codes_round_trip():
+    """ Test that decoding the codes gives back the sensitive values as strings, null included."""
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[[0, 5], 'Subgroup1'] = None
+    encoded_columns = CategoricalCodes(df, ['ParentEntity'], ['Subgroup1'])
+
+    # astype(str) keeps null on pandas 3 and makes it 'None' or 'nan' before, the null code is only used for a null label
+    null_label = pd.isna(df['Subgroup1'].astype(str)[0])
+    assert (encoded_columns.codes['Subgroup1'][0] == -1) == null_label
+    decoded = pd.Series(encoded_columns.decode('Subgroup1', encoded_columns.codes['Subgroup1']))
+    pd.testing.assert_series_equal(decoded, df['Subgroup1'].astype(str), check_dtype=False, check_names=False)
+
+
+def test_backend_validation():
+    """ Test that the pandas backend is the default and that an unknown backend is refused."""
+    df = pd.read_csv('./data/TestingData.csv')
+    assert DataAnonymizer(df.copy(), parent_organization='ParentEntity', sensitive_columns='Subgroup1', frequency='GraduationCount').backend.name == 'pandas'
+    with pytest.raises(ValueError):
+        DataAnonymizer(df.copy(), parent_organization='ParentEntity', sensitive_columns='Subgroup1', frequency='GraduationCount', backend='spark')
+
+
+def test_duckdb_backend_matches_pandas():
+    """ Test that the duckdb backend builds the same log and redactions as the pandas backend."""
+    pytest.importorskip('duckdb')
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[[0, 5], 'Subgroup1'] = None
+    pandas_anonymizer = DataAnonymizer(df.copy(), **settings)
+    duckdb_anonymizer = DataAnonymizer(df.copy(), backend='duckdb', **settings)
+
+    pd.testing.assert_frame_equal(duckdb_anonymizer.apply_anonymization(), pandas_anonymizer.apply_anonymization())
+    pd.testing.assert_frame_equal(duckdb_anonymizer.get_log(), pandas_anonymizer.get_log())
+
+
+def test_polars_backend_matches_pandas():
+    """ Test that the polars backend builds the same log and redactions as the pandas backend."""
+    pytest.importorskip('polars')
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', repeat_until_stable=True)
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[[0, 5], 'Subgroup1'] = None
+    pandas_anonymizer = DataAnonymizer(df.copy(), **settings)
+    polars_anonymizer = DataAnonymizer(df.copy(), backend='polars', **settings)
+
+    pd.testing.assert_frame_equal(polars_anonymizer.apply_anonymization(), pandas_anonymizer.apply_anonymization())
+    pd.testing.assert_frame_equal(polars_anonymizer.get_log(), pandas_anonymizer.get_log())
+
+
+@pytest.mark.parametrize("backend", ['duckdb', 'polars'])
+def test_backend_levels_match_pandas(backend):
+    """ Test that every level of the duckdb and polars aggregators matches the pandas one, in the order of the grouping sets, with null keys left out and several frequency columns summed."""
+    pytest.importorskip(backend)
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[[0, 5], 'Subgroup1'] = None
+    df.loc[[7], 'ChildEntity'] = None
+    key_columns = ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2']
+    encoded_columns = CategoricalCodes(df, ['ParentEntity', 'ChildEntity'], ['Subgroup1', 'Subgroup2'])
+    df_codes = encoded_columns.frame(key_columns)
+    df_codes[['GraduationCount', 'CohortCount']] = df[['GraduationCount', 'CohortCount']]
+    grouping_sets = [['ParentEntity', 'Subgroup1', 'Subgroup2'], ['ChildEntity', 'Subgroup1'], ['ParentEntity'], ['Subgroup2'], ['Subgroup1', 'Subgroup2']]
+    frequency = ['GraduationCount', 'CohortCount']
+
+    expected = list(GroupingSetsAggregator(df_codes, key_columns, frequency).grouping_sets(grouping_sets))
+    levels = list(get_backend(backend).aggregator(df_codes, key_columns, frequency).grouping_sets(grouping_sets))
+
+    assert [group_by_col for group_by_col, _ in levels] == grouping_sets
+    for (_, level), (_, expected_level) in zip(levels, expected):
+        pd.testing.assert_frame_equal(level, expected_level)
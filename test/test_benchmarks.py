@@ -0,0 +1,24 @@
+import pandas as pd
+
+from benchmarks.run import compare
+from benchmarks.synthetic import synthetic_hierarchy
+from dar_tool import DataAnonymizer
+
+
+def test_synthetic_hierarchy_is_valid_input():
+    """ Test that the generated data has one row per child and combination, the requested share of small counts and redacts."""
+    df = synthetic_hierarchy(n_parents=3, n_children=4, n_sensitive=2, cardinality=3, small_fraction=0.3, n_frequency=2, seed=1)
+
+    assert len(df) == 3 * 4 * 3 ** 2
+    assert df.groupby('ChildEntity')['ParentEntity'].nunique().max() == 1
+    assert 0.15 < (df['Count1'] <= 10).mean() < 0.45
+    anonymizer = DataAnonymizer(df, parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup0', 'Subgroup1'], frequency='Count0')
+    assert anonymizer.apply_anonymization()['RedactBinary'].sum() > 0
+
+
+def test_compare_flags_regressions():
+    """ Test that only the steps slower or heavier than the baseline by more than the tolerance are reported."""
+    baseline = pd.DataFrame({'scale': ['small'] * 3, 'step': ['create_log', 'sum_redact', 'apply_log'], 'seconds': [0.1, 0.1, 0.001], 'peak_mb': [10.0, 10.0, 10.0]})
+    results = baseline.assign(seconds=[0.2, 0.11, 0.01])
+
+    assert compare(results, baseline, tolerance=0.25)['step'].tolist() == ['create_log']
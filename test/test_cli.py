@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from dar_tool import DataAnonymizer
+from dar_tool.cli import main, run_job
+
+
+def test_cli_runs_manifest_jobs(tmp_path):
+    """ Test that the manifest jobs, a directory included, are redacted on workers with their outputs, logs and summary."""
+    (tmp_path / 'reports').mkdir()
+    for name in ['a.csv', 'b.csv']:
+        shutil.copy('./data/TestingData.csv', tmp_path / 'reports' / name)
+    manifest = {'n_jobs': 2,
+                'defaults': {'parent_organization': 'ParentEntity', 'child_organization': 'ChildEntity', 'sensitive_columns': ['Subgroup1', 'Subgroup2']},
+                'jobs': [{'input': 'reports', 'output': 'redacted', 'log': 'logs', 'frequency': 'GraduationCount'},
+                         {'input': 'reports/a.csv', 'output': 'cohort.csv', 'frequency': 'CohortCount', 'redact_column': 'UserRedaction'}]}
+    (tmp_path / 'manifest.json').write_text(json.dumps(manifest))
+
+    assert main([str(tmp_path / 'manifest.json'), '--summary', str(tmp_path / 'summary.csv')]) == 0
+
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), **manifest['defaults'], frequency='GraduationCount')
+    expected = anonymizer.apply_anonymization()
+    for name in ['a.csv', 'b.csv']:
+        pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'redacted' / name), pd.read_csv(tmp_path / 'redacted' / 'a.csv'))
+    assert len(pd.read_csv(tmp_path / 'redacted' / 'a.csv')) == len(expected)
+    assert len(pd.read_csv(tmp_path / 'logs' / 'a_log.csv')) == len(anonymizer.get_log())
+    summary = pd.read_csv(tmp_path / 'summary.csv')
+    assert summary['status'].tolist() == ['ok', 'ok', 'ok']
+    assert summary['rows'].tolist() == [len(expected)] * 3
+
+
+def test_cli_reports_failed_jobs(tmp_path):
+    """ Test that a failing job is reported in the summary and the exit code without stopping the others."""
+    data_path = os.path.abspath('./data/TestingData.csv')
+    manifest = {'jobs': [{'input': data_path, 'output': str(tmp_path / 'ok.csv'), 'parent_organization': 'ParentEntity', 'child_organization': 'ChildEntity', 'sensitive_columns': ['Subgroup1', 'Subgroup2'], 'frequency': 'GraduationCount'},
+                         {'input': data_path, 'output': str(tmp_path / 'bad.csv'), 'parent_organization': 'ParentEntity', 'sensitive_columns': 'Missing', 'frequency': 'GraduationCount'}]}
+    (tmp_path / 'manifest.json').write_text(json.dumps(manifest))
+
+    assert main([str(tmp_path / 'manifest.json'), '--summary', str(tmp_path / 'summary.csv')]) == 1
+    summary = pd.read_csv(tmp_path / 'summary.csv')
+    assert summary['status'].tolist() == ['ok', 'failed']
+    assert (tmp_path / 'ok.csv').exists()
+
+
+def test_run_job_peak_memory_is_per_job(tmp_path):
+    """ Test that a small job run after a large one in the same process reports its own peak memory, not the one of the large job."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    large = pd.concat([sample_data.assign(ParentEntity=sample_data['ParentEntity'] + str(copy), ChildEntity=sample_data['ChildEntity'] + str(copy)) for copy in range(200)], ignore_index=True)
+    large.to_csv(tmp_path / 'large.csv', index=False)
+    settings = {'parent_organization': 'ParentEntity', 'child_organization': 'ChildEntity', 'sensitive_columns': ['Subgroup1', 'Subgroup2'], 'frequency': 'GraduationCount'}
+
+    large_summary = run_job(dict(settings, input=str(tmp_path / 'large.csv'), output=str(tmp_path / 'large_redacted.csv')))
+    small_summary = run_job(dict(settings, input='./data/TestingData.csv', output=str(tmp_path / 'small_redacted.csv')))
+
+    assert large_summary['status'] == small_summary['status'] == 'ok'
+    assert 0 < small_summary['peak_memory_mb'] < large_summary['peak_memory_mb'] / 10
@@ -1,9 +1,13 @@
+import threading
+import time
+import tracemalloc
 from collections import OrderedDict
 
 import numpy as np
 import pytest
 import pandas as pd
 
+from dar_tool.instrumentation import CancellationToken, RedactionCancelled, StageTimer
 from dar_tool.suppression_check import DataAnonymizer
 
 
@@ -162,6 +166,44 @@ def test_apply_anonymization_redacts_at_least_two_rows_per_sensitive_column(pare
     for column in anonymizer.sensitive_columns:
         assert (redacted.groupby(column)['Redact'].count()>=2).all()
 
+@pytest.mark.parametrize("parent_org, child_org, redact_column", [('ParentEntity', 'ChildEntity', 'UserRedaction'), (None, 'ChildEntity', None)])
+def test_apply_anonymization_repeat_until_stable(parent_org, child_org, redact_column):
+    """
+    Test that repeating suppression keeps every single pass redaction and that one more round of the passes redacts nothing new.
+    """
+    single_pass = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), parent_organization= parent_org, child_organization= child_org, sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column=redact_column)
+    single_pass.apply_anonymization()
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), parent_organization= parent_org, child_organization= child_org, sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column=redact_column, repeat_until_stable=True)
+    anonymizer.apply_anonymization()
+    stable_log = anonymizer.get_log()
+
+    assert (stable_log['RedactBinary'] >= single_pass.get_log()['RedactBinary']).all()
+
+    anonymizer.sum_redact()
+    anonymizer.one_count_redacted()
+    anonymizer.one_redact_zero()
+    result_log = anonymizer.cross_suppression()
+    assert (result_log['RedactBinary'] == stable_log['RedactBinary']).all()
+
+@pytest.mark.parametrize("parent_org, child_org, redact_value", [('ParentEntity', 'ChildEntity', None), (None, 'ChildEntity', '*')])
+def test_process_multiple_frequency_col_vectorized(parent_org, child_org, redact_value):
+    """
+    Test that redacting the frequency columns together gives every column the redaction of a run on that column alone.
+    """
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    anonymizer = DataAnonymizer(sample_data.copy(), parent_organization= parent_org, child_organization= child_org, sensitive_columns=['Subgroup1', 'Subgroup2'], redact_value=redact_value)
+    result_df = anonymizer.process_multiple_frequency_col(['GraduationCount', 'CohortCount'], vectorized=True)
+
+    assert len(result_df) == len(sample_data)
+    key_columns = [column for column in [parent_org, child_org] if column is not None] + ['Subgroup1', 'Subgroup2']
+    for frequency in ['GraduationCount', 'CohortCount']:
+        single_run = DataAnonymizer(sample_data.copy(), parent_organization= parent_org, child_organization= child_org, sensitive_columns=['Subgroup1', 'Subgroup2'], frequency=frequency, redact_value=redact_value).apply_anonymization()
+        review_df = result_df.merge(single_run, on=key_columns)
+        assert len(review_df) == len(sample_data)
+        assert (review_df[frequency + '_x'] == review_df[frequency + '_y']).all()
+        for column in ['RedactBinary', 'Redact', 'RedactBreakdown']:
+            assert (review_df[column + '_' + frequency] == review_df[column]).all()
+
 def test_nebraska_sample_data_with_one_org_level():
     # Set seed for reproducibility
     np.random.seed(1234)
@@ -218,3 +260,227 @@ def test_nebraska_sample_data_with_one_org_level():
        
         
 
+
+
+def test_stage_report_and_observers():
+    """ Test that every stage is reported to the observers with its rows and the values it redacted."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    stages = []
+    anonymizer = DataAnonymizer(sample_data, parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction', observers=[stages.append], profile_memory=True)
+    df_redacted = anonymizer.apply_anonymization()
+
+    assert [stage['stage'] for stage in stages] == ['validate_inputs', 'create_log', 'redact_user_requested_records', 'less_than_threshold', 'sum_redact', 'one_count_redacted', 'one_redact_zero', 'cross_suppression', 'apply_log']
+    report = anonymizer.stage_report.to_frame()
+    assert report['stage'].tolist() == [stage['stage'] for stage in stages]
+    assert report['newly_redacted'].sum() == anonymizer.get_log()['RedactBinary'].sum()
+    assert report.set_index('stage').loc['create_log', 'rows_out'] == len(anonymizer.get_log())
+    assert report.set_index('stage').loc['apply_log', 'rows_out'] == len(df_redacted)
+    assert (report['peak_memory_mb'] >= 0).all() and (report['wall_seconds'] >= 0).all()
+
+
+def test_update_settings_reuses_aggregate_levels():
+    """ Test that changing the threshold reruns only the passes and matches a new anonymizer with that threshold."""
+    from dar_tool.backends import PandasBackend
+
+    class CountingBackend(PandasBackend):
+        scans = 0
+
+        def aggregator(self, df_codes, key_columns, frequency):
+            CountingBackend.scans += 1
+            return super().aggregator(df_codes, key_columns, frequency)
+
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount')
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), backend=CountingBackend(), **settings)
+    anonymizer.apply_anonymization()
+    df_redacted = anonymizer.update_settings(minimum_threshold=20, redact_zero=True, redact_value='*').apply_anonymization()
+
+    expected = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), minimum_threshold=20, redact_zero=True, redact_value='*', **settings).apply_anonymization()
+    pd.testing.assert_frame_equal(df_redacted, expected)
+    assert CountingBackend.scans == 1
+
+
+@pytest.mark.parametrize('repeat_until_stable', [False, True])
+def test_sweep_thresholds_matches_a_run_per_threshold(repeat_until_stable):
+    """ Test that every threshold of a sweep redacts the rows a run with that threshold redacts."""
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', repeat_until_stable=repeat_until_stable)
+    keys = ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2']
+    thresholds = [0, 5, 10, 20]
+    df = pd.read_csv('./data/TestingData.csv')
+    df_summary, df_masks = DataAnonymizer(df.copy(), **settings).sweep_thresholds(thresholds)
+
+    assert df_summary['threshold'].tolist() == thresholds
+    assert df_masks.columns.tolist() == thresholds
+    for threshold in thresholds:
+        df_redacted = DataAnonymizer(df.copy(), minimum_threshold=threshold, **settings).apply_anonymization()
+        df_expected = df[keys].merge(df_redacted[keys + ['RedactBinary']], on=keys, how='left')
+        np.testing.assert_array_equal(df_masks[threshold].to_numpy(), df_expected['RedactBinary'].to_numpy() == 1)
+        summary = df_summary.set_index('threshold').loc[threshold]
+        assert summary['cells_suppressed'] == df_masks[threshold].sum()
+        assert summary['counts_lost'] == df.loc[df_masks[threshold], 'GraduationCount'].sum()
+
+
+@pytest.mark.parametrize('low_memory', [False, True])
+def test_caller_frame_is_not_changed(low_memory):
+    """ Test that the dataframe given is left as it was and that low memory mode redacts like the default mode."""
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction', redact_value='*')
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    df_redacted = DataAnonymizer(sample_data, low_memory=low_memory, **settings).apply_anonymization()
+
+    pd.testing.assert_frame_equal(sample_data, pd.read_csv('./data/TestingData.csv'))
+    expected = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), **settings).apply_anonymization()
+    pd.testing.assert_frame_equal(df_redacted, expected)
+
+
+def test_compact_dtypes():
+    """ Test that compact dtypes give the same redaction with narrow counts and categorical labels."""
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), compact_dtypes=True, **settings)
+    df_redacted = anonymizer.apply_anonymization()
+    expected = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), **settings).apply_anonymization()
+
+    assert df_redacted['GraduationCount'].dtype == np.int16
+    assert df_redacted['RedactBinary'].dtype == np.int8
+    for column in ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2', 'Redact', 'RedactBreakdown']:
+        assert isinstance(df_redacted[column].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(df_redacted, expected, check_dtype=False, check_categorical=False)
+    assert anonymizer.dtype_plan.saved_mb > 0
+    assert anonymizer.get_log()['Grouping'].dtype == np.int8
+
+
+def test_apply_log_one_row_per_data_row():
+    """ Test that every row of the data comes back once, in order, when an aggregate level has the same values as a detail row."""
+    sample_data = pd.read_csv('./data/UserData2.csv')
+    df_redacted = DataAnonymizer(sample_data.copy(), sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='Counts', redact_column='UserRedact').apply_anonymization()
+
+    assert len(df_redacted) == len(sample_data)
+    pd.testing.assert_frame_equal(df_redacted[sample_data.columns], sample_data)
+    assert (df_redacted.loc[sample_data['UserRedact'] == 1, 'RedactBinary'] == 1).all()
+
+
+@pytest.mark.parametrize("repeat_until_stable", [False, True])
+def test_progress_reports_every_combination(repeat_until_stable):
+    """ Test that create_log, the suppression passes and apply_log report their steps in order, with the combination of each step."""
+    reports = []
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction', repeat_until_stable=repeat_until_stable, progress=reports.append)
+    anonymizer.apply_anonymization()
+
+    stages = list(OrderedDict.fromkeys(report['stage'] for report in reports))
+    assert stages == ['create_log', 'redact_user_requested_records', 'less_than_threshold', 'sum_redact', 'one_count_redacted', 'one_redact_zero', 'cross_suppression', 'apply_log']
+    for stage in stages:
+        last = [report for report in reports if report['stage'] == stage][-1]
+        assert last['step'] == last['steps']
+    # One grouping set per organization and combination, the parent level and one per combination
+    create_log = [report for report in reports if report['stage'] == 'create_log']
+    assert [report['combination'] for report in create_log] == [1, 2, 3, 1, 2, 3, None, 1, 2, 3]
+    assert all(report['combinations'] == 3 for report in reports)
+    assert create_log[-1]['rows'] == sum(len(level) for _, level in anonymizer._levels_cache[1])
+    assert [report['combination'] for report in reports if report['stage'] == 'sum_redact'][:2] == [2, 3]
+    assert reports[-1]['rows'] == len(anonymizer.df_redacted)
+
+
+def test_cancel_between_combinations():
+    """ Test that a cancelled run stops at the next combination, and that the anonymizer redacts as before on the next run."""
+    token = CancellationToken()
+    reports = []
+
+    def cancel_in_sum_redact(report):
+        reports.append(report)
+        if report['stage'] == 'sum_redact':
+            token.cancel()
+
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), progress=cancel_in_sum_redact, cancel_token=token, **settings)
+    with pytest.raises(RedactionCancelled):
+        anonymizer.apply_anonymization()
+    assert [report['step'] for report in reports if report['stage'] == 'sum_redact'] == [1]
+    assert reports[-1]['stage'] == 'sum_redact'
+    assert anonymizer.stage_report.to_frame()['stage'].tolist() == ['validate_inputs', 'create_log', 'redact_user_requested_records', 'less_than_threshold']
+
+    anonymizer.cancel_token = None
+    expected = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), **settings).apply_anonymization()
+    pd.testing.assert_frame_equal(anonymizer.apply_anonymization(), expected)
+
+
+def test_cancel_before_the_other_grouping_sets_are_built(monkeypatch):
+    """ Test that a run cancelled at the first grouping set of create_log does not roll up the other grouping sets."""
+    from dar_tool.aggregation import GroupingSetsAggregator
+    rollups = []
+    rollup = GroupingSetsAggregator._rollup
+
+    def counted_rollup(self, group_by_col):
+        rollups.append(group_by_col)
+        return rollup(self, group_by_col)
+
+    monkeypatch.setattr(GroupingSetsAggregator, '_rollup', counted_rollup)
+    token = CancellationToken()
+    anonymizer = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', progress=lambda report: token.cancel(), cancel_token=token)
+    with pytest.raises(RedactionCancelled):
+        anonymizer.apply_anonymization()
+    assert len(rollups) == 1
+
+
+def test_stage_cpu_time_is_per_thread():
+    """ Test that the CPU time of a stage leaves out the work of another thread running at the same time."""
+    done = threading.Event()
+
+    def spin():
+        while not done.is_set():
+            pass
+
+    spinner = threading.Thread(target=spin)
+    spinner.start()
+    try:
+        with StageTimer() as timer:
+            done.wait(0.3)
+    finally:
+        done.set()
+        spinner.join()
+    assert timer.wall_seconds >= 0.3
+    assert timer.cpu_seconds < 0.1
+
+
+
+def test_overlapping_stages_trace_memory_until_the_last_ends():
+    """ Test that a traced stage ending on one thread leaves the tracing of a stage still running on another."""
+    first_started, second_started = threading.Event(), threading.Event()
+    timers = {}
+
+    def first_stage():
+        with StageTimer(profile_memory=True) as timer:
+            timers['first'] = timer
+            first_started.set()
+            second_started.wait()
+
+    thread = threading.Thread(target=first_stage)
+    thread.start()
+    first_started.wait()
+    with StageTimer(profile_memory=True) as second:
+        second_started.set()
+        thread.join()
+        assert tracemalloc.is_tracing()
+        values = np.ones(2 ** 20)
+        del values
+    assert not tracemalloc.is_tracing()
+    assert timers['first'].peak_memory_mb is not None
+    assert second.peak_memory_mb >= 7
+
+
+@pytest.mark.parametrize("fixture, settings", [
+    ('ParentChildTwoSensitive_GraduationCount', dict(sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount')),
+    ('ParentChildTwoSensitive_CohortCount', dict(sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='CohortCount')),
+    ('TestingData_UserRedaction', dict(sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')),
+    ('ThreeSensitive_ParentChild', dict(sensitive_columns=['Subgroup1', 'Subgroup2', 'Subgroup3'], frequency='Count', redact_column='UserRedact'))])
+def test_positional_cross_join_matches_expected_output(fixture, settings):
+    """
+    Test that the default positional cross join gives the pinned output on any pandas version. The files hold the output
+    of the original merge based passes on pandas 3, which the merge on pandas 2 does not give.
+    """
+    expected = pd.read_csv('./data/expected/' + fixture + '.csv')
+    redact_columns = ['RedactBinary', 'Redact', 'RedactBreakdown']
+    input_columns = [column for column in expected.columns if column not in redact_columns]
+    anonymizer = DataAnonymizer(expected[input_columns].copy(), parent_organization='ParentEntity', child_organization='ChildEntity', **settings)
+    result_df = anonymizer.apply_anonymization()
+
+    result_df = result_df[input_columns + redact_columns]
+    result_df[['Redact', 'RedactBreakdown']] = result_df[['Redact', 'RedactBreakdown']].astype(str)
+    pd.testing.assert_frame_equal(result_df, expected, check_dtype=False)
@@ -0,0 +1,38 @@
+import dataclasses
+
+import pandas as pd
+import pytest
+
+from dar_tool import AnonymizerConfig, DataAnonymizer
+
+SETTINGS = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')
+
+
+@pytest.mark.parametrize("repeat_until_stable", [False, True])
+def test_run_many_matches_data_anonymizer(repeat_until_stable):
+    """ Test that one config run on many frames at once in threads gives the result of a DataAnonymizer per frame, and leaves the frames as they were."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    frames = [sample_data, sample_data.assign(GraduationCount=sample_data['GraduationCount'] * 2), sample_data.iloc[::-1].reset_index(drop=True)] * 2
+    copies = [df.copy() for df in frames]
+    config = AnonymizerConfig(repeat_until_stable=repeat_until_stable, **SETTINGS)
+
+    results = config.run_many(frames, max_workers=4)
+
+    for df, df_copy, result in zip(frames, copies, results):
+        anonymizer = DataAnonymizer(df_copy.copy(), repeat_until_stable=repeat_until_stable, **SETTINGS)
+        pd.testing.assert_frame_equal(result.df_redacted, anonymizer.apply_anonymization())
+        pd.testing.assert_frame_equal(result.df_log, anonymizer.get_log())
+        pd.testing.assert_frame_equal(df, df_copy)
+        assert 'apply_log' in set(result.stages['stage'])
+
+
+def test_config_is_immutable():
+    """ Test that a config can not be changed, replace gives a new one."""
+    config = AnonymizerConfig(**SETTINGS)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.minimum_threshold = 5
+    assert config.sensitive_columns == ('Subgroup1', 'Subgroup2')
+    assert config.replace(minimum_threshold=5).minimum_threshold == 5
+    assert config.minimum_threshold == 10
+    with pytest.raises(ValueError):
+        AnonymizerConfig(minimum_threshold=-1, **SETTINGS)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from dar_tool.encoding import CategoricalCodes
+from dar_tool.group_index import GroupIndex
+
+
+def test_group_reductions_match_groupby():
+    """ Test that the segmented reductions of the index match a groupby on the coded columns."""
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[[0, 5], 'Subgroup1'] = None
+    encoded_columns = CategoricalCodes(df, ['ParentEntity'], ['Subgroup1', 'Subgroup2'])
+    df_codes = encoded_columns.frame(['ParentEntity', 'Subgroup1', 'Subgroup2'])
+    df_codes['GraduationCount'] = df['GraduationCount']
+    group_by_col = ['ParentEntity', 'Subgroup1']
+
+    groups = GroupIndex(df_codes, ['ParentEntity', 'Subgroup1', 'Subgroup2']).groups(group_by_col)
+    frequency = df_codes['GraduationCount'].to_numpy()
+    mask = frequency > 10
+    expected = df_codes[mask].groupby(group_by_col)['GraduationCount']
+
+    # Group ids follow the sort order of the keys, so they line up with the groupby result
+    assert groups.n_groups == df_codes.groupby(group_by_col).ngroups
+    present = groups.count(mask) > 0
+    np.testing.assert_array_equal(groups.count(mask)[present], expected.count().to_numpy())
+    np.testing.assert_array_equal(groups.sum(frequency, mask)[present], expected.sum().to_numpy())
+    np.testing.assert_array_equal(groups.min(frequency, mask)[present], expected.min().to_numpy())
+    assert np.isnan(groups.min(frequency, mask)[~present]).all()
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from dar_tool import anonymize_by_parent, redact_incremental, update_redaction
+
+SETTINGS = dict(child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction', positional_cross_join=False)
+KEYS = ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2']
+
+
+@pytest.mark.parametrize("repeat_until_stable", [False, True])
+def test_update_redaction_matches_a_new_redaction(repeat_until_stable):
+    """ Test that inserting, correcting and removing rows gives the redaction of the updated data from scratch."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    late = sample_data['ChildEntity'] == sample_data['ChildEntity'].iloc[-1]
+    state = redact_incremental(sample_data[~late], 'ParentEntity', repeat_until_stable=repeat_until_stable, **SETTINGS)
+    corrected = sample_data.loc[[0, 1], KEYS].assign(GraduationCount=[3, 40])
+
+    new_state, diff = update_redaction(state, inserted=sample_data[late], updated=corrected, deleted=sample_data.loc[[5], KEYS])
+
+    expected = sample_data.drop(index=5).copy()
+    expected.loc[[0, 1], 'GraduationCount'] = [3, 40]
+    expected_redacted, expected_summary = anonymize_by_parent(expected, 'ParentEntity', repeat_until_stable=repeat_until_stable, **SETTINGS)
+    pd.testing.assert_frame_equal(new_state.df, expected.reset_index(drop=True), check_like=True)
+    pd.testing.assert_frame_equal(new_state.df_redacted, expected_redacted, check_like=True)
+    pd.testing.assert_frame_equal(new_state.df_log, expected_summary)
+
+    assert len(diff) > 0
+    changed = diff[diff['Change'] != 'Removed']
+    before = changed.merge(state.df_log[['Grouping'] + KEYS + ['RedactBinary']], on=['Grouping'] + KEYS, how='left', suffixes=('', 'Before'))
+    assert (before['RedactBinaryBefore'].fillna(0) != before['RedactBinary']).all()
+    assert (changed['RedactBinary'] == (changed['Change'] == 'Redacted')).all()
+
+
+def test_update_redaction_reports_removed_cells():
+    """ Test that deleting the rows of a redacted cell reports the cell as removed."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    state = redact_incremental(sample_data, 'ParentEntity', **SETTINGS)
+    cell_columns = ['Grouping', 'ChildEntity', 'Subgroup1', 'Subgroup2']
+    df_log = state.df_log
+    cell = df_log[df_log['ParentEntity'].isna() & df_log[cell_columns].notna().all(axis=1) & (df_log['RedactBinary'] == 1)].iloc[[0]]
+
+    _, diff = update_redaction(state, deleted=sample_data.merge(cell[cell_columns[1:]], on=cell_columns[1:])[KEYS])
+
+    removed = diff[diff['Change'] == 'Removed']
+    assert len(removed.merge(cell[cell_columns], on=cell_columns)) == 1
+    assert (removed['RedactBinary'] == 1).all()
+
+
+def test_update_redaction_unknown_row():
+    """ Test that correcting a row that is not in the data is refused."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    state = redact_incremental(sample_data, 'ParentEntity', **SETTINGS)
+    with pytest.raises(KeyError):
+        update_redaction(state, updated=sample_data.loc[[0], KEYS].assign(ChildEntity='Unknown'))
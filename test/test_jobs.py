@@ -0,0 +1,58 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from dar_tool import DataAnonymizer
+from dar_tool.jobs import JobCancelled, RedactionJob
+
+SETTINGS = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_job_matches_a_run_in_the_script(vectorized):
+    """ Test that a job run in the background gives the redaction of process_multiple_frequency_col, reports every stage and writes the output file."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    frequency_columns = ['GraduationCount', 'CohortCount']
+    expected = DataAnonymizer(sample_data, **SETTINGS).process_multiple_frequency_col(frequency_columns, vectorized=vectorized)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        job = RedactionJob(DataAnonymizer(sample_data, **SETTINGS), frequency_columns, pool, vectorized=vectorized)
+        pd.testing.assert_frame_equal(job.result(), expected)
+    assert job.status == 'done'
+    assert job.progress == 1.0
+    assert len(job.stages) == job.expected_stages
+    assert job.anonymizer.observers == []
+    pd.testing.assert_frame_equal(pd.read_csv(job.output_file('.csv')), pd.read_csv(io.StringIO(expected.to_csv(index=False))))
+    job.close()
+
+
+def test_cancel_job():
+    """ Test that a cancelled job stops after its current stage, and that a job cancelled before it started never runs."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    started, release = threading.Event(), threading.Event()
+
+    def pause_after_create_log(metrics):
+        if metrics['stage'] == 'create_log':
+            started.set()
+            release.wait()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        job = RedactionJob(DataAnonymizer(sample_data, observers=[pause_after_create_log], **SETTINGS), ['GraduationCount'], pool)
+        queued = RedactionJob(DataAnonymizer(sample_data, **SETTINGS), ['GraduationCount'], pool)
+        started.wait()
+        assert job.status == 'running'
+        assert queued.status == 'queued'
+        queued.cancel()
+        job.cancel()
+        release.set()
+        with pytest.raises(JobCancelled):
+            job.result()
+        with pytest.raises(JobCancelled):
+            queued.result()
+    assert job.status == 'cancelled'
+    assert queued.status == 'cancelled'
+    assert [metrics['stage'] for metrics in job.stages] == ['create_log']
+    assert queued.stages == []
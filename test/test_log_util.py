@@ -0,0 +1,41 @@
+import logging
+import subprocess
+import sys
+
+import pandas as pd
+
+from util.LogUtil import LazyFrame, Sampler
+
+
+def test_import_keeps_host_logging():
+    """ Test that importing the package leaves the logging of the host application as it was."""
+    script = ("import logging; host = logging.getLogger('host'); import dar_tool; "
+              "print(logging.getLogger().level, logging.getLogger().handlers == [], host.disabled)")
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout.split()
+
+    assert output == [str(logging.WARNING), 'True', 'False']
+
+
+def test_lazy_frame_renders_only_when_emitted(caplog):
+    """ Test that a frame passed to a disabled level is never rendered and an emitted one is capped."""
+    class CountingFrame(LazyFrame):
+        renders = 0
+
+        def __str__(self):
+            CountingFrame.renders += 1
+            return super().__str__()
+
+    df = pd.DataFrame({'Count': range(100)})
+    logger = logging.getLogger('dar_tool.test')
+    with caplog.at_level(logging.INFO, logger='dar_tool.test'):
+        logger.debug('log>>%s', CountingFrame(df))
+        assert CountingFrame.renders == 0
+        logger.info('log>>%s', CountingFrame(df, max_rows=3))
+
+    assert CountingFrame.renders > 0
+    assert '<100 rows x 1 columns>' in caplog.text and len(caplog.records[0].getMessage().splitlines()) == 5
+
+
+def test_sampler_lets_every_nth_call_through():
+    sample = Sampler(3)
+    assert [sample() for _ in range(7)] == [True, False, False, True, False, False, True]
@@ -0,0 +1,78 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dar_tool import DataAnonymizer, redact_reports
+from dar_tool.parallel import SharedArrays, split
+
+
+def test_shared_arrays_round_trip():
+    """ Test that pickled shared arrays give back the same values without carrying them."""
+    codes = np.arange(1000, dtype=np.int32)
+    shared = SharedArrays({'labels': np.array(['a', None], dtype=object), 'codes': codes})
+    payload = pickle.dumps(shared)
+    assert len(payload) < codes.nbytes
+
+    attached = pickle.loads(payload)
+    arrays = attached.arrays()
+    assert list(arrays) == ['labels', 'codes']
+    np.testing.assert_array_equal(arrays['codes'], codes)
+    assert list(arrays['labels']) == ['a', None]
+    del arrays
+    attached.close()
+    shared.close()
+
+
+def test_split_keeps_order():
+    assert split(['a', 'b', 'c', 'd', 'e'], 2) == [['a', 'b'], ['c', 'd', 'e']]
+    assert split(['a'], 4) == [['a']]
+
+
+def test_process_multiple_frequency_col_n_jobs():
+    """ Test that redacting the frequency columns in worker processes gives the same result and log as one process."""
+    def anonymizer(n_jobs):
+        return DataAnonymizer(pd.read_csv('./data/TestingData.csv'), parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], redact_column='UserRedaction', n_jobs=n_jobs)
+
+    serial = anonymizer(1)
+    expected = serial.process_multiple_frequency_col(['GraduationCount', 'CohortCount'], vectorized=True)
+    parallel = anonymizer(2)
+    result_df = parallel.process_multiple_frequency_col(['GraduationCount', 'CohortCount'], vectorized=True)
+
+    pd.testing.assert_frame_equal(result_df, expected)
+    pd.testing.assert_frame_equal(parallel.get_log(), serial.get_log())
+
+
+@pytest.mark.parametrize("make_executor", [ProcessPoolExecutor, ThreadPoolExecutor])
+def test_process_multiple_frequency_col_executor(make_executor):
+    """ Test that every run sent to an executor of processes or threads reads the shared columns until it is done."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    sample_data['DoubleCount'] = sample_data['GraduationCount'] * 2
+    sample_data['ShiftedCount'] = sample_data['CohortCount'] + 3
+    frequency_columns = ['GraduationCount', 'CohortCount', 'DoubleCount', 'ShiftedCount']
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], redact_column='UserRedaction')
+
+    serial = DataAnonymizer(sample_data.copy(), **settings)
+    expected = serial.process_multiple_frequency_col(frequency_columns, vectorized=True)
+    with make_executor(max_workers=4) as pool:
+        parallel = DataAnonymizer(sample_data.copy(), executor=pool, **settings)
+        result_df = parallel.process_multiple_frequency_col(frequency_columns, vectorized=True)
+
+    pd.testing.assert_frame_equal(result_df, expected)
+    pd.testing.assert_frame_equal(parallel.get_log(), serial.get_log())
+
+
+def test_redact_reports_reads_paths_in_workers(tmp_path):
+    """ Test that reports given by path are redacted and written by the workers."""
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount')
+    reports = [dict(settings, df='./data/TestingData.csv', output=str(tmp_path / 'first.csv')),
+               dict(settings, df='./data/TestingData.csv', minimum_threshold=5, output=str(tmp_path / 'second.csv'))]
+
+    outputs = redact_reports(reports, n_jobs=2)
+
+    assert outputs == [report['output'] for report in reports]
+    for report, output in zip(reports, outputs):
+        expected = DataAnonymizer(pd.read_csv('./data/TestingData.csv'), **{key: value for key, value in report.items() if key not in ('df', 'output')}).apply_anonymization()
+        assert (pd.read_csv(output)['RedactBinary'].to_numpy() == expected['RedactBinary'].to_numpy()).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from dar_tool.reasons import RedactionReasons
+
+
+def test_render_reasons_in_applied_order():
+    """ Test that Redact keeps the first reason unless a secondary reason applies and that the breakdown lists every reason in order."""
+    redaction = RedactionReasons(4)
+    user = redaction.reason('User-requested redaction', 'User-requested redaction')
+    primary = redaction.reason('Primary Suppression', 'Less Than or equal to 10 and not equal to zero')
+    secondary = redaction.reason('Secondary Suppression', 'Sum of values less than threshold', secondary=True)
+    redaction.add(np.array([0]), np.array([0]), user)
+    redaction.add(np.array([1, 2]), np.array([0, 0]), primary)
+    redaction.add(np.array([0, 2]), np.array([0, 0]), secondary)
+    redaction.add(np.array([2]), np.array([0]), secondary)
+
+    df_log = redaction.render(pd.DataFrame(index=range(4)))
+    assert list(df_log['RedactBinary']) == [1, 1, 1, 0]
+    assert list(df_log['Redact']) == ['Secondary Suppression', 'Primary Suppression', 'Secondary Suppression', 'Not Redacted']
+    assert list(df_log['RedactBreakdown']) == [
+        'User-requested redaction, Sum of values less than threshold',
+        'Less Than or equal to 10 and not equal to zero',
+        'Less Than or equal to 10 and not equal to zero, Sum of values less than threshold, Sum of values less than threshold',
+        'Not Redacted']
+
+
+def test_reasons_kept_per_frequency_column():
+    """ Test that every frequency column of the log keeps its own reasons."""
+    redaction = RedactionReasons(2, n_columns=2)
+    primary = redaction.reason('Primary Suppression', 'Less Than or equal to 10 and not equal to zero')
+    redaction.add(np.array([0, 1]), np.array([0, 1]), primary)
+
+    assert list(redaction.render(pd.DataFrame(index=range(2)), column=0)['RedactBinary']) == [1, 0]
+    assert list(redaction.render(pd.DataFrame(index=range(2)), column=1)['Redact']) == ['Not Redacted', 'Primary Suppression']
@@ -0,0 +1,61 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dar_tool import DataAnonymizer, anonymize_by_parent
+
+
+@pytest.mark.parametrize("child_org, redact_column, repeat_until_stable", [('ChildEntity', 'UserRedaction', False), ('ChildEntity', None, True), (None, None, False)])
+def test_anonymize_by_parent_matches_single_run(child_org, redact_column, repeat_until_stable):
+    """ Test that redacting the parents in shards gives the rows and aggregate levels of a run on the whole data."""
+    sample_data = pd.read_csv('./data/TestingData.csv')
+    if child_org is None:
+        sample_data = sample_data.groupby(['ParentEntity', 'Subgroup1', 'Subgroup2'], as_index=False)['GraduationCount'].sum()
+    settings = dict(child_organization=child_org, sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column=redact_column, repeat_until_stable=repeat_until_stable, positional_cross_join=False)
+    anonymizer = DataAnonymizer(sample_data.copy(), parent_organization='ParentEntity', **settings)
+    expected = anonymizer.apply_anonymization()
+    df_log = anonymizer.get_log()
+
+    redacted, summary = anonymize_by_parent(sample_data.copy(), 'ParentEntity', max_shard_rows=12, n_jobs=2, **settings)
+
+    pd.testing.assert_frame_equal(redacted, expected.reset_index(drop=True), check_like=True)
+    expected_summary = df_log[df_log['Grouping'] <= summary['Grouping'].max()][summary.columns].reset_index(drop=True)
+    pd.testing.assert_frame_equal(summary, expected_summary)
+
+
+def test_anonymize_by_parent_child_in_two_parents():
+    """ Test that a child organization found under two parents is refused."""
+    df = pd.read_csv('./data/TestingData.csv')
+    df.loc[0, 'ChildEntity'] = df.loc[df['ParentEntity'] != df.loc[0, 'ParentEntity'], 'ChildEntity'].iloc[0]
+    with pytest.raises(ValueError):
+        anonymize_by_parent(df, 'ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount')
+
+
+def random_parents(seed):
+    """Three parents of two children each with two sensitive columns and random counts, some rows left out"""
+    rng = np.random.default_rng(seed)
+    rows = [{'ParentEntity': f'P{parent}', 'ChildEntity': f'P{parent}C{child}', 'Subgroup1': subgroup1, 'Subgroup2': subgroup2, 'GraduationCount': int(rng.integers(0, 40))}
+            for parent, child, subgroup1, subgroup2 in itertools.product(range(3), range(2), ['A', 'B', 'C'], ['X', 'Y'])
+            if rng.random() > 0.15]
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_anonymize_by_parent_matches_row_join_engine(seed):
+    """ Test on random data that the sharded redaction gives the redaction of a run on the whole data joining its cross suppression minimums by row."""
+    df = random_parents(seed)
+    settings = dict(child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', repeat_until_stable=seed % 2 == 1, positional_cross_join=False)
+    expected = DataAnonymizer(df.copy(), parent_organization='ParentEntity', **settings).apply_anonymization()
+
+    redacted, _ = anonymize_by_parent(df.copy(), 'ParentEntity', max_shard_rows=12, **settings)
+
+    pd.testing.assert_frame_equal(redacted, expected, check_like=True)
+
+
+def test_anonymize_by_parent_refuses_positional_cross_join():
+    """ Test that the positional cross suppression join, which the shards can not follow, is refused."""
+    df = pd.read_csv('./data/TestingData.csv')
+    with pytest.raises(ValueError):
+        anonymize_by_parent(df, 'ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', positional_cross_join=True)
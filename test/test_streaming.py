@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from dar_tool import anonymize_by_parent, anonymize_file
+
+
+@pytest.mark.parametrize("redact_column, repeat_until_stable", [('UserRedaction', False), (None, True)])
+def test_anonymize_file_matches_anonymize_by_parent(tmp_path, redact_column, repeat_until_stable):
+    """ Test that redacting a file in chunks and buckets gives the rows and the log of anonymize_by_parent."""
+    settings = dict(child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column=redact_column, repeat_until_stable=repeat_until_stable, positional_cross_join=False)
+    expected, expected_log = anonymize_by_parent(pd.read_csv('./data/TestingData.csv'), 'ParentEntity', **settings)
+    expected.to_csv(tmp_path / 'expected.csv', index=False)
+
+    anonymize_file('./data/TestingData.csv', tmp_path / 'redacted.csv', 'ParentEntity', log_path=tmp_path / 'log.csv', chunksize=7, n_buckets=3, **settings)
+
+    key_columns = ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2']
+    redacted = pd.read_csv(tmp_path / 'redacted.csv').sort_values(key_columns).reset_index(drop=True)
+    expected = pd.read_csv(tmp_path / 'expected.csv').sort_values(key_columns).reset_index(drop=True)
+    pd.testing.assert_frame_equal(redacted, expected, check_like=True)
+    log = pd.read_csv(tmp_path / 'log.csv')
+    assert len(log) == len(expected_log)
+    assert log['RedactBinary'].sum() == expected_log['RedactBinary'].sum()
+
+
+def test_anonymize_file_refuses_positional_cross_join(tmp_path):
+    """ Test that the positional cross suppression join, which the buckets can not follow, is refused."""
+    with pytest.raises(ValueError):
+        anonymize_file('./data/TestingData.csv', tmp_path / 'redacted.csv', 'ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', positional_cross_join=True)
+    assert not (tmp_path / 'redacted.csv').exists()
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from dar_tool import redact_reports
+from dar_tool.table_io import dictionary_encode, job_columns, read_table, write_table
+
+
+def test_redact_report_reads_only_job_columns(tmp_path):
+    """ Test that a projected report reads the columns of the redaction only and redacts them like the whole file."""
+    settings = dict(parent_organization='ParentEntity', child_organization='ChildEntity', sensitive_columns=['Subgroup1', 'Subgroup2'], frequency='GraduationCount', redact_column='UserRedaction')
+    assert job_columns(**settings) == ['ParentEntity', 'ChildEntity', 'Subgroup1', 'Subgroup2', 'GraduationCount', 'UserRedaction']
+
+    projected, whole = redact_reports([dict(settings, df='./data/TestingData.csv', project=True), dict(settings, df='./data/TestingData.csv')])
+
+    assert 'CohortCount' in whole.columns and 'CohortCount' not in projected.columns
+    pd.testing.assert_frame_equal(projected, whole[projected.columns.tolist()])
+
+
+def test_dictionary_encode_label_columns():
+    """ Test that only the Redact and RedactBreakdown columns of every frequency column become categories."""
+    df = pd.DataFrame({'Redact': ['Not Redacted'], 'RedactBreakdown_Count': ['Not Redacted'], 'RedactBinary': [0], 'Subgroup1': ['Male']})
+    encoded = dictionary_encode(df)
+
+    assert encoded.dtypes.astype(str).tolist() == ['category', 'category', 'int64', df['Subgroup1'].dtype.name]
+
+
+@pytest.mark.parametrize("extension", ['parquet', 'feather'])
+def test_arrow_files_round_trip(tmp_path, extension):
+    """ Test that Parquet and Arrow files are written with dictionary-encoded labels and read back by column."""
+    pytest.importorskip('pyarrow')
+    df = pd.DataFrame({'ParentEntity': ['District1', 'District2'], 'Redact': ['Not Redacted', 'Primary Suppression']})
+    write_table(df, tmp_path / f'redacted.{extension}')
+
+    result = read_table(tmp_path / f'redacted.{extension}', columns=['Redact'])
+    assert result['Redact'].dtype == 'category'
+    assert result['Redact'].astype(str).tolist() == df['Redact'].tolist()
@@ -1,8 +1,10 @@
 import logging.config
 import logging
+import os
 LOGGING_CONFIG = {
     'version': 1,
-    'disable_existing_loggers': True,
+    # Loggers the host application created before configure_logging keep working
+    'disable_existing_loggers': False,
     'formatters': {
         'standard': {
 
@@ -26,13 +28,57 @@ LOGGING_CONFIG = {
     'loggers': {
         '': {  # Root logger
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': True,
         },
     }
 }
 
-logging.config.dictConfig(LOGGING_CONFIG)
+# Rows and columns of a DataFrame shown in a diagnostic message, see LazyFrame
+MAX_FRAME_ROWS = 10
+MAX_FRAME_COLUMNS = 20
+
+
+def configure_logging(level: str = None):
+    """Sends the logs to the console, for the app and the command line. The library itself never configures
+    logging, an application that imports it keeps its own configuration. level defaults to the DART_LOG_LEVEL
+    environment variable, then INFO."""
+    level = (level or os.environ.get('DART_LOG_LEVEL') or 'INFO').upper()
+    config = dict(LOGGING_CONFIG)
+    config['handlers'] = {'console': dict(LOGGING_CONFIG['handlers']['console'], level=level)}
+    config['loggers'] = {'': dict(LOGGING_CONFIG['loggers'][''], level=level)}
+    logging.config.dictConfig(config)
+
 
 def create_logger(name:str)-> logging:
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
+
+
+class LazyFrame:
+    """Wraps a DataFrame passed as a logging argument, eg logger.debug('log>>%s', LazyFrame(df)).
+
+    The frame is only rendered when the message is emitted, and then only its shape and its first max_rows
+    rows and max_columns columns, so a disabled level costs nothing and an enabled one stays small.
+    """
+
+    def __init__(self, df, max_rows: int = None, max_columns: int = None):
+        self.df = df
+        self.max_rows = MAX_FRAME_ROWS if max_rows is None else max_rows
+        self.max_columns = MAX_FRAME_COLUMNS if max_columns is None else max_columns
+
+    def __str__(self):
+        rows, columns = self.df.shape
+        head = self.df.iloc[:self.max_rows, :self.max_columns]
+        return f'<{rows} rows x {columns} columns>\n{head.to_string()}'
+
+
+class Sampler:
+    """Lets one call out of every through, to log a message of a loop without logging every iteration"""
+
+    def __init__(self, every: int = 1):
+        self.every = max(int(every), 1)
+        self.calls = 0
+
+    def __call__(self) -> bool:
+        self.calls += 1
+        return (self.calls - 1) % self.every == 0